@@ -0,0 +1,65 @@
+"""
+Insert throughput for planned worksets, one `add()` per row vs `add_many`.
+
+    > python -m benchmarks.bench_bulk_insert --rows 10000
+
+The in-memory engine is included as a baseline without any database cost.
+"""
+import pathlib
+import tempfile
+import time
+
+import click
+
+from fivethirtyone_db import db, storage
+from fivethirtyone_db.storage.memory import MemoryEngine
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+
+
+def make_worksets(rows, athlete):
+    return [
+        db.Workset(
+            base_max=100.0,
+            base_reps=5,
+            cycle=i,
+            weight=85.0,
+            lift_name="bench",
+            athlete_name=athlete,
+        )
+        for i in range(rows)
+    ]
+
+
+def one_by_one(worksets):
+    for ws in worksets:
+        ws.add()
+
+
+def batched(worksets):
+    db.Workset.add_many(worksets)
+
+
+@click.command()
+@click.option("--rows", default=10000)
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [
+            ("sqlite", SQLiteEngine(pathlib.Path(tmp) / "bench.sqlite")),
+            ("memory", MemoryEngine()),
+        ]
+        for engine_name, engine in engines:
+            storage.set_engine(engine)
+            db.create_database()
+
+            for name, fn in [("add", one_by_one), ("add_many", batched)]:
+                worksets = make_worksets(rows, athlete=name)
+                t0 = time.perf_counter()
+                fn(worksets)
+                elapsed = time.perf_counter() - t0
+                print(f"{engine_name:>6s} {name:>8s}: {rows / elapsed:9.0f} rows/s")
+
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+e1RM throughput, one scalar call per set vs one vectorized call per history.
+
+    > python -m benchmarks.bench_e1rm --sets 100000 --sets 1000000 --sets 10000000
+
+"batched" is `analysis.latest_e1rm` over a synthetic history shared by 1000
+athletes, all four lifts at once. The scalar loop is skipped above 10^6 sets.
+"""
+import time
+
+import click
+import numpy as np
+
+from fivethirtyone_db import analysis, config
+from fivethirtyone_db.worksets import WorksetStore
+
+ATHLETES = 1000
+SCALAR_LIMIT = 10**6
+
+
+def make_store(sets):
+    rng = np.random.default_rng(0)
+    lifts = tuple(config["lifts"])
+    columns = {
+        "id": np.arange(sets, dtype=np.int64),
+        "weight": rng.integers(40, 400, sets) / 2,
+        "reps": rng.integers(1, 13, sets).astype(float),
+        "lift_name": rng.integers(0, len(lifts), sets).astype(np.int32),
+        "athlete_name": rng.integers(0, ATHLETES, sets).astype(np.int32),
+        "date": rng.integers(737000, 739000, sets).astype(np.int32),
+        "is_max": rng.random(sets) < 0.2,
+        "base_max": np.full(sets, np.nan),
+        "base_reps": np.full(sets, 5.0),
+        "cycle": np.zeros(sets),
+    }
+    categories = {"lift_name": lifts, "athlete_name": tuple(f"athlete-{i}" for i in range(ATHLETES))}
+    return WorksetStore(columns, categories)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+@click.command()
+@click.option("--sets", multiple=True, type=int, default=[10**5, 10**6, 10**7])
+def main(sets):
+    for n in sets:
+        store = make_store(n)
+        weights, reps = store.column("weight").tolist(), store.column("reps").tolist()
+
+        line = f"{n:>9d} sets:"
+        if n <= SCALAR_LIMIT:
+            t = timed(lambda: [analysis.one_rm_fusion(w, r) for w, r in zip(weights, reps)])
+            line += f" scalar {n / t:12.0f} sets/s,"
+        else:
+            line += f" scalar {'-':>12s}       ,"
+        t = timed(lambda: analysis.e1rm(store))
+        line += f" vectorized {n / t:12.0f} sets/s,"
+        t = timed(lambda: analysis.latest_e1rm(store, config["lifts"]))
+        line += f" batched latest {t * 1e3:8.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
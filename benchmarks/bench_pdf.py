@@ -0,0 +1,69 @@
+"""
+Latency and memory of the PDF engines, xhtml2pdf on the program HTML vs
+ReportLab drawing the program, on an athlete's planned cycle.
+
+    > python -m benchmarks.bench_pdf --athlete irfan --repeats 5
+
+Runs on a scratch copy of the bundled database, rendering in this process.
+Memory is the peak of Python allocations during one render, as tracemalloc
+reports it.
+"""
+import pathlib
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import click
+
+import fivethirtyone_db
+from fivethirtyone_db import db, pdfjobs
+
+
+def programs(athlete):
+    """
+    The document of every engine for the athlete's planned cycle.
+    """
+    from fivethirtyone_db import blog
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = pathlib.Path(tmp) / "531.sqlite"
+        shutil.copy(fivethirtyone_db.DB_FILE, scratch)
+        app = fivethirtyone_db.create_app({"engine": "sqlite", "path": scratch})
+        with app.test_request_context():
+            program = blog._program(db.Athlete(name=athlete))
+            html = blog._program_html(db.Athlete(name=athlete))
+        db.get_engine().close()
+    return dict(html=html, reportlab=program)
+
+
+def measure(render, document, repeats):
+    # imports and font loading aren't the engine's steady state
+    render(document)
+    seconds = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        pdf = render(document)
+        seconds.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        render(document)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(seconds), statistics.median(seconds), peak, len(pdf)
+
+
+@click.command()
+@click.option("--athlete", default="irfan", show_default=True, help="an athlete with a planned cycle")
+@click.option("--repeats", default=5, show_default=True)
+def main(athlete, repeats):
+    print(f"{'engine':>10s} {'best':>9s} {'median':>9s} {'peak':>9s} {'size':>9s}")
+    for engine, document in programs(athlete).items():
+        best, median, peak, size = measure(pdfjobs.ENGINES[engine], document, repeats)
+        print(f"{engine:>10s} {best * 1000:6.1f} ms {median * 1000:6.1f} ms {peak / 1024:6.0f} kB {size / 1024:6.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
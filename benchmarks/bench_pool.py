@@ -0,0 +1,67 @@
+"""
+Compare a fresh SQLite connection per query with the pooled db_connection.
+
+    > python -m benchmarks.bench_pool --threads 4 --queries 2000
+"""
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import click
+
+import fivethirtyone_db
+from fivethirtyone_db import db, storage
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+
+QUERY = "SELECT * FROM workset WHERE athlete_name='camilla'"
+
+
+def fresh_connection():
+    conn = sqlite3.connect(db.get_engine().path)
+    try:
+        conn.execute(QUERY).fetchall()
+    finally:
+        conn.close()
+
+
+def pooled_connection():
+    with db.db_connection() as conn:
+        conn.execute(QUERY).fetchall()
+
+
+def run(fn, threads, queries):
+    def work():
+        for _ in range(queries // threads):
+            fn()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - t0
+
+
+@click.command()
+@click.option("--threads", default=4)
+@click.option("--queries", default=2000)
+def main(threads, queries):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = pathlib.Path(tmp) / "531.sqlite"
+        shutil.copy(fivethirtyone_db.DB_FILE, db_file)
+        storage.set_engine(SQLiteEngine(db_file))
+
+        for name, fn in [("fresh", fresh_connection), ("pooled", pooled_connection)]:
+            elapsed = run(fn, threads, queries)
+            print(f"{name:>8s}: {queries / elapsed:8.0f} queries/s")
+
+        print(db.pool_stats())
+        db.get_engine().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold start time of the package, the CLI and the app, as `python -X importtime`
+reports it.
+
+    > python -m benchmarks.bench_startup --runs 5
+
+Every target runs in a fresh interpreter; the best of `--runs` is reported and
+compared with its budget. Exits non-zero if a target is over budget, so a
+heavy import slipping back to module level fails the run.
+"""
+import subprocess
+import sys
+
+import click
+
+# target -> (code to time, budget in ms)
+TARGETS = {
+    "import fivethirtyone_db": ("import fivethirtyone_db", 150),
+    "fto --help": (
+        "import sys; sys.argv = ['fto', '--help']\n"
+        "from scripts.cli import cli\n"
+        "try:\n    cli()\nexcept SystemExit:\n    pass",
+        300,
+    ),
+    "create_app()": (
+        "import fivethirtyone_db; fivethirtyone_db.create_app({'engine': 'memory'})",
+        1000,
+    ),
+}
+
+
+def import_time(code):
+    """
+    Run `code` in a fresh interpreter and sum the cumulative import times of
+    its top-level imports, in ms.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line.split("|")
+        if not package.startswith("  "):
+            # not nested under another import
+            total += int(cumulative)
+    return total / 1000
+
+
+@click.command()
+@click.option("--runs", default=5, help="fresh interpreters per target")
+def main(runs):
+    over = []
+    for target, (code, budget) in TARGETS.items():
+        best = min(import_time(code) for _ in range(runs))
+        status = "ok" if best <= budget else "OVER BUDGET"
+        print(f"{target:>24s}: {best:7.1f} ms (budget {budget} ms) {status}")
+        if best > budget:
+            over.append(target)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
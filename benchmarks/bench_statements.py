@@ -0,0 +1,52 @@
+"""
+Workset lookup throughput with and without statement reuse.
+
+    > python -m benchmarks.bench_statements --lookups 20000
+
+"interpolated" builds a new SQL string per id the way the old code did, so
+every call is a statement-cache miss. "bound" keeps the SQL constant and
+passes the id as a parameter, so sqlite3 reuses the compiled statement.
+"""
+import shutil
+import sqlite3
+import tempfile
+import pathlib
+import time
+
+import click
+
+import fivethirtyone_db
+
+
+def interpolated(conn, ids):
+    for wsid in ids:
+        conn.execute(f"select * from workset where id={wsid}").fetchone()
+
+
+def bound(conn, ids):
+    for wsid in ids:
+        conn.execute("select * from workset where id=?", (wsid,)).fetchone()
+
+
+@click.command()
+@click.option("--lookups", default=20000)
+def main(lookups):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = pathlib.Path(tmp) / "531.sqlite"
+        shutil.copy(fivethirtyone_db.DB_FILE, db_file)
+
+        conn = sqlite3.connect(db_file, cached_statements=256)
+        all_ids = [wsid for wsid, in conn.execute("select id from workset")]
+        ids = [all_ids[i % len(all_ids)] for i in range(lookups)]
+
+        for name, fn in [("interpolated", interpolated), ("bound", bound)]:
+            t0 = time.perf_counter()
+            fn(conn, ids)
+            elapsed = time.perf_counter() - t0
+            print(f"{name:>12s}: {lookups / elapsed:8.0f} lookups/s")
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
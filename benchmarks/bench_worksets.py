@@ -0,0 +1,93 @@
+"""
+Memory and speed of the columnar WorksetStore vs a list of workset dicts.
+
+    > python -m benchmarks.bench_worksets --rows 10000 --rows 1000000
+
+Each operation is what a page does with an athlete's worksets: filter one lift's
+completed sets, sort by date for the index page and group by lift for graphs.
+"""
+import datetime
+import random
+import time
+import tracemalloc
+from itertools import groupby
+
+import click
+
+from fivethirtyone_db.worksets import WorksetStore
+
+LIFTS = ["bench", "squat", "military", "deadlift"]
+
+
+def make_records(rows):
+    rng = random.Random(0)
+    start = datetime.date(2020, 1, 1).toordinal()
+    return [
+        dict(
+            id=i,
+            weight=rng.randrange(40, 200) / 2,
+            reps=rng.randrange(1, 12),
+            lift_name=rng.choice(LIFTS),
+            athlete_name="anna",
+            date=datetime.date.fromordinal(start + i // 4) if i % 10 else None,
+            is_max=int(rng.random() < 0.2),
+            base_max=None,
+            base_reps=5,
+            cycle=i // 400,
+        )
+        for i in range(rows)
+    ]
+
+
+def size_of(build):
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def dict_ops(records):
+    way_in_the_future = datetime.date(2100, 1, 1)
+    return {
+        "filter": lambda: [ws for ws in records if ws["lift_name"] == "bench" and ws["date"]],
+        "sort": lambda: sorted(records, key=lambda ws: ws["date"] or way_in_the_future, reverse=True),
+        "group": lambda: {
+            lift: list(group)
+            for lift, group in groupby(sorted(records, key=lambda ws: ws["lift_name"]), key=lambda ws: ws["lift_name"])
+        },
+    }
+
+
+def store_ops(store):
+    return {
+        "filter": lambda: store.filter(lift="bench", done=True),
+        "sort": lambda: store.sort_by_date(descending=True),
+        "group": lambda: store.group_by_lift(),
+    }
+
+
+@click.command()
+@click.option("--rows", multiple=True, type=int, default=[10000, 1000000])
+def main(rows):
+    for n in rows:
+        records, dict_bytes = size_of(lambda: make_records(n))
+        store, store_bytes = size_of(lambda: WorksetStore.from_records(records))
+        print(f"{n} rows: dicts {dict_bytes / 2**20:8.1f} MiB, store {store_bytes / 2**20:8.1f} MiB")
+
+        for (name, by_dict), by_store in zip(dict_ops(records).items(), store_ops(store).values()):
+            t_dict, t_store = timed(by_dict), timed(by_store)
+            print(f"  {name:>6s}: dicts {t_dict * 1e3:9.2f} ms, store {t_store * 1e3:9.2f} ms ({t_dict / t_store:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,112 @@
-import pandas as pd
-from io import StringIO
+"""
+The fivethirtyone_db package: a Flask app and CLI for 5/3/1 training logs.
+
+Importing the package is cheap. The program config (`config`, `programs`,
+`SMALLEST_W_INC`, ...) and the credentials in `vars.yaml` are module attributes
+that are loaded on first access, and pandas, Flask, plotly and xhtml2pdf are
+only imported by the code that uses them.
+"""
+
+import functools
 import os
 import pathlib
-import yaml
-from flask import Flask, g
 
 DB_FILE = pathlib.Path(__file__).parent / "531.sqlite"
 
+
 def load_config(filename):
+    import yaml
+
     with open(filename, "r") as file:
         return yaml.safe_load(file)
 
-config_path = os.environ.get("PROGRAM_CONFIG", pathlib.Path(__file__).parent.parent / "program-config.yaml")
-config = load_config(config_path)
 
-SMALLEST_W_INC = config["smallest_w_inc"]
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """
+    Get the program config, parsed on first use.
+
+    It is read from $PROGRAM_CONFIG, by default `program-config.yaml` next to
+    the package.
+    """
+    config_path = os.environ.get("PROGRAM_CONFIG", pathlib.Path(__file__).parent.parent / "program-config.yaml")
+    return load_config(config_path)
 
-programs = {key: pd.DataFrame(value) for key, value in config["programs"].items()}
-programs.update({key: value for key, value in zip([5, 3, 1, 0], programs.values())})
-programs.update({key: value for key, value in zip(["5", "3", "1", "0"], programs.values())})
 
-comments = config["comments"]
-assistance = config["assistance"]
-to_add_pr_cycle = config["to_add_pr_cycle"]
+def _load_programs():
+    import pandas as pd
 
+    config = get_config()
+    programs = {key: pd.DataFrame(value) for key, value in config["programs"].items()}
+    programs.update({key: value for key, value in zip([5, 3, 1, 0], programs.values())})
+    programs.update({key: value for key, value in zip(["5", "3", "1", "0"], programs.values())})
+    return programs
+
+
+def _load_credentials():
+    import yaml
+
+    try:
+        with pathlib.Path("vars.yaml").open("r") as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
+    except:
+        return {}
 
 
-try:
-    with pathlib.Path("vars.yaml").open("r") as f:
-        _credentials = yaml.load(f, Loader=yaml.FullLoader)
-except:
-    _credentials = {}
+# module attributes computed on first access, see __getattr__
+_LAZY = {
+    "config": get_config,
+    "SMALLEST_W_INC": lambda: get_config()["smallest_w_inc"],
+    "programs": _load_programs,
+    "comments": lambda: get_config()["comments"],
+    "assistance": lambda: get_config()["assistance"],
+    "to_add_pr_cycle": lambda: get_config()["to_add_pr_cycle"],
+    "_credentials": _load_credentials,
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _LAZY[name]()
+    return value
+
+
+def _get(name):
+    # a lazy attribute from inside the module, where globals skip __getattr__
+    return globals()[name] if name in globals() else __getattr__(name)
 
 
 def create_app(db_credentials=None):
+    """
+    Create the flask app.
+
+    The database schema is brought up to date first, see `migrations.migrate`.
+
+    Args:
+        db_credentials (dict, optional): Selects the storage engine, see
+            `storage.engine_from_credentials`. MySQL connection arguments use the
+            MySQL engine, {"engine": "memory"} the in-memory one, and None the
+            bundled SQLite database.
+    """
+
+    from flask import Flask
 
     if not db_credentials is None:
-        _credentials.update(**db_credentials)
+        _get("_credentials").update(**db_credentials)
 
+    from . import storage
     from . import db
     from . import auth
 
+    storage.set_engine(storage.engine_from_credentials(db_credentials))
+    # every request reads the athlete's data version, which older databases,
+    # like the bundled one, don't have yet
+    db.create_database()
+
     # create and configure the app
     app = Flask(__name__, instance_relative_config=True)
+    app.app_ctx_globals_class = auth.Globals
     app.config.from_mapping(
         SECRET_KEY="dev",
         DATABASE=os.path.join(app.instance_path, "flaskr.sqlite"),
@@ -54,8 +118,9 @@ def create_app(db_credentials=None):
     except OSError:
         pass
 
-    from . import blog, api
+    from . import blog, api, conditional
 
+    app.after_request(conditional.add_validators)
     app.register_blueprint(blog.bp)
     app.register_blueprint(api.bp)
     app.add_url_rule("/", endpoint="index")
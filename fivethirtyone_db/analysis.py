@@ -1,5 +1,44 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import functools
 import numpy as np
-from . import to_add_pr_cycle, SMALLEST_W_INC
+from . import get_config
+
+# Brzycki's denominator, 37 - reps, reaches zero at 37 reps
+BRZYCKI_MAX_REPS = 37
+
+
+def _domain(weight, reps, max_reps=None):
+    """mask of the (weight, reps) pairs a formula is defined for
+
+    NaN (a missing value) is not out of domain, it just gives NaN
+    """
+    weight = np.asarray(weight, dtype=float)
+    reps = np.asarray(reps, dtype=float)
+    invalid = (weight < 0) | (reps < 0)
+    if max_reps is not None:
+        invalid |= reps >= max_reps
+    return weight, reps, ~invalid
+
+
+def _checked(weight, reps, max_reps=None):
+    if isinstance(weight, (int, float)) and isinstance(reps, (int, float)):
+        # plain numbers skip the round trip through numpy
+        if weight < 0 or reps < 0 or (max_reps is not None and reps >= max_reps):
+            raise ValueError(f"1rm undefined for reps={reps}, weight={weight}")
+        return weight, reps
+
+    weight, reps, valid = _domain(weight, reps, max_reps)
+    if not np.all(valid):
+        bad = np.broadcast_to(reps, valid.shape)[~valid]
+        raise ValueError(f"1rm undefined for reps={bad.tolist()[:5]} (or a negative weight)")
+    return weight, reps
+
+
+def _result(value):
+    # scalars in, a plain float out
+    return float(value) if np.ndim(value) == 0 else value
 
 
 def one_rm_brzycki(weight, reps):
@@ -8,8 +47,12 @@ def one_rm_brzycki(weight, reps):
 
     https://www.athlegan.com/calculate-1rm
 
+    weight and reps can be scalars or arrays,
+    reps must be below BRZYCKI_MAX_REPS
+
     """
-    return weight * 36 / (37 - reps)
+    weight, reps = _checked(weight, reps, BRZYCKI_MAX_REPS)
+    return _result(weight * 36 / (37 - reps))
 
 
 def one_rm_lombardi(weight, reps):
@@ -18,8 +61,11 @@ def one_rm_lombardi(weight, reps):
 
     https://www.athlegan.com/calculate-1rm
 
+    weight and reps can be scalars or arrays
+
     """
-    return weight * reps**0.1
+    weight, reps = _checked(weight, reps)
+    return _result(weight * reps**0.1)
 
 
 def one_rm_fusion(weight, reps):
@@ -28,8 +74,122 @@ def one_rm_fusion(weight, reps):
 
     https://www.athlegan.com/calculate-1rm
 
+    weight and reps can be scalars or arrays,
+    reps must be below BRZYCKI_MAX_REPS
+
+    """
+    weight, reps = _checked(weight, reps, BRZYCKI_MAX_REPS)
+    return _result(0.5 * (weight * reps**0.1 + weight * 36 / (37 - reps)))
+
+
+ONE_RM_FORMULAS = {
+    "brzycki": (one_rm_brzycki, BRZYCKI_MAX_REPS),
+    "lombardi": (one_rm_lombardi, None),
+    "fusion": (one_rm_fusion, BRZYCKI_MAX_REPS),
+}
+
+
+def e1rm(worksets, formula="fusion"):
+    """estimated 1rm of every workset in one call
+
+    worksets (WorksetStore): e.g. an athlete's whole history
+    formula (str): a key of ONE_RM_FORMULAS
+
+    returns a float array with one value per workset, NaN for
+    planned sets and for sets outside the formula's domain
+
+    """
+    fn, max_reps = ONE_RM_FORMULAS[formula]
+    weight, reps, valid = _domain(worksets.column("weight"), worksets.column("reps"), max_reps)
+    valid &= ~np.isnan(weight) & ~np.isnan(reps)
+    one_rms = np.full(len(weight), np.nan)
+    one_rms[valid] = fn(weight[valid], reps[valid])
+    return one_rms
+
+
+def latest_e1rm(worksets, lifts, formula="fusion"):
+    """estimated 1rm of the latest max set per athlete and lift
+
+    Works on worksets of any number of athletes at once, e.g. a
+    WorksetStore of the whole workset table.
+
+    worksets (WorksetStore):
+    lifts (list[str]): the lifts to report, e.g. config["lifts"]
+    formula (str): a key of ONE_RM_FORMULAS
+
+    returns {athlete: {lift: e1rm}} with NaN for a lift without a max set
+
+    """
+    maxes = worksets.filter(done=True, is_max=True)
+    athletes = maxes.column("athlete_name")
+    lift_codes = maxes.column("lift_name")
+
+    # sort by athlete, lift and date; the last row of each group is the latest
+    order = np.lexsort((maxes.column("date"), lift_codes, athletes))
+    athletes, lift_codes = athletes[order], lift_codes[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (athletes[1:] != athletes[:-1]) | (lift_codes[1:] != lift_codes[:-1])
+    latest = maxes.take(order[last])
+
+    one_rms = e1rm(latest, formula)
+    result = {name: dict.fromkeys(lifts, np.nan) for name in sorted(set(latest.values("athlete_name")))}
+    for athlete, lift, one_rm in zip(latest.values("athlete_name"), latest.values("lift_name"), one_rms):
+        if lift in result[athlete]:
+            result[athlete][lift] = float(one_rm)
+    return result
+
+
+# weight / 1rm for n reps, the inverse of the formulas above
+ISO_FACTORS = {
+    "brzycki": lambda n: (37 - n) / 36,
+    "lombardi": lambda n: n**-0.1,
+    "fusion": lambda n: 2 / (n**0.1 + 36 / (37 - n)),
+}
+
+# np.linspace arguments of the reps the iso curves are drawn over
+ISO_GRID = (1, 15, 100)
+# whole reps 1 to 15, the columns of a rep max table
+REP_MAX_GRID = (1, 15, 15)
+
+
+@functools.lru_cache(maxsize=None)
+def rep_grid(grid=ISO_GRID):
+    """reps for np.linspace(*grid), built once
+
+    the array is read-only, it is shared by every caller
+
+    """
+    reps = np.linspace(*grid)
+    reps.flags.writeable = False
+    return reps
+
+
+@functools.lru_cache(maxsize=None)
+def _iso_factors(formula, grid):
+    _, max_reps = ONE_RM_FORMULAS[formula]
+    reps = rep_grid(grid)
+    if max_reps is not None and reps[-1] >= max_reps:
+        raise ValueError(f"{formula} is undefined for {reps[-1]} reps")
+    factors = ISO_FACTORS[formula](reps)
+    factors.flags.writeable = False
+    return factors
+
+
+def iso_curves(one_rms, formula="fusion", grid=ISO_GRID):
+    """reps and weights of equal effort for many 1rm maxes at once
+
+    one_rms (float | array): the 1rm maxes, NaN gives a NaN curve
+    formula (str): a key of ONE_RM_FORMULAS
+    grid (tuple): np.linspace arguments of the reps
+
+    returns the reps, shape (reps,), and the weights,
+    shape (len(one_rms), reps): weights[i, j] is the weight
+    one_rms[i] lifts for reps[j] reps
+
     """
-    return 0.5 * (one_rm_lombardi(weight, reps) + one_rm_brzycki(weight, reps))
+    factors = _iso_factors(formula, grid)
+    one_rms = np.atleast_1d(np.asarray(one_rms, dtype=float))
+    return rep_grid(grid), one_rms[:, None] * factors[None, :]
 
 
 def iso_brzycki(w_1):
@@ -37,9 +197,8 @@ def iso_brzycki(w_1):
     return reps and weights for a specific 1rm max
 
     """
-    n = np.linspace(1, 15, 100)
-
-    return n, (37 - n) * w_1 / 36
+    n, weights = iso_curves(w_1, "brzycki")
+    return n, weights[0]
 
 
 def iso_fusion(w_1):
@@ -47,29 +206,112 @@ def iso_fusion(w_1):
     return reps and weights for a specific 1rm max
 
     """
-    n = np.linspace(1, 15, 100)
+    n, weights = iso_curves(w_1, "fusion")
+    return n, weights[0]
+
+
+RepMaxTable = namedtuple("RepMaxTable", "lifts one_rm reps weight")
 
-    return n, 2 * w_1 / (n**0.1 + 36 / (37 - n))
 
+def rep_max_table(maxes, formula="fusion"):
+    """the weight for 1 to 15 reps of every lift
 
-def compile(athlete, lift, train_max, program, cycle=0):
-    """given previous lifts and a base-program
-    calculate a program for a specific lifter and
-    exercise
+    maxes (dict[str, float]): estimated 1rm per lift, e.g. a
+        value of latest_e1rm
+    formula (str): a key of ONE_RM_FORMULAS
 
-    lifter (str):
-    exercise (str):
-    lifts (dataframe):
-    program (dataframe):
+    returns RepMaxTable with the lifts, their 1rm, the reps and
+    the weights, shape (lifts, reps)
 
     """
+    lifts = tuple(maxes)
+    one_rm = np.array([maxes[lift] for lift in lifts], dtype=float)
+    reps, weight = iso_curves(one_rm, formula, REP_MAX_GRID)
+    return RepMaxTable(lifts, one_rm, reps.astype(int), weight)
+
+
+@functools.lru_cache(maxsize=None)
+def program_tables():
+    """percentages and reps of every program in program-config.yaml
+
+    keyed like `fivethirtyone_db.programs`: by name ("five"),
+    base reps (5) and base reps as a string ("5")
+
+    """
+    tables = {}
+    for base_reps, (name, sets) in zip([5, 3, 1, 0], get_config()["programs"].items()):
+        table = ProgramTable(
+            name=name,
+            pct=np.array([s["pct"] for s in sets], dtype=float),
+            reps=tuple(s["reps"] for s in sets),
+        )
+        tables.update({name: table, base_reps: table, str(base_reps): table})
+    return tables
+
 
-    train_max += to_add_pr_cycle[lift] * cycle
+ProgramTable = namedtuple("ProgramTable", "name pct reps")
+CompiledLift = namedtuple("CompiledLift", "reps weight")
 
-    weight = (
-        ((program["pct"] / 100 * train_max) // SMALLEST_W_INC) * SMALLEST_W_INC
-    )
-    to_lift = program.assign(weight=weight)[["reps", "weight"]].T
-    to_lift.name = athlete
+COMPILE_CACHE_SIZE = 1024
 
-    return to_lift
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def _weights(pct, train_max):
+    # (sets,) x (lifts,) -> (lifts, sets), rounded down to smallest_w_inc
+    increment = get_config()["smallest_w_inc"]
+    return ((pct[None, :] / 100 * train_max[:, None]) // increment) * increment
+
+
+def compile_lifts(train_maxes, base_reps, cycle=0):
+    """calculate the program of several lifts at once
+
+    Weights for every lift and set are computed in one
+    vectorized step and memoized by
+    (lift, train_max, base_reps, cycle) in a bounded LRU.
+
+    train_maxes (dict[str, float]): train max per lift
+    base_reps (int | str): the program, a key of program_tables()
+    cycle (int): adds to_add_pr_cycle[lift] per cycle
+
+    returns dict[str, CompiledLift]
+
+    """
+    table = program_tables()[base_reps]
+    keys = {lift: (lift, float(tm), table.name, cycle) for lift, tm in train_maxes.items()}
+
+    with _compiled_lock:
+        result = {}
+        for lift, key in keys.items():
+            if key in _compiled:
+                _compiled.move_to_end(key)
+                result[lift] = _compiled[key]
+
+    missing = [lift for lift in keys if lift not in result]
+    if missing:
+        to_add_pr_cycle = get_config()["to_add_pr_cycle"]
+        train_max = np.array([train_maxes[lift] + to_add_pr_cycle[lift] * cycle for lift in missing])
+        weights = _weights(table.pct, train_max).tolist()
+        with _compiled_lock:
+            for lift, weight in zip(missing, weights):
+                result[lift] = _compiled[keys[lift]] = CompiledLift(table.reps, tuple(weight))
+            while len(_compiled) > COMPILE_CACHE_SIZE:
+                _compiled.popitem(last=False)
+
+    return {lift: result[lift] for lift in train_maxes}
+
+
+def compile(lift, train_max, base_reps, cycle=0):
+    """given a train max and a base-program
+    calculate the program for one lift
+
+    lift (str):
+    train_max (float):
+    base_reps (int | str): the program, a key of program_tables()
+    cycle (int):
+
+    returns CompiledLift with the reps and weight of every set
+
+    """
+    return compile_lifts({lift: train_max}, base_reps, cycle=cycle)[lift]
@@ -1,24 +1,200 @@
-from flask import Blueprint, flash, g, redirect, render_template, request, url_for
+import datetime
+import math
+
+from flask import Blueprint, Response, current_app, flash, g, redirect, render_template, request, url_for
 from werkzeug.exceptions import abort
 
 from .auth import login_required
-from . import db
+from .conditional import conditional
+from .storage import WORKSET_FIELDS
+from . import db, pdfjobs
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
+# worksets per page unless the client asks for fewer, and at most
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON = "application/x-ndjson"
+# what `worksets` can answer with, by the Accept header
+WORKSET_MIMETYPES = ["application/json", NDJSON]
+
+# `rep_str` is computed from these columns
+REP_STR_COLUMNS = ("reps", "base_reps")
+
+
+def _rep_str(ws):
+    return ws["reps"] or f"({ws['base_reps']}+)"
+
+
+def _arg(name, parse):
+    # a query argument parsed with `parse`, None if missing; 400 if it doesn't parse
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        abort(400, f"invalid {name}: {value!r}")
+
+
+def _flag(value):
+    if value.lower() in ("1", "true"):
+        return True
+    if value.lower() in ("0", "false"):
+        return False
+    raise ValueError(value)
+
+
+def _limit(value):
+    limit = int(value)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(value)
+    return limit
 
+
+def _fields():
+    # the requested fields, and the columns to select for them
+    fields = tuple(field for field in request.args.get("fields", "").split(",") if field)
+    fields = fields or WORKSET_FIELDS + ("rep_str",)
+    unknown = [field for field in fields if field not in WORKSET_FIELDS and field != "rep_str"]
+    if unknown:
+        abort(400, f"unknown fields: {', '.join(unknown)}")
+
+    needed = set(fields) | ({"id"} | set(REP_STR_COLUMNS) if "rep_str" in fields else {"id"})
+    return fields, tuple(column for column in WORKSET_FIELDS if column in needed)
+
+
+def _row(ws, fields):
+    return {field: _rep_str(ws) if field == "rep_str" else ws[field] for field in fields}
+
+
+@bp.route("/worksets")
 @bp.route("/lifts/<lift_name>")
 @login_required
-def get_lift(lift_name):
-    athlete = g.user
-    lifts = [lift for lift in athlete.worksets]
-    for lift in lifts:
-        lift["rep_str"] = lift["reps"] or f"({lift['base_reps']}+)"
+@conditional(offers=WORKSET_MIMETYPES)
+def worksets(lift_name=None):
+    """
+    The athlete's worksets in id order, filtered in the database.
+
+    Query arguments:
+        lift: only this lift (taken from the path for /lifts/<lift_name>)
+        since, until: only worksets done in this date range (ISO dates, inclusive)
+        is_max: only max attempts (1) or the others (0)
+        fields: comma separated fields of each workset, by default all and rep_str
+        after: the cursor, only worksets with a larger id
+        limit: worksets per page, PAGE_SIZE by default
+
+    Pages are JSON lists with a `Link: <...>; rel="next"` header while there
+    are more worksets. With `format=ndjson` or `Accept: application/x-ndjson`
+    every matching workset (up to `limit`, if given) is streamed as one JSON
+    object per line instead, straight from the database cursor.
+    """
+    fields, columns = _fields()
+    query = dict(
+        columns=columns,
+        lift=lift_name or request.args.get("lift"),
+        since=_arg("since", datetime.date.fromisoformat),
+        until=_arg("until", datetime.date.fromisoformat),
+        is_max=_arg("is_max", _flag),
+        after=_arg("after", int),
+    )
+    limit = _arg("limit", _limit)
+
+    streaming = request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best_match(WORKSET_MIMETYPES) == NDJSON
+    )
+    if streaming:
+        rows = g.user.iter_worksets(limit=limit, **query)
+        # the generator runs after the view returned, outside the app context
+        dumps = current_app.json.dumps
+        return Response((dumps(_row(ws, fields)) + "\n" for ws in rows), mimetype=NDJSON)
+
+    limit = limit or PAGE_SIZE
+    # one more than the page, to know whether there is a next one
+    rows = list(g.user.iter_worksets(limit=limit + 1, **query))
+    response = current_app.json.response([_row(ws, fields) for ws in rows[:limit]])
+    if len(rows) > limit:
+        args = dict(request.args, after=rows[limit - 1]["id"])
+        response.headers["Link"] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+
+@bp.route("/worksets/changes")
+@login_required
+@conditional
+def workset_changes():
+    """
+    The worksets changed after data version `since`, to keep a local copy current.
+
+    Returns the current `version`, the changed `worksets` (all fields and
+    rep_str) and the ids of the `deleted` ones. When the change log can't tell
+    what changed since then, e.g. for since=0 on a history from before the log,
+    `reset` is true and `worksets` holds every workset.
+    """
+    since = _arg("since", int)
+    if since is None:
+        abort(400, "since is required")
+
+    fields = WORKSET_FIELDS + ("rep_str",)
+    version, changes = g.user.workset_changes(since)
+    if changes is None:
+        worksets = [_row(ws, fields) for ws in g.user.iter_worksets()]
+        return dict(version=version, reset=True, worksets=worksets, deleted=[])
+
+    return dict(
+        version=version,
+        reset=False,
+        worksets=[_row(ws, fields) for ws in changes.values() if ws is not None],
+        deleted=[wsid for wsid, ws in changes.items() if ws is None],
+    )
+
+
+@bp.route("/rep-maxes")
+@login_required
+@conditional
+def rep_maxes():
+    """the weight for 1 to 15 reps per lift, null for a lift without a max set"""
+    table = g.user.rep_maxes()
+    return dict(
+        reps=table.reps.tolist(),
+        lifts={
+            lift: dict(
+                one_rm=None if math.isnan(one_rm) else one_rm,
+                weight=None if math.isnan(one_rm) else weight,
+            )
+            for lift, one_rm, weight in zip(table.lifts, table.one_rm.tolist(), table.weight.tolist())
+        },
+    )
+
 
-    return [lift for lift in lifts if lift["lift_name"] == lift_name]
+@bp.route("/stats")
+@login_required
+@conditional
+def lift_stats():
+    """PRs, moving averages, trend and cycle deltas per lift"""
+    stats = g.user.lift_stats()
+    return {lift: stats[lift].to_dict() for lift in stats.lifts}
 
 
 @bp.route("/lift/rm/<id>")
 @login_required
 def rm_lift(id):
     return redirect(request.referrer)
+
+
+@bp.route("/stats/pool")
+@login_required
+def pool_stats():
+    return db.pool_stats()
+
+
+@bp.route("/stats/cache")
+@login_required
+def cache_stats():
+    return db.cache_stats()
+
+
+@bp.route("/stats/pdf")
+@login_required
+def pdf_stats():
+    return pdfjobs.get_pool().stats()
@@ -1,6 +1,6 @@
 import functools
-from datetime import datetime
 from . import db
+from .conditional import is_conditional, not_modified
 
 from flask import (
     Blueprint,
@@ -12,11 +12,38 @@ from flask import (
     session,
     url_for,
 )
+from flask.ctx import _AppCtxGlobals
 from werkzeug.security import check_password_hash, generate_password_hash
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 
+def _load_user():
+    # the logged-in athlete with cached worksets, None if nobody is logged in
+    name = session.get("athlete_name")
+    if name is None:
+        return None
+    user = db.Athlete.cached(name)
+    if session.get("data_version") != user.data_version:
+        session["data_version"] = user.data_version
+    return user
+
+
+class Globals(_AppCtxGlobals):
+    """
+    `g`, loading `g.user` when a view or template first uses it.
+
+    Static files and views that don't need the athlete then cost no query.
+    Set as the app's `app_ctx_globals_class`.
+    """
+
+    def __getattr__(self, name):
+        if name != "user":
+            return super().__getattr__(name)
+        self.user = _load_user()
+        return self.user
+
+
 @bp.route("/login", methods=("GET", "POST"))
 def login():
     """render login form on GET or validate form
@@ -32,8 +59,10 @@ def login():
 
         if error is None:
             session.clear()
-            athlete = db.Athlete(username)
-            session["user_dict"] = athlete.to_dict()
+            # only the identity goes in the cookie, worksets stay in db.workset_cache
+            athlete = db.Athlete.cached(username)
+            session["athlete_name"] = athlete.name
+            session["data_version"] = athlete.data_version
             return redirect(url_for("index"))
 
         flash(error)
@@ -52,27 +81,23 @@ def load_logged_in_user():
     bp.before_app_request() registers a function that runs
     before the view function, no matter what URL is requested.
     """
-    user_dict = session.get("user_dict")
-    g.user = None
-
-    if user_dict is None:
+    name = session.get("athlete_name")
+    if name is None:
+        g.user = None
+        return
+    if not is_conditional():
+        # loaded on first use, see `Globals`
         return
 
-    for ws in user_dict.get("worksets"):
-        date_str = ws["date"]
-        if date_str is None:
-            continue
-        
-        mysql_format = '%a, %d %b %Y %H:%M:%S %Z'
-        sqlite_format = "%Y-%m-%d"
-        if ":" in date_str:
-            format_to_use = mysql_format
-        else:
-            format_to_use = sqlite_format
-
-        ws["date"] = datetime.strptime(date_str, format_to_use).date() if date_str else None
+    version, modified = db.data_stamp(name)
+    # answers 304 to a revalidation of an unchanged page, see `conditional`
+    response = not_modified(name, (version, modified))
+    if response is not None:
+        return response
 
-    g.user = db.Athlete.from_dict(user_dict)
+    g.user = db.Athlete.cached(name, version)
+    if session.get("data_version") != g.user.data_version:
+        session["data_version"] = g.user.data_version
 
 
 @bp.route("/logout")
@@ -88,6 +113,9 @@ def login_required(view):
     user is loaded and redirects to the login page
     otherwise. If a user is loaded the original view is
     called and continues normally.
+
+    functools.wraps copies marks like `conditional` to
+    the new view function.
     """
 
     @functools.wraps(view)
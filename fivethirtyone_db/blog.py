@@ -1,6 +1,7 @@
 from flask import (
     Blueprint,
     flash,
+    current_app,
     g,
     session,
     redirect,
@@ -13,11 +14,10 @@ from flask import (
 from werkzeug.exceptions import abort
 
 from .auth import login_required
-from . import analysis, db, programs, config
+from .conditional import conditional
+from .stats import WINDOW
+from . import analysis, db, get_config, pdfjobs, traces
 import datetime
-from xhtml2pdf import pisa
-import tempfile
-import plotly.express as px
 
 
 bp = Blueprint("blog", __name__)
@@ -25,98 +25,46 @@ bp = Blueprint("blog", __name__)
 
 @bp.route("/")
 @login_required
+@conditional
 def index():
-    reload_session()
-    way_in_the_future = datetime.date(2100, 1, 1)
     athlete = g.user
-    lifts = sorted(
-        athlete.worksets,
-        key=lambda lift: lift["date"] or way_in_the_future,
-        reverse=True,
-    )
+    # planned worksets first, then the most recent ones
+    lifts = athlete.worksets.sort_by_date(descending=True)
     # [
     #    {'id': 321, 'weight': 27.5, 'reps': 5, 'lift_name': 'bench', 'athlete_name': 'camilla', 'date': datetime.date(2022, 11, 8), 'is_max': 1, 'base_max': None, 'base_reps': None, 'cycle': None},
     #    {'id': 321, 'weight': 27.5, 'reps': 5, 'lift_name': 'bench', 'athlete_name': 'camilla', 'date': datetime.date(2022, 11, 8), 'is_max': 1, 'base_max': None, 'base_reps': None, 'cycle': None}
     # ]
     next_cycle = athlete.estimate_next_cycle()
+    lift_stats = athlete.lift_stats()
+    stats = {lift: lift_stats[lift] for lift in get_config()["lifts"]}
 
-    return render_template("blog/index.html", lifts=lifts, next_cycle=next_cycle)
+    return render_template(
+        "blog/index.html", lifts=lifts, next_cycle=next_cycle, stats=stats, stats_window=WINDOW
+    )
 
 def data_for_index_render():
     pass
 
 
-def reload_session():
-    g.user._load_worksets()
-    session["user_dict"] = g.user.to_dict()
-
-
 @bp.route("/graphs")
 @login_required
+@conditional
 def graphs():
-    athlete = g.user
-    completed_lifts = filter(lambda d: d["date"], athlete.worksets)
-    completed_lifts = sorted(completed_lifts, key=lambda d: d['date'])
-
-
-    def new_plotly_js_trace(lift, color):
-        legend_group = lift
-        return [
-            dict(
-                x=[],
-                y=[],
-                type="scatter",
-                mode="lines",
-                line={"shape": "hvh", "width": 3, "color": color},
-                name=f"{lift} (line)",
-                legendgroup=legend_group,
-                showlegend=False,
-            ),
-            dict(
-                x=[],
-                y=[],
-                text=[],
-                type="scatter",
-                mode="markers",
-                marker={
-                    "size": 12, 
-                    "color": 'white',  # Set face color to white
-                    "line": {'width': 4, 'color': color}  # Set edge color to the cycle color
-                },
-                name=lift,
-                hovertemplate="""
-    <b>%{x}</b><br><br>
-    %{text}""",
-                legendgroup=legend_group,
-                showlegend=True,
-            ),
-        ]
+    import plotly.express as px
 
+    config = get_config()
+    athlete = g.user
+    # materialized in the workset cache and kept up to date by every write
+    progression = athlete.progression()
 
     # Get the default Plotly color cycle
     color_cycle = px.colors.qualitative.Plotly
-    data = {lift: new_plotly_js_trace(lift, color) for lift, color in zip(config["lifts"], color_cycle)}
-
-    for record in completed_lifts:
-        w, r = record["weight"], record["reps"]
-        w_1rm = analysis.one_rm_fusion(record["weight"], record["reps"])
-        txt = f"{r} x {w} kg → {w_1rm:.1f} kg"
-        
-        line_trace, marker_trace = data[record["lift_name"]]
-        
-        # Add data to marker trace
-        marker_trace["x"].append(f"{record['date']}")
-        marker_trace["y"].append(w_1rm)
-        marker_trace["text"].append(txt)
-        
-        # Add data to line trace with filtering
-        last_valid_value = next((y for y in reversed(line_trace["y"]) if y is not None), None)
-        if last_valid_value is None or w_1rm >= 0.8 * last_valid_value:
-            line_trace["x"].append(f"{record['date']}")
-            line_trace["y"].append(w_1rm)
-
-
-    return render_template("blog/graphs.html", data=data)
+    data = {
+        lift: traces.lift_traces(lift, progression[lift], color)
+        for lift, color in zip(config["lifts"], color_cycle)
+    }
+
+    return render_template("blog/graphs.html", data=data, rep_maxes=athlete.rep_maxes())
 
 
 @bp.route("/workset/add", methods=("POST",))
@@ -124,16 +72,14 @@ def graphs():
 def new_workset():
     new_set = dict(request.form)
     db.Workset(
-        base_max="null",
-        base_reps="null",
-        cycle="null",
+        base_max=None,
+        base_reps=None,
+        cycle=None,
         weight=new_set["weight"],
         lift_name=new_set["lift"],
         athlete_name=g.user.name
     ).add()
 
-    # reload cached worksets
-    reload_session()
     return redirect(request.referrer)
 
 
@@ -149,7 +95,6 @@ def workset(wsid):
 
     if updates["send"] == "delete":
         db.Workset.delete_by_id(updates["wsid"])
-        reload_session()
         return redirect(request.referrer)
 
     db.Workset.update_row(
@@ -160,63 +105,114 @@ def workset(wsid):
         weight=updates["weight"],
         is_max=updates.get("is_max", "") == "on",
     )
-    # reload cached worksets
-    reload_session()
     return redirect(request.referrer)
 
 
-@bp.route("/pdf")
-@login_required
-def make_pdf():
-    athlete = g.user
-    first_set, *_ = worksets_to_do = athlete.worksets_to_do()
+def _program(athlete):
+    worksets_to_do = athlete.worksets_to_do()
+    if not worksets_to_do:
+        abort(409, "there is no planned cycle to print")
+    first_set = worksets_to_do[0]
     # each workset is:
     # {'id': 379, 'weight': 35.0, 'reps': None, 'lift_name': 'squat', 'athlete_name': 'camilla', 'date': None, 'is_max': None,
     # 'base_max': 44.7921, 'base_reps': 3, 'cycle': 0}
     #
     # convert to a program:
 
-    program = worksets_to_program(worksets_to_do, athlete=athlete.name)
-
-    html = render_template(
-        "blog/program.html",
+    return dict(
         name=athlete.name,
-        worksets_to_do=program,
+        worksets_to_do=worksets_to_program(worksets_to_do, athlete=athlete.name),
         cycle=first_set["cycle"],
         base_reps=first_set["base_reps"],
     )
 
-    with tempfile.NamedTemporaryFile() as f:
-        # pdfkit.from_string(html, f.name)
 
-        # convert HTML to PDF
-        pisa_status = pisa.CreatePDF(
-            html, dest=f  # the HTML to convert
-        )  # file handle to recieve result
+def _program_html(athlete):
+    return render_template("blog/program.html", **_program(athlete))
+
+
+def _submit_pdf():
+    # queue the program of the logged-in athlete; 503 when the queue is full
+    engine = request.values.get("engine") or current_app.config.get("PDF_ENGINE", pdfjobs.ENGINE)
+    if engine not in pdfjobs.ENGINES:
+        abort(400, f"unknown PDF engine {engine!r}")
+    document = _program_html(g.user) if engine == "html" else _program(g.user)
+    try:
+        return pdfjobs.get_pool().submit(g.user.name, document, engine=engine)
+    except pdfjobs.QueueFull:
+        response = make_response("too many PDFs are being made, try again in a moment", 503)
+        response.headers["Retry-After"] = "5"
+        abort(response)
+
+
+def _job(job_id):
+    # the logged-in athlete's job, 404 for anybody else's
+    job = pdfjobs.get_pool().status(job_id)
+    if job is None or job["athlete"] != g.user.name:
+        abort(404)
+    return dict(
+        job,
+        status_url=url_for("blog.pdf_job", job_id=job_id),
+        download_url=url_for("blog.pdf_download", job_id=job_id),
+    )
+
+
+@bp.route("/pdf")
+@login_required
+def make_pdf():
+    """queue the program as a PDF job and show a page that downloads it when done"""
+    return render_template("blog/pdf_job.html", job=_job(_submit_pdf()))
+
 
-        return send_file(f.name, as_attachment=True, download_name=f"{athlete.name}.pdf")
+@bp.route("/pdf/jobs", methods=("POST",))
+@login_required
+def submit_pdf():
+    job = _job(_submit_pdf())
+    return job, 202, {"Location": job["status_url"]}
 
-    response = make_response(pdf)
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = "inline; filename=output.pdf"
-    return response
 
-def worksets_to_program(worksets_to_do, athlete):
-    compile = lambda ws: analysis.compile(
-        athlete,
-        ws["lift_name"],
-        ws["base_max"] * 0.9,
-        programs[ws["base_reps"]],
-        cycle=ws["cycle"],
+@bp.route("/pdf/jobs/<job_id>")
+@login_required
+def pdf_job(job_id):
+    return _job(job_id)
+
+
+@bp.route("/pdf/jobs/<job_id>/download")
+@login_required
+def pdf_download(job_id):
+    job = _job(job_id)
+    if job["state"] != "done":
+        return job, 409
+    path = pdfjobs.get_pool().pdf_path(job)
+    if path is None:
+        abort(404, "the PDF was evicted from the cache, make it again")
+    # the cache key is a hash of the program, so it is a strong ETag
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=f"{g.user.name}.pdf",
+        etag=job["key"],
+        max_age=0,
     )
-    program = {ws["lift_name"]: compile(ws) for ws in worksets_to_do}
+
+
+def worksets_to_program(worksets_to_do, athlete):
+    program = {
+        ws["lift_name"]: analysis.compile(
+            ws["lift_name"],
+            ws["base_max"] * 0.9,
+            ws["base_reps"],
+            cycle=ws["cycle"],
+        )
+        for ws in worksets_to_do
+    }
     return [
         {
             "lift": lift,
-            "reps": df.loc["reps"].to_list(),
-            "weight": df.loc["weight"].to_list(),
+            "reps": list(to_lift.reps),
+            "weight": list(to_lift.weight),
         }
-        for lift, df in program.items()
+        for lift, to_lift in program.items()
     ]
 
 @bp.route("/cycle/new", methods=("GET", "POST"))
@@ -229,7 +225,7 @@ def add_cycle():
         new_cycle = dict(request.form)
         athlete = g.user.name
 
-        for lift, athlete, weight, one_rm_max, base_reps, cycle in next_lifts(new_cycle, athlete):
+        db.Workset.add_many(
             db.Workset(
                 base_max=one_rm_max,
                 base_reps=base_reps,
@@ -237,9 +233,10 @@ def add_cycle():
                 weight=weight,
                 lift_name=lift,
                 athlete_name=athlete,
-            ).add()
+            )
+            for lift, athlete, weight, one_rm_max, base_reps, cycle in next_lifts(new_cycle, athlete)
+        )
 
-    reload_session()
     return redirect(request.referrer)
 
 def next_lifts(new_cycle, athlete):
@@ -252,15 +249,15 @@ def next_lifts(new_cycle, athlete):
     Returns:
         (str, str, float, float, int, int) : same format as the input to add_cycle()
     """
+    config = get_config()
     cycle = int(new_cycle["cycle-index"])
     base_reps = int(new_cycle["rep-base"])
-    program = programs[base_reps]
-
-    for lift in config["lifts"]:
-        one_rm_max = float(new_cycle[lift + "-max"])
-        train_max = 0.9 * one_rm_max
-        to_lift = analysis.compile(athlete, lift, train_max, program, cycle=cycle)
-        *_, last_set = to_lift.columns
-        weight = to_lift[last_set]["weight"]
+
+    one_rm_maxes = {lift: float(new_cycle[lift + "-max"]) for lift in config["lifts"]}
+    train_maxes = {lift: 0.9 * one_rm_max for lift, one_rm_max in one_rm_maxes.items()}
+    program = analysis.compile_lifts(train_maxes, base_reps, cycle=cycle)
+
+    for lift, one_rm_max in one_rm_maxes.items():
+        *_, weight = program[lift].weight
         yield (lift, athlete, weight, one_rm_max, base_reps, cycle)
 
@@ -0,0 +1,283 @@
+"""
+This module provides the server-side cache of every athlete's worksets.
+
+Pages need the full workset history of the logged-in athlete. Instead of
+shipping it in the session cookie, the session only holds the athlete's name
+and data version, and the worksets are kept here, in a bounded per-process LRU
+cache keyed by athlete.
+
+An entry is valid as long as its version matches the athlete's `data_version`
+in the database, which the storage engine bumps on every write. Checking that
+costs one primary-key lookup; a stale entry is reloaded, and checked once more
+after loading.
+
+Next to the worksets, an entry materializes the athlete's `Progression`,
+`AthleteStats` and rep max table the first time a page asks for them. The rep max table outlives
+writes that leave the athlete's latest maxes as they were.
+
+Writes made through the `db` models don't invalidate the entry; they apply the
+exact change to it, see `WorksetCache.apply`. A full reload only happens when
+the versions don't line up, e.g. after a write from another process.
+
+The module includes the following classes:
+    - CachedWorksets
+    - WorksetCache
+
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from . import analysis
+from .storage import get_engine
+from .progression import Progression
+from .stats import AthleteStats
+from .worksets import WorksetStore
+
+CACHE_SIZE = 128
+
+# worksets is a WorksetStore, progression a Progression and lift_stats an
+# AthleteStats or None until needed, rep_maxes the (version, RepMaxTable) it was
+# last checked at or None
+CachedWorksets = namedtuple(
+    "CachedWorksets", "version worksets progression lift_stats rep_maxes", defaults=(None, None, None)
+)
+
+
+class WorksetCache:
+    """
+    LRU cache of athlete name -> CachedWorksets.
+
+    The cached WorksetStores are shared between requests. They are never
+    changed in place; a write replaces the athlete's store with a new one.
+
+    Args:
+        size (int, optional): Maximum number of athletes kept.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # entries are only valid for the engine they were loaded from
+        self._engine = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deltas = 0
+
+    def _switch_engine(self, engine):
+        # called with the lock held
+        if self._engine is not engine:
+            self._entries.clear()
+            self._engine = engine
+
+    def get(self, athlete, version=None):
+        """
+        Get the athlete's worksets, loading them if the cached ones are stale.
+
+        Args:
+            athlete (str): The name of the athlete.
+            version (int, optional): The athlete's current data version, if the
+                caller has just read it; saves looking it up again.
+
+        Returns:
+            CachedWorksets: The data version and the worksets.
+        """
+        engine = get_engine()
+        # read the version before the worksets, and check it after: a write
+        # committed in between would be in the worksets but not the version,
+        # and its write-through would then add it a second time
+        if version is None:
+            version = engine.data_version(athlete)
+
+        with self._lock:
+            self._switch_engine(engine)
+            entry = self._entries.get(athlete)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(athlete)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedWorksets(version, WorksetStore.from_records(engine.load_worksets(athlete)))
+        if engine.data_version(athlete) == version:
+            self.put(athlete, entry, engine)
+        # otherwise this request gets the worksets, and the next one reloads them
+        return entry
+
+    def put(self, athlete, entry, engine=None):
+        """
+        Store an entry, evicting the least recently used athlete if full.
+        """
+        with self._lock:
+            if engine is not None and engine is not self._engine:
+                # the engine was switched while loading
+                return
+            self._entries[athlete] = entry
+            self._entries.move_to_end(athlete)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, athlete):
+        with self._lock:
+            return athlete in self._entries
+
+    def apply(self, athlete, version, change):
+        """
+        Write a change the caller has just committed through to the cache.
+
+        Every write bumps the athlete's data version by one, so the change is
+        applied only if the entry is exactly one version behind; otherwise some
+        other write happened too and the entry is dropped.
+
+        The change is applied to the worksets and, if they were materialized,
+        the progression and the stats; all offer the same `with_added`,
+        `with_updated` and `with_deleted` methods.
+
+        Args:
+            athlete (str): The name of the athlete.
+            version (int): The athlete's data version after the write.
+            change (callable): Gets a cached WorksetStore or Progression,
+                returns the changed copy.
+        """
+        with self._lock:
+            if self._engine is not get_engine():
+                return
+            entry = self._entries.get(athlete)
+            if entry is None or entry.version == version:
+                # not cached, or already loaded with the change
+                return
+            if entry.version == version - 1:
+                # rep_maxes stays, `rep_maxes` checks it against the new maxes
+                self._entries[athlete] = entry._replace(
+                    version=version,
+                    worksets=change(entry.worksets),
+                    progression=entry.progression and change(entry.progression),
+                    lift_stats=entry.lift_stats and change(entry.lift_stats),
+                )
+                self.deltas += 1
+            else:
+                del self._entries[athlete]
+
+    def progression(self, athlete, worksets, version):
+        """
+        Get the progression of an athlete's worksets, building it only once.
+
+        Args:
+            athlete (str): The name of the athlete.
+            worksets (WorksetStore): The worksets, as returned by `get`.
+            version (int): Their data version.
+
+        Returns:
+            Progression: The progression.
+        """
+        return self._materialized(athlete, worksets, version, "progression", Progression.from_worksets)
+
+    def lift_stats(self, athlete, worksets, version):
+        """
+        Get the running statistics of an athlete's worksets, see `stats`.
+
+        Built once; writes then fold new worksets in, and lifts they mark
+        stale are rebuilt here.
+
+        Args:
+            athlete (str): The name of the athlete.
+            worksets (WorksetStore): The worksets, as returned by `get`.
+            version (int): Their data version.
+
+        Returns:
+            AthleteStats: The stats, none of them stale.
+        """
+        return self._materialized(
+            athlete,
+            worksets,
+            version,
+            "lift_stats",
+            AthleteStats.from_worksets,
+            refresh=lambda stats: stats.refreshed(worksets),
+        )
+
+    def _materialized(self, athlete, worksets, version, field, build, refresh=None):
+        # the `field` of the athlete's entry, built from the worksets if missing
+        with self._lock:
+            entry = self._entries.get(athlete)
+            cached = entry is not None and entry.worksets is worksets and getattr(entry, field)
+            # a value with stale parts is refreshed outside the lock
+            if cached and not getattr(cached, "stale", None):
+                return cached
+
+        value = refresh(cached) if cached else build(worksets)
+        with self._lock:
+            entry = self._entries.get(athlete)
+            # keep it unless the entry moved on in the meantime
+            if entry is not None and entry.worksets is worksets and entry.version == version:
+                self._entries[athlete] = entry._replace(**{field: value})
+        return value
+
+    def rep_maxes(self, athlete, worksets, version, lifts):
+        """
+        Get the rep max table of an athlete's latest maxes.
+
+        The table is kept until the latest maxes change: after a write it is
+        reused if the estimated 1RM of every lift is the same as before.
+
+        Args:
+            athlete (str): The name of the athlete.
+            worksets (WorksetStore): The worksets, as returned by `get`.
+            version (int): Their data version.
+            lifts (list[str]): The lifts of the table, e.g. config["lifts"].
+
+        Returns:
+            analysis.RepMaxTable: The table.
+        """
+        lifts = tuple(lifts)
+        previous = None
+        with self._lock:
+            entry = self._entries.get(athlete)
+            if entry is not None and entry.worksets is worksets and entry.rep_maxes is not None:
+                checked_at, previous = entry.rep_maxes
+                if checked_at == version and previous.lifts == lifts:
+                    return previous
+
+        maxes = analysis.latest_e1rm(worksets, lifts).get(athlete, dict.fromkeys(lifts, np.nan))
+        if previous is not None and previous.lifts == lifts and np.array_equal(
+            previous.one_rm, [maxes[lift] for lift in lifts], equal_nan=True
+        ):
+            table = previous
+        else:
+            table = analysis.rep_max_table(maxes)
+
+        with self._lock:
+            entry = self._entries.get(athlete)
+            if entry is not None and entry.worksets is worksets and entry.version == version:
+                self._entries[athlete] = entry._replace(rep_maxes=(version, table))
+        return table
+
+    def invalidate(self, athlete):
+        with self._lock:
+            self._entries.pop(athlete, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: size, athletes, hits, misses, evictions and deltas.
+        """
+        with self._lock:
+            return dict(
+                size=self.size,
+                athletes=len(self._entries),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                deltas=self.deltas,
+            )
@@ -0,0 +1,145 @@
+"""
+This module provides conditional GET for the pages of the logged-in athlete.
+
+A view marked with `@conditional` renders nothing but the athlete's worksets
+and its URL, so its response only changes when the athlete's data version
+does. Such responses get a strong ETag derived from the athlete, the data
+version, the URL, the mimetype negotiated from the Accept header and the
+build (the package's code, templates and program config), and a Last-Modified
+header from the time of the last workset write. They vary on Accept and
+Cookie.
+
+The check runs in `auth.load_logged_in_user`, right after the one query that
+reads the athlete's data version: if the client's `If-None-Match` (or, without
+one, `If-Modified-Since`) still matches, it answers 304 before any worksets are
+loaded or templates rendered. Other views skip that query and load the athlete
+when they first use `g.user`.
+
+The module includes the following functions:
+    - conditional
+    - is_conditional
+    - build
+    - not_modified
+    - add_validators
+
+"""
+
+import datetime
+import functools
+import hashlib
+import pathlib
+
+from flask import current_app, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+
+def conditional(view=None, *, offers=()):
+    """
+    Mark a view whose response depends only on the athlete's worksets and the URL.
+
+    Put it below `login_required`, which copies the mark to its wrapper.
+
+    Args:
+        offers (iterable[str], optional): The mimetypes a view picks from by
+            the Accept header, best first.
+
+    Examples:
+
+        @conditional
+        def graphs(): ...
+
+        @conditional(offers=["application/json", "application/x-ndjson"])
+        def worksets(): ...
+    """
+
+    def mark(view):
+        view.conditional = tuple(offers)
+        return view
+
+    return mark if view is None else mark(view)
+
+
+def _offers():
+    # the mimetypes the view negotiates, None if it isn't conditional
+    view = current_app.view_functions.get(request.endpoint)
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return getattr(view, "conditional", None)
+
+
+def is_conditional():
+    """
+    Whether the request is a GET or HEAD of a view marked `@conditional`.
+    """
+    return _offers() is not None
+
+
+@functools.lru_cache(maxsize=None)
+def build():
+    """
+    Get a hash of the package's code, templates and program config, which pages are made by.
+    """
+    from . import get_config
+
+    package = pathlib.Path(__file__).parent
+    digest = hashlib.sha1(repr(get_config()).encode())
+    for path in sorted([*package.rglob("*.py"), *(package / "templates").rglob("*")]):
+        if path.is_file():
+            digest.update(str(path.relative_to(package)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _etag(athlete, version, offers):
+    mimetype = request.accept_mimetypes.best_match(offers) if offers else ""
+    key = f"{athlete}\0{version}\0{request.full_path}\0{mimetype}\0{build()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def not_modified(athlete, stamp):
+    """
+    Get a 304 response if the client's copy of the page is still current.
+
+    Also remembers the validators of the page on `g`, for `add_validators`.
+
+    Args:
+        athlete (str): The logged-in athlete.
+        stamp (tuple[int, int]): Their data version and last write time, see
+            `StorageEngine.data_stamp`.
+
+    Returns:
+        Response | None: The 304 response, None if the page has to be rendered.
+    """
+    # flashed messages are rendered into the page once
+    offers = _offers()
+    if offers is None or "_flashes" in session:
+        return None
+
+    version, modified = stamp
+    last_modified = datetime.datetime.fromtimestamp(modified, datetime.timezone.utc) if modified else None
+    g.validators = (_etag(athlete, version, offers), last_modified)
+
+    if is_resource_modified(request.environ, etag=g.validators[0], last_modified=last_modified):
+        return None
+    return make_response("", 304)
+
+
+def add_validators(response):
+    """
+    Add the ETag and Last-Modified of a conditional view to its response.
+
+    Registered with `app.after_request`.
+    """
+    validators = g.get("validators")
+    if validators is None or response.status_code not in (200, 304):
+        return response
+
+    etag, last_modified = validators
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # the page is per athlete, and has to be revalidated on every view
+    response.vary.update(["Accept", "Cookie"])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
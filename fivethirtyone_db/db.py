@@ -3,112 +3,178 @@ This module provides functionality for interacting with the database that stores
 
 It provides functions to add and update data, as well as fetch information about the athletes and their workout progress.
 
+The models don't talk to a database themselves; every query goes through the
+active storage engine (see `fivethirtyone_db.storage`), which is chosen by
+`create_app(db_credentials)`.
+
 The module includes the following classes:
     - Athlete
     - Workset
+    - Lift
     - Table
 
 """
 
-import sqlite3
-from contextlib import contextmanager
 from werkzeug.security import generate_password_hash
-from . import DB_FILE, config, analysis
+from . import config, analysis
+from .storage import get_engine, IntegrityError
+from .cache import WorksetCache
+from .worksets import WorksetStore
+
+# per-process cache of the worksets of recently active athletes
+workset_cache = WorksetCache()
 
 
-@contextmanager
 def db_connection():
     """
-    Context manager for database connection.
+    Context manager for a raw connection of the active SQL engine.
+
+    Connections are borrowed from a per-process pool and returned when the block
+    exits; anything left uncommitted is rolled back.
+    """
+    return get_engine().connection()
+
+
+def pool_stats():
+    """
+    Connection pool counters of the active engine, see `ConnectionPool.stats`.
+    """
+    return get_engine().pool_stats()
+
+
+def _write_through(athlete, change):
+    """
+    Apply a committed change to the athlete's cached worksets.
+    """
+    workset_cache.apply(athlete, get_engine().data_version(athlete), change)
+
+
+def data_stamp(athlete):
+    """
+    The athlete's data version and last write time, see `StorageEngine.data_stamp`.
     """
-    try:
-        connection = sqlite3.connect(DB_FILE)
-        connection.row_factory = sqlite3.Row  # This allows us to access columns by name
-        yield connection
-    finally:
-        connection.close()
+    return get_engine().data_stamp(athlete)
+
+
+def cache_stats():
+    """
+    Workset cache counters, see `WorksetCache.stats`.
+    """
+    return workset_cache.stats()
 
 
 def create_database():
     """
-    Create a SQLite database and initialize tables.
+    Initialize tables and bring the schema up to date.
     """
-    Lift.create()
-    Athlete.create()
-    Workset.create()
-        
+    get_engine().create_schema()
+
 
 class Table:
     """
-    Base class for the Athlete and Workset classes.
+    Base class for the Athlete, Workset and Lift classes.
     """
     __tablename__ = ""
 
-    @classmethod
-    def create(cls):
-        with db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(cls.CREATE)
-            conn.commit()
+    @staticmethod
+    def engine():
+        return get_engine()
 
     @classmethod
     def list(cls):
-        return [dict(row) for row in cls._fetchall(f"SELECT * FROM {cls.__tablename__}")]
-
-    @staticmethod
-    def _execute(sql):
-        with db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
-
-    @staticmethod
-    def _fetchall(sql):
-        with db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            return cursor.fetchall()
-
-    @staticmethod
-    def _fetchone(sql):
-        with db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            return cursor.fetchone()
+        return cls.engine().list_rows(cls.__tablename__)
 
 
 class Lift(Table):
     __tablename__ = "lift"
-    CREATE = """
-CREATE TABLE IF NOT EXISTS lift (
-  name TEXT NOT NULL PRIMARY KEY
-);"""
 
     def __init__(self, name):
         self.name = name
 
     def add(self):
-        insert_lift = f"INSERT INTO lift (name) VALUES ('{self.name}')"
-        self._execute(insert_lift)
+        self.engine().add_lift(self.name)
 
 
 class Athlete(Table):
+    """
+    Class representing an athlete in the database.
+
+    This class provides methods for adding an athlete to the database, setting their password, and fetching their worksets.
+    """
+
     __tablename__ = "athlete"
-    CREATE = """
-CREATE TABLE IF NOT EXISTS athlete (
-  name TEXT NOT NULL PRIMARY KEY,
-  password TEXT
-);"""
 
+    def __init__(self, name, worksets=None, data_version=None):
+        """
+        Initialize an Athlete object.
 
-    def __init__(self, name, worksets=None):
+        Args:
+            name (str): The name of the athlete.
+            worksets (WorksetStore | list[dict], optional): Load from db if None
+            data_version (int, optional): The version `worksets` were loaded at.
+        """
         self.name = name
-        self.worksets = worksets if worksets is not None else self._load_worksets()
+        self.data_version = data_version
+        if worksets is None:
+            self._load_worksets()
+        elif isinstance(worksets, WorksetStore):
+            self.worksets = worksets
+        else:
+            self.worksets = WorksetStore.from_records(worksets)
+
+    @classmethod
+    def cached(cls, name, version=None):
+        """
+        Get an athlete with worksets from the server-side workset cache.
+
+
+        Args:
+            name (str): The name of the athlete.
+            version (int, optional): The athlete's current data version, if
+                already known, see `WorksetCache.get`.
+
+        Returns:
+            Athlete: The athlete, with `data_version` set.
+        """
+        entry = workset_cache.get(name, version)
+        return cls(name, worksets=entry.worksets, data_version=entry.version)
+
+    def progression(self):
+        """
+        Get the athlete's progression series, see `progression.Progression`.
+
+        For an athlete from `cached`, it is built once and then kept up to date
+        by every write.
+        """
+        return workset_cache.progression(self.name, self.worksets, self.data_version)
+
+    def lift_stats(self):
+        """
+        Get the athlete's running statistics per lift, see `stats.AthleteStats`.
+
+        For an athlete from `cached`, they are built once and then updated by
+        every write.
+        """
+        return workset_cache.lift_stats(self.name, self.worksets, self.data_version)
+
+    def rep_maxes(self):
+        """
+        Get the weight the athlete can lift for 1 to 15 reps, per lift.
+
+        Estimated from the latest max set of every lift, see
+        `analysis.rep_max_table`. For an athlete from `cached`, the table is
+        kept until those maxes change.
+
+        Returns:
+            analysis.RepMaxTable: The table.
+        """
+        return workset_cache.rep_maxes(self.name, self.worksets, self.data_version, config["lifts"])
 
     def to_dict(self):
         return {
             "name":self.name,
-            "worksets":self.worksets,
+            "worksets":self.worksets.to_records(),
+            "data_version":self.data_version,
         }
 
     @classmethod
@@ -118,17 +184,15 @@ CREATE TABLE IF NOT EXISTS athlete (
         return cls(**record)
 
     def _load_worksets(self):
-        return [ dict(ws) for ws in self._fetchall(f"SELECT * FROM workset WHERE athlete_name='{self.name}'")]
+        self.worksets = WorksetStore.from_records(self.engine().load_worksets(self.name))
+        return self.worksets
 
     def add(self, password):
-        insert_athlete = f"INSERT INTO athlete (name) VALUES ('{self.name}')"
-        self._execute(insert_athlete)
+        self.engine().add_athlete(self.name)
         self._set_password(password)
 
     def _set_password(self, pwd):
-        hsh = generate_password_hash(pwd)
-        change = f"UPDATE {self.__tablename__} SET password='{hsh}' WHERE name='{self.name}'"
-        self._execute(change)
+        self.engine().set_password(self.name, generate_password_hash(pwd))
 
     @staticmethod
     def _get_login(name):
@@ -136,17 +200,12 @@ CREATE TABLE IF NOT EXISTS athlete (
         Get the user details for a given athlete.
 
         Args:
-            athlete (str): The name of the athlete.
+            name (str): The name of the athlete.
 
         Returns:
-            tuple: A tuple containing the name and hashed password of the athlete.
-        """
-        query = f"""
-            SELECT password from athlete
-            where name='{name}'
+            str: The hashed password of the athlete.
         """
-        return Athlete._fetchone(query)["password"]
-
+        return get_engine().get_password(name)
 
     def worksets_to_do(self):
         """
@@ -155,7 +214,28 @@ CREATE TABLE IF NOT EXISTS athlete (
         Returns:
             list[dict]: A list of worksets that have not yet been completed by the athlete.
         """
-        return [ws for ws in self.worksets if ws["date"] is None]
+        return self.engine().worksets_to_do(self.name)
+
+    def iter_worksets(self, **query):
+        """
+        Yield the athlete's worksets straight from the database, filtered there.
+
+        Unlike `worksets`, nothing is cached; see `StorageEngine.iter_worksets`
+        for the filters.
+
+        Returns:
+            iterator[dict]: The worksets in id order.
+        """
+        return self.engine().iter_worksets(self.name, **query)
+
+    def workset_changes(self, since):
+        """
+        Get the athlete's worksets changed after data version `since`.
+
+        Returns:
+            tuple[int, dict | None]: See `StorageEngine.workset_changes`.
+        """
+        return self.engine().workset_changes(self.name, since)
 
     def latest_max(self, lift):
         """
@@ -163,36 +243,33 @@ CREATE TABLE IF NOT EXISTS athlete (
 
         Args:
             lift (str): The name of the lift, e.g., "deadlift", "bench", "military", "squat".
-            athlete (str): The name of the athlete.
 
         Returns:
             dict: A dictionary representing the latest max workset.
         """
-        max_lifts = filter(lambda ws: ws["is_max"] and ws["lift_name"]==lift, self.worksets )
-        try:
-            return max(max_lifts, key=lambda ws: ws["date"])
-        except ValueError:
-            return {}
+        return self.engine().latest_max(self.name, lift)
 
-
-    def latest_cycle(self):
+    def latest_maxes(self, lifts):
         """
-        Get the latest cycle for a given athlete.
+        Get the latest max workset for several lifts with a single query.
 
         Args:
-            athlete (str): The name of the athlete.
+            lifts (iterable[str]): The names of the lifts.
 
         Returns:
-            dict: A dictionary with keys cycle, base_reps, and base_max.
+            dict[str, dict]: The latest max workset per lift, {} for a lift without one.
         """
+        return self.engine().latest_maxes(self.name, lifts)
 
-        lifts = filter(lambda ws: ws["cycle"], self.worksets )
-        lifts = filter(lambda ws: ws["date"], lifts )
-        try:
-            return max(lifts, key=lambda ws: ws["date"])
-        except ValueError:
-            return {}
+    def latest_cycle(self):
+        """
+        Get the latest cycle for a given athlete.
 
+        Returns:
+            dict: The most recent completed workset that belongs to a cycle, with keys
+                cycle, base_reps, and base_max among others.
+        """
+        return self.engine().latest_cycle(self.name)
 
     def estimate_next_cycle(self):
         """add a new cycle for an athlete"""
@@ -202,11 +279,13 @@ CREATE TABLE IF NOT EXISTS athlete (
 
         latest_workset = self.latest_cycle()
 
-        latest_max_set = {lift: self.latest_max(lift) for lift in config["lifts"]}
-        latest_max_1rm = {
-            lift: analysis.one_rm_fusion(ws["weight"], ws["reps"])
-            for lift, ws in latest_max_set.items()
-        }
+        # the indexed lookup of the few latest max sets, not a scan of the
+        # history; NaN for a lift without one
+        latest_max_set = {lift: ws for lift, ws in self.latest_maxes(config["lifts"]).items() if ws}
+        latest_max_1rm = dict.fromkeys(config["lifts"], float("nan"))
+        if latest_max_set:
+            one_rms = analysis.e1rm(WorksetStore.from_records(list(latest_max_set.values())))
+            latest_max_1rm.update(zip(latest_max_set, one_rms.tolist()))
 
         current_cycle = latest_workset.get("cycle", -1)
         current_base_reps = latest_workset.get("base_reps", 0)
@@ -221,25 +300,31 @@ CREATE TABLE IF NOT EXISTS athlete (
         )
 
 
-
 class Workset(Table):
+    """
+    Class representing a workset in the database.
+
+    This class provides methods for adding and updating worksets in the database.
+    """
+
     __tablename__ = "workset"
-    CREATE = """
-CREATE TABLE IF NOT EXISTS workset (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  base_max REAL,
-  base_reps INTEGER,
-  cycle INTEGER,
-  weight REAL,
-  reps INTEGER,
-  lift_name TEXT,
-  athlete_name TEXT,
-  date TEXT,
-  is_max BOOLEAN,
-  UNIQUE (lift_name, athlete_name, date)
-);"""
 
     def __init__(self, base_max, base_reps, cycle, weight, lift_name, athlete_name, date=None, is_max=False, reps=None):
+        """
+        Initialize a Workset object.
+
+        Args:
+            base_max (float): The base maximum weight for the workset.
+            base_reps (int): The base number of repetitions for the workset.
+            cycle (int): The cycle number for the workset.
+            weight (float): The weight for the workset.
+            lift_name (str): The name of the lift for the workset.
+            athlete_name (str): The name of the athlete performing the workset.
+            date (date, optional): The date of the workset. Defaults to None.
+            is_max (bool, optional): Whether the workset is a max attempt. Defaults to False.
+            reps (int, optional): The number of repetitions for the workset. Defaults to None.
+        """
+        self.id = None
         self.base_max = base_max
         self.base_reps = base_reps
         self.cycle = cycle
@@ -250,24 +335,74 @@ CREATE TABLE IF NOT EXISTS workset (
         self.is_max = is_max
         self.reps = reps
 
+    def to_dict(self):
+        return {
+            "lift_name": self.lift_name,
+            "athlete_name": self.athlete_name,
+            "weight": self.weight,
+            "base_max": self.base_max,
+            "base_reps": self.base_reps,
+            "cycle": self.cycle,
+            "date": self.date,
+            "is_max": self.is_max,
+            "reps": self.reps,
+        }
+
+    @staticmethod
+    def fetch(wsid):
+        """
+        Fetch a workset from the database by its ID.
+
+        Args:
+            wsid (int): The ID of the workset.
+
+        Returns:
+            dict: A dictionary representing the workset, None if there is none.
+        """
+        return get_engine().fetch_workset(wsid)
+
     def add(self):
-        # Handle None values correctly
-        date_value = 'NULL' if self.date is None else f"'{self.date}'"
-        reps_value = 'NULL' if self.reps is None else str(self.reps)
+        """
+        Add the workset to the database and set its `id`.
+        """
+        self.add_many([self])
 
-        insert_query = f"""
-            INSERT INTO workset
-            (lift_name, athlete_name, weight, base_max, base_reps, cycle, date, is_max, reps)
-            VALUES ('{self.lift_name}', '{self.athlete_name}', {self.weight}, {self.base_max}, {self.base_reps}, {self.cycle}, {date_value}, {self.is_max}, {reps_value})
+    @classmethod
+    def add_many(cls, worksets):
         """
-        self._execute(insert_query)
+        Insert several worksets in one transaction and set their `id`.
+
+        Either every workset is stored or, if any insert fails, none are.
+
+        Args:
+            worksets (iterable[Workset]): The worksets to insert.
 
+        Raises:
+            IntegrityError: If a workset collides with an existing one.
+        """
+        engine = cls.engine()
+        worksets = list(worksets)
+        ids = engine.add_worksets([ws.to_dict() for ws in worksets])
+
+        added = {}
+        for ws, wsid in zip(worksets, ids):
+            ws.id = wsid
+            added.setdefault(ws.athlete_name, []).append(wsid)
+
+        for athlete, wsids in added.items():
+            if athlete not in workset_cache:
+                continue
+            # read back the stored rows, with the column types of the database
+            rows = [engine.fetch_workset(wsid) for wsid in wsids]
+            _write_through(athlete, lambda worksets: worksets.with_added(rows))
 
     @staticmethod
     def update_row(wsid, date, lift_name, reps, weight, is_max):
         """
         Update a row in the workset table.
 
+        Empty values, as sent by a form with blank fields, are stored as NULL.
+
         Args:
             wsid (int): The ID of the workset to update.
             date (date): The new date for the workset.
@@ -276,15 +411,24 @@ CREATE TABLE IF NOT EXISTS workset (
             weight (float, optional): The new weight for the workset. Defaults to None.
             is_max (bool)
         """
-        change = f"""
-            UPDATE workset
-            SET date = '{date}', lift_name = '{lift_name}', reps = {reps if reps else "NULL"}, weight = {weight if weight else "NULL"}, is_max = {is_max}
-            where id={wsid}
-        """.replace(
-            "''", "NULL"
+        engine = get_engine()
+        previous = engine.fetch_workset(wsid)
+        engine.update_workset(
+            wsid,
+            date=date or None,
+            lift_name=lift_name or None,
+            reps=reps or None,
+            weight=weight or None,
+            is_max=is_max,
         )
-        Workset._execute(change)
-    
+
+        row = engine.fetch_workset(wsid)
+        if row is not None:
+            _write_through(row["athlete_name"], lambda worksets: worksets.with_updated(row, previous))
+
+    @staticmethod
+    def all():
+        return get_engine().list_rows("workset")
 
     @classmethod
     def delete_by_id(cls, ws_id):
@@ -294,4 +438,9 @@ CREATE TABLE IF NOT EXISTS workset (
         Args:
             ws_id (int): The row ID for the workset table.
         """
-        cls._execute(f"delete from workset where id={ws_id}")
\ No newline at end of file
+        engine = cls.engine()
+        row = engine.fetch_workset(ws_id)
+        engine.delete_workset(ws_id)
+
+        if row is not None:
+            _write_through(row["athlete_name"], lambda worksets: worksets.with_deleted(row["id"], row))
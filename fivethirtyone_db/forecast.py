@@ -0,0 +1,316 @@
+"""
+This module forecasts the maxes of every athlete a few cycles ahead.
+
+The program says how a max should move: every cycle the planner walks the
+base reps through `config["increments"]`, and whenever the cycle index goes
+up the training max grows by `to_add_pr_cycle[lift]` (see
+`analysis.compile_lifts`). Athletes don't follow that line exactly, so the
+forecast simulates many trajectories around it:
+
+    - the history is reduced to the best e1RM of every cycle index per athlete
+      and lift, and the residuals are how much each cycle's best beat or missed
+      the program's increment,
+    - the residuals give each athlete and lift a bias and a noise level
+      (`fit_noise`), with the program's increment as the noise level when
+      there are too few cycles to fit,
+    - starting from the latest e1RM, every cycle that moves the cycle index adds
+      the increment, the bias and normal noise, for `simulations` paths at once
+      in NumPy (`simulate`),
+    - the paths are summarized as percentile bands per cycle ahead.
+
+The simulation runs in chunks of a bounded size, each with its own random
+stream spawned from the seed, so the result only depends on the seed, not on
+the number of processes. `forecast` can spread the chunks over a process pool
+for large rosters.
+
+The module includes the following classes:
+    - Noise
+    - Forecast
+
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import analysis, planner
+from .storage import get_engine
+from .worksets import WorksetStore
+
+# cycles ahead and paths per athlete and lift, by default
+CYCLES = 8
+SIMULATIONS = 2000
+PERCENTILES = (5, 25, 50, 75, 95)
+# fewer residuals than this and the noise falls back to the program increment
+MIN_RESIDUALS = 3
+# floats per simulation chunk, bounds the memory of one batch
+CHUNK_ELEMENTS = 1 << 22
+# below this many series a process pool costs more than it saves
+POOL_MIN_SERIES = 20_000
+
+# athletes as rows, lifts as columns, like a planner.Roster
+Noise = namedtuple("Noise", "bias sigma residuals")
+Noise.__doc__ = """
+The fitted noise of every athlete and lift.
+
+    bias (np.ndarray): Mean residual per cycle index, in kg.
+    sigma (np.ndarray): Standard deviation of the residuals per cycle index.
+    residuals (np.ndarray): The number of residuals each fit is based on.
+"""
+
+Forecast = namedtuple("Forecast", "athletes lifts cycle base_reps start percentiles bands simulated")
+Forecast.__doc__ = """
+The forecast of every athlete, laid out like a Roster.
+
+    cycle, base_reps (np.ndarray): The cycle index and base reps of every
+        cycle ahead, per athlete; -1 where the config has no increment.
+    start (np.ndarray): The latest e1RM per athlete and lift.
+    percentiles (tuple[int]): The percentiles of the bands.
+    bands (np.ndarray): The e1RM at each percentile, shaped (athletes, lifts,
+        cycles, percentiles); NaN for lifts that can't be forecast.
+    simulated (int): The number of simulated cycles, paths times cycles
+        times forecast series.
+"""
+
+
+def cycle_bests(worksets):
+    """
+    Get the best e1RM of every athlete, lift and cycle index.
+
+    Args:
+        worksets (WorksetStore): Worksets of any number of athletes.
+
+    Returns:
+        tuple[np.ndarray]: The athlete codes, lift codes, cycle indices and
+            best e1RMs, sorted by athlete, lift and cycle.
+    """
+    one_rm = analysis.e1rm(worksets)
+    cycle = worksets.column("cycle")
+    keep = ~np.isnan(one_rm) & ~np.isnan(cycle) & (worksets.column("date") != 0)
+    athletes = worksets.column("athlete_name")[keep]
+    lifts = worksets.column("lift_name")[keep]
+    cycle, one_rm = cycle[keep], one_rm[keep]
+
+    order = np.lexsort((cycle, lifts, athletes))
+    athletes, lifts, cycle, one_rm = athletes[order], lifts[order], cycle[order], one_rm[order]
+    if not len(order):
+        return athletes, lifts, cycle, one_rm
+
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (athletes[1:] != athletes[:-1]) | (lifts[1:] != lifts[:-1]) | (cycle[1:] != cycle[:-1])
+    starts = np.flatnonzero(first)
+    return athletes[starts], lifts[starts], cycle[starts], np.maximum.reduceat(one_rm, starts)
+
+
+def fit_noise(roster, worksets, to_add):
+    """
+    Fit the bias and noise of every athlete and lift to their history.
+
+    A residual is the change of the best e1RM from one cycle index to the
+    next, minus the program increment for that many cycles. Residuals over a
+    gap of several cycles count as that many cycles of noise.
+
+    Args:
+        roster (planner.Roster): The athletes and lifts.
+        worksets (WorksetStore): Their worksets.
+        to_add (np.ndarray): The increment per cycle index of each lift.
+
+    Returns:
+        Noise: The fit, shaped like `roster.one_rm`.
+    """
+    shape = roster.one_rm.shape
+    athletes, lifts, cycle, best = cycle_bests(worksets)
+
+    # the roster row and column of every cycle best, -1 if not in the roster
+    athlete_index = {athlete: i for i, athlete in enumerate(roster.athletes)}
+    rows = np.array([athlete_index.get(a, -1) for a in worksets.categories("athlete_name")] + [-1])[athletes]
+    lift_index = {lift: j for j, lift in enumerate(roster.lifts)}
+    columns = np.array([lift_index.get(lift, -1) for lift in worksets.categories("lift_name")] + [-1])[lifts]
+
+    # consecutive cycles of the same athlete and lift
+    pair = (athletes[1:] == athletes[:-1]) & (lifts[1:] == lifts[:-1]) & (rows[1:] >= 0) & (columns[1:] >= 0)
+    series = np.ravel_multi_index((rows[1:][pair], columns[1:][pair]), shape) if pair.any() else np.array([], int)
+    gap = (cycle[1:] - cycle[:-1])[pair]
+    residual = (best[1:] - best[:-1])[pair] - gap * to_add[columns[1:][pair]]
+
+    size = shape[0] * shape[1]
+    count = np.bincount(series, minlength=size)
+    bias = np.bincount(series, residual, size) / np.maximum(np.bincount(series, gap, size), 1)
+    # a residual over `gap` cycles has `gap` times the variance of one cycle
+    squares = np.bincount(series, (residual - gap * bias[series]) ** 2 / gap, size)
+    sigma = np.sqrt(squares / np.maximum(count - 1, 1))
+
+    fitted = count >= MIN_RESIDUALS
+    fallback = np.broadcast_to(to_add, shape).ravel()
+    return Noise(
+        np.where(fitted, bias, 0).reshape(shape),
+        np.where(fitted, sigma, fallback).reshape(shape),
+        count.reshape(shape),
+    )
+
+
+def schedule(roster, settings, cycles):
+    """
+    Walk every athlete's base reps through the config increments.
+
+    Returns:
+        tuple[np.ndarray]: The cycle index and base reps of every cycle ahead,
+            shaped (athletes, cycles), -1 once the config has no increment.
+    """
+    cycle = np.empty((len(roster.athletes), cycles), dtype=int)
+    base_reps = np.empty_like(cycle)
+    current_cycle, current_base_reps = roster.cycle, roster.base_reps
+    for step in range(cycles):
+        current_cycle, current_base_reps = planner.next_cycles(current_cycle, current_base_reps, settings)
+        cycle[:, step], base_reps[:, step] = current_cycle, current_base_reps
+    # -1 would read as NULL base reps the next cycle; an athlete that can't
+    # be planned stays unplanned
+    unknown = np.cumsum(base_reps < 0, axis=1) > 0
+    cycle[unknown], base_reps[unknown] = -1, -1
+    return cycle, base_reps
+
+
+def simulate(start, drift, sigma, gains, simulations, percentiles=PERCENTILES, seed=None):
+    """
+    Simulate e1RM paths and summarize them as percentile bands.
+
+    Every cycle adds `gains` times the drift and normal noise with `gains`
+    times the variance; cycles that don't move the cycle index (gain 0) keep
+    the max.
+
+    Args:
+        start (np.ndarray): The starting e1RM of each series.
+        drift (np.ndarray): The expected change per cycle index of each series.
+        sigma (np.ndarray): The noise per cycle index of each series.
+        gains (np.ndarray): The cycle index increments, shaped (series, cycles).
+        simulations (int): The number of paths per series.
+        percentiles (tuple[int], optional): The percentiles of the bands.
+        seed (int | np.random.SeedSequence, optional): The random seed.
+
+    Returns:
+        np.ndarray: The bands, shaped (series, cycles, percentiles).
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((len(start), simulations, gains.shape[1]))
+    noise *= (np.sqrt(gains) * sigma[:, None])[:, None, :]
+    noise += (gains * drift[:, None])[:, None, :]
+    paths = np.cumsum(noise, axis=2, out=noise)
+    paths += start[:, None, None]
+    return np.moveaxis(np.percentile(paths, percentiles, axis=1), 0, -1)
+
+
+def _simulate_chunk(args):
+    return simulate(*args)
+
+
+def _chunks(start, drift, sigma, gains, simulations, percentiles, seed):
+    # the simulate() arguments of each chunk, each with its own random stream
+    rows = max(1, CHUNK_ELEMENTS // (simulations * max(gains.shape[1], 1)))
+    bounds = list(range(0, len(start), rows)) + [len(start)]
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds) - 1)
+    return [
+        (start[a:b], drift[a:b], sigma[a:b], gains[a:b], simulations, percentiles, chunk_seed)
+        for a, b, chunk_seed in zip(bounds[:-1], bounds[1:], seeds)
+    ]
+
+
+def forecast(
+    roster,
+    worksets,
+    settings=None,
+    cycles=CYCLES,
+    simulations=SIMULATIONS,
+    percentiles=PERCENTILES,
+    seed=None,
+    workers=None,
+):
+    """
+    Forecast the e1RM of every athlete and lift `cycles` cycles ahead.
+
+    Args:
+        roster (planner.Roster): The athletes, see `planner.load_roster`.
+        worksets (WorksetStore): Their worksets, the history the noise is
+            fitted to.
+        settings (planner.PlanSettings, optional): Defaults to the program config.
+        cycles (int, optional): The number of cycles ahead.
+        simulations (int, optional): The number of paths per athlete and lift.
+        percentiles (tuple[int], optional): The percentiles of the bands.
+        seed (int, optional): The random seed; the same seed gives the same
+            forecast, with or without workers.
+        workers (int, optional): Worker processes. The pool is only used with
+            more than one worker and at least POOL_MIN_SERIES series.
+
+    Returns:
+        Forecast: The forecast.
+    """
+    settings = settings or planner.settings_from_config()
+    to_add = np.array([settings.to_add[lift] for lift in roster.lifts], dtype=float)
+    noise = fit_noise(roster, worksets, to_add)
+    cycle, base_reps = schedule(roster, settings, cycles)
+
+    # the cycle index increments of each cycle ahead
+    previous = np.column_stack([roster.cycle, cycle[:, :-1]])
+    gains = np.where(base_reps >= 0, cycle - previous, 0).clip(0)
+
+    # one series per athlete and lift that has a max and a schedule
+    valid = ~np.isnan(roster.one_rm) & (base_reps[:, :1] >= 0)
+    rows, columns = np.nonzero(valid)
+    chunks = _chunks(
+        roster.one_rm[rows, columns],
+        (to_add[None, :] + noise.bias)[rows, columns],
+        noise.sigma[rows, columns],
+        gains[rows].astype(float),
+        simulations,
+        tuple(percentiles),
+        seed,
+    )
+
+    if workers and workers > 1 and len(rows) >= POOL_MIN_SERIES:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_simulate_chunk, chunks))
+    else:
+        parts = [_simulate_chunk(chunk) for chunk in chunks]
+
+    bands = np.full(roster.one_rm.shape + (cycles, len(percentiles)), np.nan)
+    if parts:
+        bands[rows, columns] = np.concatenate(parts)
+    return Forecast(
+        roster.athletes,
+        roster.lifts,
+        cycle,
+        base_reps,
+        roster.one_rm,
+        tuple(percentiles),
+        bands,
+        len(rows) * simulations * cycles,
+    )
+
+
+def forecast_all(cycles=CYCLES, simulations=SIMULATIONS, seed=None, workers=None):
+    """
+    Load the roster and the workset history, and forecast every athlete.
+
+    Args:
+        cycles (int, optional): See `forecast`.
+        simulations (int, optional): See `forecast`.
+        seed (int, optional): See `forecast`.
+        workers (int, optional): See `forecast`.
+
+    Returns:
+        tuple[Forecast, dict]: The forecast and the seconds spent per phase,
+            keyed load and forecast.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    roster = planner.load_roster(include_planned=True)
+    worksets = WorksetStore.from_records(get_engine().list_rows("workset"))
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = forecast(roster, worksets, cycles=cycles, simulations=simulations, seed=seed, workers=workers)
+    timings["forecast"] = time.perf_counter() - start
+
+    return result, timings
@@ -0,0 +1,313 @@
+"""
+This module provides versioned schema migrations for both database backends.
+
+Migrations are numbered and applied in order. The version of every applied
+migration is recorded in the `schema_version` table, so running `migrate` again
+only applies the ones that are missing.
+
+Migrations run against a SQL storage engine, which provides `connection()` and
+a `dialect` name matching a field of `Migration`.
+
+Examples:
+
+    from fivethirtyone_db import migrations, storage
+    engine = storage.get_engine()
+    migrations.migrate(engine)
+    for name, sql, plan in migrations.explain(engine):
+        print(name, plan)
+"""
+
+import contextlib
+import datetime
+from collections import namedtuple
+
+Migration = namedtuple("Migration", "version description sqlite mysql")
+
+CREATE_SCHEMA_VERSION = {
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS schema_version (
+  version INTEGER NOT NULL PRIMARY KEY,
+  description TEXT,
+  applied_at TEXT
+);""",
+    "mysql": """
+CREATE TABLE IF NOT EXISTS schema_version (
+  version int NOT NULL PRIMARY KEY,
+  description varchar(255),
+  applied_at datetime
+);""",
+}
+
+PLACEHOLDER = {"sqlite": "?", "mysql": "%s"}
+
+# the MySQL named lock held while migrating, see `_migration_lock`
+LOCK_NAME = "fivethirtyone_db.migrate"
+LOCK_TIMEOUT = 60
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "baseline lift, athlete and workset tables",
+        sqlite=[
+            """
+CREATE TABLE IF NOT EXISTS lift (
+  name TEXT NOT NULL PRIMARY KEY
+);""",
+            """
+CREATE TABLE IF NOT EXISTS athlete (
+  name TEXT NOT NULL PRIMARY KEY,
+  password TEXT
+);""",
+            """
+CREATE TABLE IF NOT EXISTS workset (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  base_max REAL,
+  base_reps INTEGER,
+  cycle INTEGER,
+  weight REAL,
+  reps INTEGER,
+  lift_name TEXT,
+  athlete_name TEXT,
+  date TEXT,
+  is_max BOOLEAN,
+  UNIQUE (lift_name, athlete_name, date)
+);""",
+        ],
+        mysql=[
+            """
+CREATE TABLE IF NOT EXISTS lift (
+  name varchar(31) NOT NULL PRIMARY KEY
+);""",
+            """
+CREATE TABLE IF NOT EXISTS athlete (
+  name varchar(31) NOT NULL PRIMARY KEY,
+  password varchar(120)
+);""",
+            """
+CREATE TABLE IF NOT EXISTS workset (
+  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,
+  base_max float,
+  base_reps int,
+  cycle int,
+  weight float,
+  reps int,
+  lift_name varchar(31),
+  athlete_name varchar(31),
+  date date,
+  is_max boolean,
+  UNIQUE KEY `uc_set` (`lift_name`, `athlete_name`, `date`),
+  KEY lift_name_idx (lift_name),
+  KEY athlete_name_idx (athlete_name)
+);""",
+        ],
+    ),
+    Migration(
+        2,
+        "index workset by athlete first, for the per-athlete queries",
+        sqlite=[
+            "CREATE INDEX IF NOT EXISTS ix_workset_athlete_date ON workset (athlete_name, date)",
+            "CREATE INDEX IF NOT EXISTS ix_workset_athlete_lift_max_date ON workset (athlete_name, lift_name, is_max, date)",
+        ],
+        mysql=[
+            "CREATE INDEX ix_workset_athlete_date ON workset (athlete_name, date)",
+            "CREATE INDEX ix_workset_athlete_lift_max_date ON workset (athlete_name, lift_name, is_max, date)",
+            # athlete_name is the leading column of both new indexes
+            "DROP INDEX athlete_name_idx ON workset",
+        ],
+    ),
+    Migration(
+        3,
+        "athlete data version, bumped on every workset write",
+        sqlite=["ALTER TABLE athlete ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"],
+        mysql=["ALTER TABLE athlete ADD COLUMN data_version int NOT NULL DEFAULT 0"],
+    ),
+    Migration(
+        4,
+        "time of the last workset write, in seconds since the epoch",
+        sqlite=["ALTER TABLE athlete ADD COLUMN data_modified INTEGER NOT NULL DEFAULT 0"],
+        mysql=["ALTER TABLE athlete ADD COLUMN data_modified bigint NOT NULL DEFAULT 0"],
+    ),
+    Migration(
+        5,
+        "index workset by athlete and id, for keyset pagination",
+        sqlite=[
+            "CREATE INDEX IF NOT EXISTS ix_workset_athlete_id ON workset (athlete_name, id)",
+            "CREATE INDEX IF NOT EXISTS ix_workset_athlete_lift_id ON workset (athlete_name, lift_name, id)",
+        ],
+        mysql=[
+            "CREATE INDEX ix_workset_athlete_id ON workset (athlete_name, id)",
+            "CREATE INDEX ix_workset_athlete_lift_id ON workset (athlete_name, lift_name, id)",
+        ],
+    ),
+    Migration(
+        6,
+        "change log of workset writes, by athlete and data version",
+        sqlite=[
+            """
+CREATE TABLE IF NOT EXISTS workset_change (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  athlete_name TEXT NOT NULL,
+  version INTEGER NOT NULL,
+  workset_id INTEGER NOT NULL,
+  op TEXT NOT NULL,
+  changed INTEGER NOT NULL
+);""",
+            "CREATE INDEX IF NOT EXISTS ix_workset_change_athlete_version ON workset_change (athlete_name, version)",
+            # the worksets written so far aren't in the log; move every athlete
+            # to a version the log can't answer for, so clients start over
+            "UPDATE athlete SET data_version = data_version + 1",
+        ],
+        mysql=[
+            """
+CREATE TABLE IF NOT EXISTS workset_change (
+  seq bigint NOT NULL AUTO_INCREMENT PRIMARY KEY,
+  athlete_name varchar(31) NOT NULL,
+  version int NOT NULL,
+  workset_id int NOT NULL,
+  op varchar(6) NOT NULL,
+  changed bigint NOT NULL,
+  KEY ix_workset_change_athlete_version (athlete_name, version)
+);""",
+            "UPDATE athlete SET data_version = data_version + 1",
+        ],
+    ),
+]
+
+# The queries every page view runs, checked by `explain`: each gives the SQL
+# the engine runs, with sample parameters.
+HOT_QUERIES = {
+    "load worksets": lambda engine: (engine.sql["load_worksets"], ("camilla",)),
+    "worksets to do": lambda engine: (engine.sql["worksets_to_do"], ("camilla",)),
+    "latest max": lambda engine: (engine.sql["latest_max"], ("camilla", "bench")),
+    "latest maxes": lambda engine: (engine.sql["latest_maxes"], ("camilla", "camilla")),
+    "latest cycle": lambda engine: (engine.sql["latest_cycle"], ("camilla",)),
+    "worksets page": lambda engine: engine.worksets_query("camilla", after=0, limit=100),
+    "lift worksets page": lambda engine: engine.worksets_query("camilla", lift="bench", after=0, limit=100),
+}
+
+
+def current_version(engine):
+    """
+    Get the highest migration version applied to the database.
+
+    Args:
+        engine (SQLEngine): The storage engine.
+
+    Returns:
+        int: The schema version, 0 for a database that was never migrated.
+    """
+    with engine.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_SCHEMA_VERSION[engine.dialect])
+        conn.commit()
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        (version,) = cursor.fetchone()
+        return version or 0
+
+
+@contextlib.contextmanager
+def _migration_lock(engine):
+    # serialize migrating processes, e.g. web workers starting together;
+    # SQLite takes its write lock per migration, see `migrate`
+    if engine.dialect != "mysql":
+        yield
+        return
+    with engine.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        (locked,) = cursor.fetchone()
+        if not locked:
+            raise RuntimeError(f"another process is still migrating the database after {LOCK_TIMEOUT} s")
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+
+
+def migrate(engine, target=None):
+    """
+    Apply all migrations newer than the current schema version.
+
+    Each migration runs in its own transaction together with its
+    `schema_version` row. Note that MySQL commits DDL implicitly, so a
+    migration that fails halfway there has to be cleaned up by hand.
+
+    Several processes may migrate at once: each migration is applied by one
+    of them, the others wait for it and skip it.
+
+    Args:
+        engine (SQLEngine): The storage engine.
+        target (int, optional): Stop after this version. Defaults to the latest.
+
+    Returns:
+        list[Migration]: The migrations that were applied.
+    """
+    version = current_version(engine)
+    p = PLACEHOLDER[engine.dialect]
+    applied = []
+
+    if all(migration.version <= version for migration in MIGRATIONS):
+        return applied
+
+    with _migration_lock(engine):
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            if target is not None and migration.version > target:
+                break
+
+            with engine.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    if engine.dialect == "sqlite":
+                        # sqlite3 doesn't open a transaction for DDL on its own;
+                        # take the write lock before reading the version
+                        cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute("SELECT MAX(version) FROM schema_version")
+                    if (cursor.fetchone()[0] or 0) >= migration.version:
+                        # applied by another process meanwhile
+                        conn.rollback()
+                        continue
+                    for statement in getattr(migration, engine.dialect):
+                        cursor.execute(statement)
+                    cursor.execute(
+                        f"INSERT INTO schema_version (version, description, applied_at) VALUES ({p}, {p}, {p})",
+                        (
+                            migration.version,
+                            migration.description,
+                            datetime.datetime.now().isoformat(sep=" ", timespec="seconds"),
+                        ),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            applied.append(migration)
+
+    return applied
+
+
+def explain(engine):
+    """
+    Get the query plan of every query in HOT_QUERIES.
+
+    Args:
+        engine (SQLEngine): The storage engine.
+
+    Returns:
+        list[tuple]: (name, sql, plan) where plan is a list of lines.
+    """
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect == "sqlite" else "EXPLAIN"
+    plans = []
+
+    with engine.connection() as conn:
+        cursor = conn.cursor()
+        for name, query in HOT_QUERIES.items():
+            sql, params = query(engine)
+            cursor.execute(f"{prefix} {sql}", params)
+            plan = [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+            plans.append((name, sql, plan))
+
+    return plans
@@ -0,0 +1,169 @@
+"""
+This module provides a disk cache of rendered program PDFs.
+
+A program PDF is a pure function of its HTML, which `blog` renders from the
+program, the athlete name, the cycle and the base reps. The cache is content
+addressed: the key of a PDF is the SHA-256 of its source, the HTML or the
+program drawn by ReportLab (see `pdfjobs.cache_source`), so a program that
+didn't change is never rendered twice, and the key doubles as a strong ETag.
+
+Files are written to a temporary name and renamed into place, so readers in
+other processes never see a partial PDF. Every hit touches the file's
+modification time, and writes evict the least recently used files until the
+cache is below `max_bytes`.
+
+The cache directory, like the job directory of `pdfjobs`, is only readable
+and writable by the user running the app, see `private_dir`.
+
+The module includes the following classes:
+    - PDFCache
+
+"""
+
+import getpass
+import hashlib
+import os
+import pathlib
+import tempfile
+import threading
+
+# per user: cached PDFs are athletes' programs, and a file planted there would
+# be served as one
+CACHE_DIR = pathlib.Path(
+    os.environ.get("FTO_PDF_CACHE_DIR", pathlib.Path(tempfile.gettempdir()) / f"fto-pdf-cache-{getpass.getuser()}")
+)
+# bytes of PDFs kept before the least recently used are evicted
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def private_dir(path):
+    """
+    Create a directory only its owner can read, or check an existing one.
+
+    Raises:
+        PermissionError: If the directory belongs to another user.
+    """
+    path = pathlib.Path(path)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if hasattr(os, "getuid"):
+        stat = path.stat()
+        if stat.st_uid != os.getuid():
+            raise PermissionError(f"{path} belongs to another user")
+        if stat.st_mode & 0o077:
+            path.chmod(0o700)
+    return path
+
+
+class PDFCache:
+    """
+    Content addressed, size bounded cache of PDFs in a directory.
+
+    Several processes can share the directory; the hit and miss counters are
+    per object.
+
+    Args:
+        directory (str | pathlib.Path, optional): Defaults to CACHE_DIR.
+        max_bytes (int, optional): Defaults to MAX_BYTES.
+
+    Examples:
+
+        cache = PDFCache()
+        key = cache.key(html)
+        path = cache.get(key) or cache.put(key, render_pdf(html))
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = private_dir(directory or CACHE_DIR)
+        self.max_bytes = max_bytes or MAX_BYTES
+        self._lock = threading.Lock()
+        self._counters = dict(hits=0, misses=0)
+
+    @staticmethod
+    def key(source):
+        """
+        Get the key of the PDF made from a source text, e.g. HTML.
+        """
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    def path(self, key):
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key):
+        """
+        Get the path of a cached PDF, None on a miss.
+
+        A hit makes the PDF the most recently used one.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            path = None
+        with self._lock:
+            self._counters["misses" if path is None else "hits"] += 1
+        return path
+
+    def put(self, key, pdf):
+        """
+        Store a PDF and evict the least recently used ones over `max_bytes`.
+
+        Returns:
+            pathlib.Path: The path of the PDF.
+        """
+        path = self.path(key)
+        # unique per process, then atomically renamed into place
+        tmp = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(pdf)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def _files(self):
+        # (mtime, size, path) of every cached PDF, least recently used first
+        files = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return sorted(files)
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used PDFs until the cache fits `max_bytes`.
+
+        Args:
+            keep (pathlib.Path, optional): A PDF that is never removed, e.g.
+                the one just stored.
+
+        Returns:
+            int: The number of PDFs removed.
+        """
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """
+        Hit and miss counters of this object and the size of the cache.
+        """
+        files = self._files()
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(
+                **self._counters,
+                hit_ratio=self._counters["hits"] / lookups if lookups else None,
+                files=len(files),
+                bytes=sum(size for _, size, _ in files),
+                max_bytes=self.max_bytes,
+            )
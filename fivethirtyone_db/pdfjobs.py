@@ -0,0 +1,413 @@
+"""
+This module renders program PDFs in a background process pool.
+
+xhtml2pdf is pure Python and CPU-bound, so rendering inside the request would
+keep one of the few gunicorn workers busy for the whole conversion. Instead
+the request renders the HTML (cheap) and submits it as a job; a bounded
+process pool converts it to PDF while the web worker goes on serving pages.
+
+There are two engines. "html" converts the program page with xhtml2pdf, which
+parses the HTML and its stylesheets; "reportlab" draws the program, the
+output of `blog.worksets_to_program` with the athlete name, cycle and base
+reps, straight onto the page with ReportLab, which xhtml2pdf uses underneath.
+
+Jobs live in JOB_DIR as files, so any web worker on the host can answer for
+any job:
+
+    <id>.json   the job: athlete, state, cache key, submit/start/finish times
+
+The PDFs themselves go to a `pdfcache.PDFCache` under the key of their HTML.
+A program that was rendered before is served from there without a job ever
+reaching the pool, and a program that is already being rendered by this web
+worker gets the job that renders it.
+
+A job goes through the states queued, running and then done or failed. Each web
+worker accepts at most `max_pending` unfinished jobs and refuses more with
+`QueueFull`, so a burst of downloads can't grow the queue without bound. Job
+files are removed JOB_TTL seconds after they were submitted; the cache evicts
+PDFs by size.
+
+The module includes the following classes:
+    - QueueFull
+    - JobPool
+
+"""
+
+import functools
+import getpass
+import io
+import json
+import multiprocessing
+import os
+import pathlib
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .pdfcache import PDFCache, private_dir
+
+# render processes per web worker
+WORKERS = int(os.environ.get("FTO_PDF_WORKERS", 2))
+# unfinished jobs per web worker before submissions are refused
+MAX_PENDING = 8
+# seconds a job and its PDF are kept
+JOB_TTL = 3600
+# per user: jobs hold athletes' programs
+JOB_DIR = pathlib.Path(
+    os.environ.get("FTO_PDF_JOB_DIR", pathlib.Path(tempfile.gettempdir()) / f"fto-pdf-jobs-{getpass.getuser()}")
+)
+# the engine used unless the app config or the request picks one
+ENGINE = os.environ.get("FTO_PDF_ENGINE", "html")
+
+
+class QueueFull(Exception):
+    """
+    Raised when a web worker already has `max_pending` unfinished jobs.
+    """
+
+
+def render_pdf(html):
+    """
+    Convert an HTML document to PDF.
+
+    Returns:
+        bytes: The PDF.
+
+    Raises:
+        ValueError: If xhtml2pdf reports errors.
+    """
+    from xhtml2pdf import pisa
+
+    out = io.BytesIO()
+    status = pisa.CreatePDF(html, dest=out)
+    if status.err:
+        raise ValueError(f"xhtml2pdf reported {status.err} errors")
+    return out.getvalue()
+
+
+def draw_pdf(program):
+    """
+    Draw a program on A4 pages with ReportLab.
+
+    Args:
+        program (dict): name, cycle, base_reps and worksets_to_do, a list of
+            {"lift", "reps", "weight"} as made by `blog.worksets_to_program`.
+
+    Returns:
+        bytes: The PDF.
+    """
+    from xml.sax.saxutils import escape
+
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    # the look of blog/program.html
+    title = ParagraphStyle("title", fontName="Helvetica", fontSize=36, leading=44, alignment=1, spaceBefore=20)
+    subtitle = ParagraphStyle(
+        "subtitle", fontName="Helvetica", fontSize=24, leading=30, alignment=1, textColor=colors.gray, spaceAfter=10
+    )
+    cells = TableStyle([
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 12),
+        ("TEXTCOLOR", (0, 0), (-1, -1), colors.HexColor("#333333")),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("TOPPADDING", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+    ])
+
+    out = io.BytesIO()
+    # invariant: the same program gives the same bytes
+    doc = SimpleDocTemplate(out, pagesize=A4, title=str(program["name"]), invariant=True)
+    story = [
+        Paragraph(escape(str(program["name"])), title),
+        Paragraph(f"stage {program['base_reps']} / cycle {program['cycle']}", subtitle),
+    ]
+    for ws in program["worksets_to_do"]:
+        table = Table([ws["reps"], ws["weight"]], colWidths=doc.width / max(len(ws["reps"]), 1), style=cells)
+        story.append(KeepTogether([Paragraph(escape(str(ws["lift"])), subtitle), table, Spacer(1, 20)]))
+    doc.build(story)
+    return out.getvalue()
+
+
+# engine name: function from the document to the PDF bytes
+ENGINES = {"html": render_pdf, "reportlab": draw_pdf}
+
+
+def cache_source(engine, document):
+    """
+    The text the PDF cache key of a document is the hash of.
+
+    HTML is its own source; a program is keyed by the engine and its JSON.
+    """
+    if engine == "html":
+        return document
+    return f"{engine}\n{json.dumps(document, sort_keys=True, default=str)}"
+
+
+def _write(path, data):
+    # readers never see a half written file
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _update(job_dir, job_id, **values):
+    path = pathlib.Path(job_dir) / f"{job_id}.json"
+    job = json.loads(path.read_text())
+    job.update(values)
+    _write(path, json.dumps(job).encode())
+    return job
+
+
+def _run(job_dir, job_id, document, cache_dir, cache_bytes):
+    # in a pool process: render one job into the cache
+    started = time.time()
+    job = _update(job_dir, job_id, state="running", started=started)
+    try:
+        pdf = ENGINES[job["engine"]](document)
+    except Exception as e:
+        return _update(job_dir, job_id, state="failed", finished=time.time(), error=str(e))
+    PDFCache(cache_dir, cache_bytes).put(job["key"], pdf)
+    return _update(job_dir, job_id, state="done", finished=time.time(), size=len(pdf))
+
+
+class JobPool:
+    """
+    A bounded pool of processes rendering PDF jobs.
+
+    The processes are started with "spawn" on first use, never forked from a
+    web worker's threads.
+
+    Args:
+        workers (int, optional): Render processes. Defaults to WORKERS.
+        max_pending (int, optional): Unfinished jobs before `submit` refuses
+            more. Defaults to MAX_PENDING.
+        job_dir (str | pathlib.Path, optional): Where jobs are kept. Defaults
+            to JOB_DIR.
+        cache (pdfcache.PDFCache, optional): Where PDFs are kept. Defaults to
+            one in `pdfcache.CACHE_DIR`.
+
+    Examples:
+
+        pool = JobPool()
+        job_id = pool.submit("camilla", html)
+        job_id = pool.submit("camilla", program, engine="reportlab")
+        pool.status(job_id)["state"]  # "queued", "running", "done" or "failed"
+    """
+
+    def __init__(self, workers=None, max_pending=None, job_dir=None, cache=None):
+        self.workers = workers or WORKERS
+        self.max_pending = MAX_PENDING if max_pending is None else max_pending
+        self.job_dir = private_dir(job_dir or JOB_DIR)
+        self.cache = cache or PDFCache()
+        self._lock = threading.Lock()
+        self._executor = None
+        # unfinished future: the executor running it
+        self._futures = {}
+        self._pending = 0
+        # cache key: id of the unfinished job rendering it
+        self._rendering = {}
+        self._counters = dict(submitted=0, rejected=0, cached=0, joined=0, done=0, failed=0)
+        # over the jobs that ran to the end, done or failed
+        self._seconds = dict(jobs=0, wait=0.0, render=0.0, render_max=0.0)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _discard_executor(self, executor=None):
+        # a broken pool refuses every job; the next one starts a new pool
+        with self._lock:
+            if executor is None or self._executor is executor:
+                executor, self._executor = self._executor, None
+            else:
+                executor = None
+            queued = [future for future, runner in self._futures.items() if runner is executor]
+        if executor is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9
+            for future in queued:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _finished(self, job_id, key, future):
+        try:
+            job = future.result()
+        except Exception as e:
+            # the process died, the job file still says queued or running
+            job = None
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor()
+            try:
+                _update(self.job_dir, job_id, state="failed", finished=time.time(), error=f"render process died: {e!r}")
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._futures.pop(future, None)
+            self._pending -= 1
+            self._rendering.pop(key, None)
+            if job is None:
+                self._counters["failed"] += 1
+                return
+            self._counters[job["state"]] += 1
+            if "started" in job:
+                render = job["finished"] - job["started"]
+                self._seconds["jobs"] += 1
+                self._seconds["wait"] += job["started"] - job["submitted"]
+                self._seconds["render"] += render
+                self._seconds["render_max"] = max(self._seconds["render_max"], render)
+
+    def submit(self, athlete, document, engine="html"):
+        """
+        Queue an athlete's program for rendering.
+
+        Args:
+            athlete (str): The name of the athlete.
+            document (str | dict): The program HTML for the "html" engine,
+                the program for "reportlab", see `ENGINES`.
+            engine (str, optional): Defaults to "html".
+
+        If its PDF is cached, the job is done right away; if it is being
+        rendered by another unfinished job, that job is returned.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFull: If `max_pending` jobs are still unfinished.
+            ValueError: If there is no such engine.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"unknown PDF engine {engine!r}, use one of {', '.join(ENGINES)}")
+        key = self.cache.key(cache_source(engine, document))
+        cached = self.cache.get(key)
+        with self._lock:
+            if cached is None and key in self._rendering:
+                self._counters["joined"] += 1
+                return self._rendering[key]
+            if cached is None and self._pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise QueueFull(f"{self._pending} PDF jobs are still unfinished")
+            self._counters["submitted"] += 1
+            if cached is None:
+                self._pending += 1
+                job_id = self._rendering[key] = uuid.uuid4().hex
+            else:
+                self._counters["cached"] += 1
+                job_id = uuid.uuid4().hex
+
+        self.expire()
+        job = dict(id=job_id, athlete=athlete, engine=engine, key=key, state="queued", submitted=time.time())
+        if cached is not None:
+            job.update(state="done", finished=job["submitted"], size=cached.stat().st_size)
+        _write(self.job_dir / f"{job_id}.json", json.dumps(job).encode())
+        if cached is not None:
+            return job_id
+
+        args = (_run, str(self.job_dir), job_id, document, str(self.cache.directory), self.cache.max_bytes)
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(*args)
+            except BrokenProcessPool:
+                # a process died since the last job; try once with a new pool
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(*args)
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+                self._rendering.pop(key, None)
+                self._counters["failed"] += 1
+            _update(self.job_dir, job_id, state="failed", finished=time.time(), error=f"not queued: {e!r}")
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor()
+            raise
+        with self._lock:
+            self._futures[future] = executor
+        future.add_done_callback(functools.partial(self._finished, job_id, key))
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get a job, None if there is no such job (any more).
+
+        Returns:
+            dict: id, athlete, state and the times in seconds since the epoch.
+        """
+        if not job_id.isalnum():
+            return None
+        try:
+            return json.loads((self.job_dir / f"{job_id}.json").read_text())
+        except FileNotFoundError:
+            return None
+
+    def pdf_path(self, job):
+        """
+        Get the path of a done job's PDF, None if it was evicted from the cache.
+        """
+        path = self.cache.path(job["key"])
+        return path if path.exists() else None
+
+    def expire(self, now=None):
+        """
+        Remove the files of jobs submitted more than JOB_TTL seconds ago.
+        """
+        cutoff = (now or time.time()) - JOB_TTL
+        for path in self.job_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff and json.loads(path.read_text())["submitted"] < cutoff:
+                    path.unlink(missing_ok=True)
+            except (FileNotFoundError, ValueError):
+                # removed or being replaced by another worker
+                pass
+
+    def stats(self):
+        """
+        Queue depth, job counters and render times of this web worker.
+
+        `cached` jobs were served from the PDF cache and `joined` submissions
+        got a job already rendering the same PDF; `cache` has the counters of
+        `PDFCache.stats`.
+        """
+        cache = self.cache.stats()
+        with self._lock:
+            jobs = self._seconds["jobs"]
+            return dict(
+                pending=self._pending,
+                max_pending=self.max_pending,
+                workers=self.workers,
+                **self._counters,
+                wait_avg=self._seconds["wait"] / jobs if jobs else None,
+                render_avg=self._seconds["render"] / jobs if jobs else None,
+                render_max=self._seconds["render_max"],
+                cache=cache,
+            )
+
+    def close(self):
+        """
+        Wait for the jobs that are still running and stop the processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_pool = None
+_pid = None
+
+
+def get_pool():
+    """
+    Get the job pool of this process, a new one after a fork.
+    """
+    global _pool, _pid
+    if _pool is None or _pid != os.getpid():
+        _pool, _pid = JobPool(), os.getpid()
+    return _pool
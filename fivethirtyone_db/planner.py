@@ -0,0 +1,307 @@
+"""
+This module plans the next cycle of every athlete at once.
+
+It does in bulk what the "new cycle" form does for one athlete: take the next
+cycle index and base reps from `Athlete.estimate_next_cycle`, the 1RM estimated
+from the latest max set of each lift, and add one planned workset per lift with
+the weight of the program's top set.
+
+`load_roster` reads the whole roster with a few queries, independent of the
+number of athletes, into arrays. `compute_plan` then works on those arrays
+with vectorized NumPy; it produces the same weights as `analysis.compile_lifts`.
+For very large rosters `plan` can split the work over a process pool.
+`write_plan` stores every planned workset in one transaction.
+
+The module includes the following classes:
+    - Roster
+    - PlanSettings
+    - Plan
+
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import analysis, db, get_config
+from .storage import get_engine
+from .worksets import WorksetStore
+
+# below this many athletes a process pool costs more than it saves
+POOL_MIN_ATHLETES = 100_000
+
+# base reps are stored as their value + 1 in the lookup tables, 0 for NULL
+_NO_BASE_REPS = -1
+_TABLE_SIZE = 7
+
+# athletes as rows, config["lifts"] as columns
+Roster = namedtuple("Roster", "athletes lifts cycle base_reps one_rm")
+Roster.__doc__ = """
+The current state of every athlete.
+
+    athletes (tuple[str]): The athlete names.
+    lifts (tuple[str]): The lifts, the columns of `one_rm`.
+    cycle (np.ndarray): Current cycle per athlete, -1 before the first one.
+    base_reps (np.ndarray): Current base reps per athlete, -1 for NULL.
+    one_rm (np.ndarray): Estimated 1RM per athlete and lift, NaN without a max set.
+"""
+
+PlanSettings = namedtuple("PlanSettings", "next_base_reps cycle_increment top_pct to_add increment")
+PlanSettings.__doc__ = """
+The parts of the program config the plan needs, as arrays.
+
+Plain data, so it can be sent to worker processes, which then don't need to
+load the config.
+"""
+
+Plan = namedtuple("Plan", "athletes lifts cycle base_reps one_rm weight")
+Plan.__doc__ = """
+The next cycle of every athlete, laid out like a Roster.
+
+`cycle` and `base_reps` are the next ones, -1 for athletes that can't be
+planned. `weight` is the top set weight per athlete and lift, NaN where the
+lift isn't planned.
+"""
+
+
+def _slot(base_reps):
+    # index of a base reps value in the lookup tables
+    return 0 if base_reps in (None, "None") else int(base_reps) + 1
+
+
+def settings_from_config(config=None):
+    """
+    Get the PlanSettings of the program config, by default `get_config()`.
+    """
+    config = config or get_config()
+    # -1 for base reps the config has no increment for
+    next_base_reps = np.full(_TABLE_SIZE, -1)
+    cycle_increment = np.zeros(_TABLE_SIZE, dtype=int)
+    for base_reps, increment in config["increments"].items():
+        next_base_reps[_slot(base_reps)] = increment["next_base_reps"]
+        cycle_increment[_slot(base_reps)] = increment["cycle_increment"]
+
+    top_pct = np.full(_TABLE_SIZE, np.nan)
+    for base_reps, table in analysis.program_tables().items():
+        if isinstance(base_reps, int):
+            top_pct[_slot(base_reps)] = table.pct[-1]
+
+    return PlanSettings(
+        next_base_reps=next_base_reps,
+        cycle_increment=cycle_increment,
+        top_pct=top_pct,
+        to_add=dict(config["to_add_pr_cycle"]),
+        increment=config["smallest_w_inc"],
+    )
+
+
+def load_roster(engine=None, lifts=None, include_planned=False):
+    """
+    Load the current cycle and estimated 1RMs of every athlete.
+
+    Runs four queries however many athletes there are.
+
+    Args:
+        engine (StorageEngine, optional): Defaults to the active engine.
+        lifts (list[str], optional): Defaults to config["lifts"].
+        include_planned (bool, optional): Also include athletes that still have
+            planned worksets. Left out by default, so running the planner twice
+            doesn't plan a cycle twice.
+
+    Returns:
+        Roster: The roster.
+    """
+    engine = engine or get_engine()
+    lifts = tuple(lifts or get_config()["lifts"])
+
+    athletes = sorted(row["name"] for row in engine.list_rows("athlete"))
+    if not include_planned:
+        planned = engine.athletes_with_worksets_to_do()
+        athletes = [athlete for athlete in athletes if athlete not in planned]
+    index = {athlete: i for i, athlete in enumerate(athletes)}
+
+    cycle = np.full(len(athletes), -1)
+    # like estimate_next_cycle, an athlete without a cycle starts from base reps 0
+    base_reps = np.zeros(len(athletes), dtype=int)
+    for athlete, ws in engine.roster_latest_cycles().items():
+        if athlete in index:
+            cycle[index[athlete]] = ws["cycle"]
+            base_reps[index[athlete]] = _NO_BASE_REPS if ws["base_reps"] is None else ws["base_reps"]
+
+    maxes = [
+        ws
+        for athlete, by_lift in engine.roster_latest_maxes(lifts).items()
+        if athlete in index
+        for ws in by_lift.values()
+        if ws
+    ]
+    one_rm = np.full((len(athletes), len(lifts)), np.nan)
+    if maxes:
+        store = WorksetStore.from_records(maxes)
+        rows = np.array([index[athlete] for athlete in store.values("athlete_name")])
+        columns = np.array([lifts.index(lift) for lift in store.values("lift_name")])
+        one_rm[rows, columns] = analysis.e1rm(store)
+
+    return Roster(tuple(athletes), lifts, cycle, base_reps, one_rm)
+
+
+def next_cycles(cycle, base_reps, settings):
+    """
+    Get the next cycle index and base reps, like `Athlete.estimate_next_cycle`.
+
+    Args:
+        cycle (np.ndarray): The current cycle per athlete.
+        base_reps (np.ndarray): The current base reps per athlete, -1 for NULL.
+        settings (PlanSettings): See `settings_from_config`.
+
+    Returns:
+        tuple[np.ndarray]: The next cycle and base reps per athlete, both -1
+            where the config has no increment or no program for them.
+    """
+    slots = np.clip(base_reps + 1, 0, _TABLE_SIZE - 1)
+    next_base_reps = settings.next_base_reps[slots]
+    next_cycle = cycle + settings.cycle_increment[slots]
+
+    known = (next_base_reps >= 0) & (base_reps + 1 < _TABLE_SIZE)
+    known &= ~np.isnan(settings.top_pct[np.where(known, next_base_reps + 1, 0)])
+    return np.where(known, next_cycle, -1), np.where(known, next_base_reps, -1)
+
+
+def compute_plan(roster, settings):
+    """
+    Plan the next cycle of every athlete in the roster.
+
+    The 1RMs are rounded to 2 decimals like the "new cycle" form sends them,
+    so the weights are those `analysis.compile_lifts` gives for the form's
+    default values.
+
+    Args:
+        roster (Roster): The roster, see `load_roster`.
+        settings (PlanSettings): See `settings_from_config`.
+
+    Returns:
+        Plan: The plan.
+    """
+    cycle, base_reps = next_cycles(roster.cycle, roster.base_reps, settings)
+    known = base_reps >= 0
+    pct = settings.top_pct[np.where(known, base_reps + 1, 0)]
+
+    one_rm = np.round(roster.one_rm, 2)
+    # the compile_lifts arithmetic, on (athletes, lifts) arrays
+    to_add = np.array([settings.to_add[lift] for lift in roster.lifts], dtype=float)
+    train_max = 0.9 * one_rm + to_add[None, :] * cycle[:, None]
+    weight = ((pct[:, None] / 100 * train_max) // settings.increment) * settings.increment
+    weight[~known] = np.nan
+
+    return Plan(roster.athletes, roster.lifts, cycle, base_reps, one_rm, weight)
+
+
+def _split(roster, parts):
+    # the roster in `parts` chunks of consecutive athletes, without the names
+    # the workers don't need
+    bounds = np.linspace(0, len(roster.athletes), parts + 1).astype(int)
+    return [
+        Roster(
+            (),
+            roster.lifts,
+            roster.cycle[start:stop],
+            roster.base_reps[start:stop],
+            roster.one_rm[start:stop],
+        )
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def plan(roster, settings=None, workers=None):
+    """
+    Plan the next cycle of every athlete, in a process pool for large rosters.
+
+    Args:
+        roster (Roster): The roster, see `load_roster`.
+        settings (PlanSettings, optional): Defaults to the program config.
+        workers (int, optional): Worker processes. The pool is only used with
+            more than one worker and at least POOL_MIN_ATHLETES athletes.
+
+    Returns:
+        Plan: The plan.
+    """
+    settings = settings or settings_from_config()
+    if not workers or workers < 2 or len(roster.athletes) < POOL_MIN_ATHLETES:
+        return compute_plan(roster, settings)
+
+    with ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(compute_plan, _split(roster, workers), [settings] * workers))
+    return Plan(
+        roster.athletes,
+        roster.lifts,
+        *(np.concatenate([getattr(part, name) for part in parts]) for name in Plan._fields[2:]),
+    )
+
+
+def planned_worksets(plan):
+    """
+    Get the worksets of a plan, one per athlete and planned lift.
+
+    Returns:
+        list[db.Workset]: The worksets, not stored yet.
+    """
+    rows, columns = np.nonzero(~np.isnan(plan.weight))
+    return [
+        db.Workset(
+            base_max=plan.one_rm[i, j].item(),
+            base_reps=plan.base_reps[i].item(),
+            cycle=plan.cycle[i].item(),
+            weight=plan.weight[i, j].item(),
+            lift_name=plan.lifts[j],
+            athlete_name=plan.athletes[i],
+        )
+        for i, j in zip(rows.tolist(), columns.tolist())
+    ]
+
+
+def write_plan(plan):
+    """
+    Store every planned workset in one transaction.
+
+    Returns:
+        list[db.Workset]: The stored worksets, with their `id` set.
+
+    Raises:
+        IntegrityError: If a workset can't be stored; then none is.
+    """
+    worksets = planned_worksets(plan)
+    db.Workset.add_many(worksets)
+    return worksets
+
+
+def plan_all(dry_run=False, workers=None, include_planned=False):
+    """
+    Load the roster, plan it and, unless `dry_run`, store the plan.
+
+    Args:
+        dry_run (bool, optional): Only compute the plan.
+        workers (int, optional): See `plan`.
+        include_planned (bool, optional): See `load_roster`.
+
+    Returns:
+        tuple[Plan, dict]: The plan and the seconds spent per phase, keyed
+            load, plan and write (0 for a dry run).
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    roster = load_roster(include_planned=include_planned)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = plan(roster, workers=workers)
+    timings["plan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not dry_run:
+        write_plan(result)
+    timings["write"] = time.perf_counter() - start
+
+    return result, timings
@@ -0,0 +1,217 @@
+"""
+This module provides a small, backend-agnostic connection pool.
+
+Connections are created lazily by a factory function, kept open between queries
+and handed back out to the next caller. The pool is bounded, thread-safe,
+re-entrant within a thread and forgets its connections after a fork so that
+gunicorn workers never share a socket or file handle with their parent.
+
+The module includes the following classes:
+    - ConnectionPool
+
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    A bounded pool of long-lived database connections.
+
+    Args:
+        factory (callable): Called without arguments to open a new connection.
+        size (int, optional): Maximum number of open connections. Defaults to 4.
+        timeout (float, optional): Seconds to wait for a free connection when the
+            pool is exhausted. Defaults to 30.
+        reset (callable, optional): Called with a connection when it is returned
+            to the pool, e.g. to roll back an unfinished transaction.
+        validate (callable, optional): Called with an idle connection before it is
+            handed out. If it returns False or raises, the connection is closed and
+            a fresh one is opened in its place.
+
+    Examples:
+
+        pool = ConnectionPool(lambda: sqlite3.connect("531.sqlite"))
+        with pool.connection() as conn:
+            conn.execute("SELECT * FROM lift")
+    """
+
+    def __init__(self, factory, size=4, timeout=30.0, reset=None, validate=None):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.reset = reset
+        self.validate = validate
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._counters = dict(checkouts=0, hits=0, misses=0, waits=0, stale=0)
+
+    def _after_fork(self):
+        # connections inherited from the parent process belong to the parent;
+        # drop them without closing so we don't tear down its handles
+        self._local = threading.local()
+        self._init_state()
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _is_usable(self, conn):
+        if self.validate is None:
+            return True
+        try:
+            return bool(self.validate(conn))
+        except Exception:
+            return False
+
+    def _open(self):
+        self._count("misses")
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _reuse(self, conn):
+        if self._is_usable(conn):
+            self._count("hits")
+            return conn
+        # the slot stays reserved for the replacement connection
+        self._count("stale")
+        try:
+            conn.close()
+        except Exception:
+            pass
+        return self._open()
+
+    def checkout(self):
+        """
+        Take a connection out of the pool, opening a new one if needed.
+
+        Returns:
+            A database connection. Give it back with `checkin`.
+        """
+        if os.getpid() != self._pid:
+            self._after_fork()
+
+        self._count("checkouts")
+
+        try:
+            return self._reuse(self._idle.get_nowait())
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            return self._open()
+
+        self._count("waits")
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"no database connection available after {self.timeout}s"
+            ) from None
+        return self._reuse(conn)
+
+    def checkin(self, conn):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: A connection previously handed out by `checkout`.
+        """
+        if os.getpid() != self._pid:
+            return
+        try:
+            if self.reset is not None:
+                self.reset(conn)
+        except Exception:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """
+        Close a broken connection and free its slot in the pool.
+
+        Args:
+            conn: A connection previously handed out by `checkout`.
+        """
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that lends a pooled connection to the current thread.
+
+        Nested use within the same thread yields the same connection, so helpers
+        can be composed inside a single transaction.
+        """
+        if os.getpid() != self._pid:
+            self._after_fork()
+
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.checkout()
+        self._local.held, self._local.depth = conn, 0
+        try:
+            yield conn
+        finally:
+            self._local.held = None
+            self.checkin(conn)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self):
+        """
+        Usage counters for this process.
+
+        Returns:
+            dict: checkouts, hits (reused an open connection), misses (opened a
+            new connection), waits (blocked on a full pool), stale (failed the
+            health check and was replaced), plus the current number of open and
+            idle connections.
+        """
+        with self._lock:
+            return dict(
+                self._counters,
+                size=self.size,
+                open=self._opened,
+                idle=self._idle.qsize(),
+            )
@@ -0,0 +1,207 @@
+"""
+This module provides the materialized progression series behind `/graphs`.
+
+For every lift of an athlete, `Progression` keeps the completed worksets in
+date order as ready-to-plot points: the date, the estimated 1RM and the hover
+label, plus the points of the line trace, which skips sets below 80% of the
+previous point on the line.
+
+A progression is built once from an athlete's worksets and kept next to them in
+the workset cache. Writes update it with the same `with_added`, `with_updated`
+and `with_deleted` calls as the `WorksetStore`, touching only the lift that
+changed, so a page view just reads it.
+
+The module includes the following classes:
+    - LiftProgression
+    - Progression
+
+"""
+
+import bisect
+import math
+
+from . import analysis
+
+# a set drops off the line below this fraction of the previous point on it
+LINE_THRESHOLD = 0.8
+
+
+def _label(weight, reps, one_rm):
+    return f"{reps} x {weight} kg → {one_rm:.1f} kg"
+
+
+class LiftProgression:
+    """
+    The progression points of one lift, ordered by date.
+
+    The lists are never changed once the object is shared; the `with_*`
+    methods of `Progression` build new ones.
+    """
+
+    __slots__ = ("keys", "ids", "x", "y", "text", "on_line", "line_x", "line_y")
+
+    def __init__(self):
+        # (date ordinal, id) per point, the sort key
+        self.keys = []
+        self.ids = []
+        self.x = []
+        self.y = []
+        self.text = []
+        # whether each point made it onto the line trace
+        self.on_line = []
+        self.line_x = []
+        self.line_y = []
+
+    def copy(self):
+        new = LiftProgression()
+        for name in self.__slots__:
+            setattr(new, name, list(getattr(self, name)))
+        return new
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _insert(self, key, wsid, date, one_rm, label):
+        # returns where the point went
+        i = bisect.bisect(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, wsid)
+        self.x.insert(i, date)
+        self.y.insert(i, one_rm)
+        self.text.insert(i, label)
+        self.on_line.insert(i, False)
+        return i
+
+    def _remove(self, i):
+        for name in ("keys", "ids", "x", "y", "text", "on_line"):
+            del getattr(self, name)[i]
+
+    def _relink(self, start=0):
+        """
+        Recompute the line trace from point `start` on.
+
+        Which points are on the line only depends on the points before them, so
+        an append costs O(1) and an edit costs the points after it.
+        """
+        # the line trace points before `start`
+        kept = sum(self.on_line[:start])
+        del self.line_x[kept:], self.line_y[kept:]
+
+        last = self.line_y[-1] if self.line_y else None
+        for i in range(start, len(self.keys)):
+            one_rm = self.y[i]
+            self.on_line[i] = last is None or one_rm >= LINE_THRESHOLD * last
+            if self.on_line[i]:
+                self.line_x.append(self.x[i])
+                self.line_y.append(one_rm)
+                last = one_rm
+
+
+def _remove_point(lifts, wsid, previous=None):
+    # drop the point of `wsid` from a copy of its series in `lifts`; if the
+    # workset was `previous`, only its lift is searched
+    if previous is not None:
+        lifts_with_it = [previous["lift_name"]] if previous.get("date") else []
+    else:
+        lifts_with_it = list(lifts)
+    for lift in lifts_with_it:
+        series = lifts.get(lift)
+        if series is not None and wsid in series.ids:
+            i = series.ids.index(wsid)
+            series = lifts[lift] = series.copy()
+            series._remove(i)
+            series._relink(i)
+            return
+
+
+def _add_point(lifts, row):
+    # add the point of `row`, a workset dict, to a copy of its series in `lifts`
+    date, weight, reps = row.get("date"), row.get("weight"), row.get("reps")
+    if not date or weight is None or reps is None:
+        # planned worksets aren't progress yet
+        return
+    try:
+        one_rm = analysis.one_rm_fusion(weight, reps)
+    except ValueError:
+        return
+
+    lift = row["lift_name"]
+    series = lifts[lift] = lifts[lift].copy() if lift in lifts else LiftProgression()
+    i = series._insert((date.toordinal(), row["id"]), row["id"], f"{date}", one_rm, _label(weight, reps, one_rm))
+    series._relink(i)
+
+
+class Progression:
+    """
+    The progression series of one athlete, one LiftProgression per lift.
+
+    Args:
+        lifts (dict[str, LiftProgression]): The series per lift.
+    """
+
+    __slots__ = ("lifts",)
+
+    def __init__(self, lifts=None):
+        self.lifts = lifts or {}
+
+    @classmethod
+    def from_worksets(cls, worksets):
+        """
+        Build the progression of an athlete's worksets.
+
+        Args:
+            worksets (WorksetStore): The athlete's worksets.
+
+        Returns:
+            Progression: The progression.
+        """
+        lifts = {}
+        for lift, done in worksets.filter(done=True).sort_by_date().group_by_lift().items():
+            series = LiftProgression()
+            one_rms = analysis.e1rm(done)
+            dates = done.values("date")
+            for wsid, date, weight, reps, one_rm in zip(
+                done.values("id"), dates, done.values("weight"), done.values("reps"), one_rms.tolist()
+            ):
+                if math.isnan(one_rm):
+                    continue
+                series.keys.append((date.toordinal(), wsid))
+                series.ids.append(wsid)
+                series.x.append(f"{date}")
+                series.y.append(one_rm)
+                series.text.append(_label(weight, reps, one_rm))
+                series.on_line.append(False)
+            series._relink()
+            lifts[lift] = series
+        return cls(lifts)
+
+    def __getitem__(self, lift):
+        return self.lifts.get(lift) or LiftProgression()
+
+    def with_added(self, rows):
+        """
+        Get a progression that includes the new worksets `rows`.
+        """
+        lifts = dict(self.lifts)
+        for row in rows:
+            _add_point(lifts, row)
+        return Progression(lifts)
+
+    def with_updated(self, row, previous=None):
+        """
+        Get a progression with the workset of the same id replaced by `row`.
+
+        `previous`, the workset before the update, saves looking for its point.
+        """
+        lifts = dict(self.lifts)
+        _remove_point(lifts, row["id"], previous)
+        _add_point(lifts, row)
+        return Progression(lifts)
+
+    def with_deleted(self, wsid, previous=None):
+        """
+        Get a progression without the workset `wsid`, which was `previous`.
+        """
+        lifts = dict(self.lifts)
+        _remove_point(lifts, int(wsid), previous)
+        return Progression(lifts)
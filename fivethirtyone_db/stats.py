@@ -0,0 +1,269 @@
+"""
+This module provides running training statistics per athlete and lift.
+
+For every lift, `LiftStats` folds the completed worksets in date order into
+running aggregates:
+
+    - the e1RM PR and the best weight lifted for every rep count,
+    - an exponentially weighted moving average of the e1RM (EWMA_SPAN sets),
+    - the mean e1RM of the last WINDOW sets,
+    - the trend, the least-squares slope of e1RM over time, in kg per week,
+    - the best e1RM of every cycle and its change from the previous cycle.
+
+Adding a workset dated after the last one folds it in at constant cost, no
+matter how long the history is. Like the `Progression`, the `AthleteStats`
+of an athlete are kept in the workset cache and changed by every write with
+`with_added`, `with_updated` and `with_deleted`. Writes that can't be folded in
+(an edit, a delete or a back-dated set) mark the lift stale, and only that lift
+is rebuilt from the worksets the next time the stats are read.
+
+The module includes the following classes:
+    - LiftStats
+    - AthleteStats
+
+"""
+
+import math
+
+import numpy as np
+
+from . import analysis
+
+# span of the exponentially weighted moving average, in sets
+EWMA_SPAN = 10
+# number of sets in the windowed moving average
+WINDOW = 5
+
+
+class LiftStats:
+    """
+    Running statistics of one lift.
+
+    Objects are never changed once shared; `with_set` returns a new one.
+    """
+
+    __slots__ = (
+        "count",
+        "last_key",
+        "pr",
+        "pr_date",
+        "rep_prs",
+        "ewma",
+        "window",
+        "cycles",
+        "_origin",
+        "_sums",
+    )
+
+    def __init__(self):
+        self.count = 0
+        # (date ordinal, id) of the latest set, the order sets are folded in
+        self.last_key = None
+        self.pr = None
+        self.pr_date = None
+        # reps -> (weight, date) of the heaviest set with that many reps
+        self.rep_prs = {}
+        self.ewma = None
+        # the e1RMs of the last WINDOW sets
+        self.window = ()
+        # cycle -> best e1RM in that cycle, in the order the cycles started
+        self.cycles = {}
+        # the trend's regression, over days since the first set: n, sum x,
+        # sum y, sum xy, sum xx
+        self._origin = None
+        self._sums = (0, 0.0, 0.0, 0.0, 0.0)
+
+    def copy(self):
+        new = LiftStats()
+        for name in self.__slots__:
+            setattr(new, name, getattr(self, name))
+        new.rep_prs = dict(self.rep_prs)
+        new.cycles = dict(self.cycles)
+        return new
+
+    def _fold(self, key, date, weight, reps, cycle, one_rm):
+        # fold one set in, in place; the caller owns this object
+        self.count += 1
+        self.last_key = key
+
+        if self.pr is None or one_rm > self.pr:
+            self.pr, self.pr_date = one_rm, date
+        if reps not in self.rep_prs or weight > self.rep_prs[reps][0]:
+            self.rep_prs[reps] = (weight, date)
+
+        alpha = 2 / (EWMA_SPAN + 1)
+        self.ewma = one_rm if self.ewma is None else alpha * one_rm + (1 - alpha) * self.ewma
+        self.window = (self.window + (one_rm,))[-WINDOW:]
+
+        if cycle is not None:
+            self.cycles[cycle] = max(one_rm, self.cycles.get(cycle, one_rm))
+
+        if self._origin is None:
+            self._origin = key[0]
+        x = key[0] - self._origin
+        n, sx, sy, sxy, sxx = self._sums
+        self._sums = (n + 1, sx + x, sy + one_rm, sxy + x * one_rm, sxx + x * x)
+
+    def with_set(self, key, date, weight, reps, cycle, one_rm):
+        """
+        Get the stats with one more set, which has to come after `last_key`.
+        """
+        new = self.copy()
+        new._fold(key, date, weight, reps, cycle, one_rm)
+        return new
+
+    @property
+    def moving_average(self):
+        return sum(self.window) / len(self.window) if self.window else None
+
+    @property
+    def trend(self):
+        """
+        The slope of e1RM over time in kg per week, None before two training days.
+        """
+        n, sx, sy, sxy, sxx = self._sums
+        denominator = n * sxx - sx * sx
+        if n < 2 or denominator == 0:
+            return None
+        return (n * sxy - sx * sy) / denominator * 7
+
+    @property
+    def cycle_deltas(self):
+        """
+        [(cycle, best e1RM, change from the previous cycle)], None for the first.
+        """
+        deltas, previous = [], None
+        for cycle, best in self.cycles.items():
+            deltas.append((cycle, best, None if previous is None else best - previous))
+            previous = best
+        return deltas
+
+    def to_dict(self):
+        return dict(
+            sets=self.count,
+            pr=self.pr,
+            pr_date=self.pr_date and f"{self.pr_date}",
+            rep_prs={reps: dict(weight=weight, date=f"{date}") for reps, (weight, date) in sorted(self.rep_prs.items())},
+            ewma=self.ewma,
+            moving_average=self.moving_average,
+            trend=self.trend,
+            cycles=[dict(cycle=cycle, best=best, delta=delta) for cycle, best, delta in self.cycle_deltas],
+        )
+
+
+def _set_values(row):
+    # (key, date, weight, reps, cycle, e1RM) of a completed workset, None otherwise
+    date, weight, reps = row.get("date"), row.get("weight"), row.get("reps")
+    if not date or weight is None or reps is None:
+        return None
+    try:
+        one_rm = analysis.one_rm_fusion(weight, reps)
+    except ValueError:
+        return None
+    return (date.toordinal(), row["id"]), date, weight, reps, row.get("cycle"), one_rm
+
+
+def _build(done):
+    # the LiftStats of one lift's completed worksets
+    done = done.take(np.lexsort((done.column("id"), done.column("date"))))
+    stats = LiftStats()
+    one_rms = analysis.e1rm(done).tolist()
+    for wsid, date, weight, reps, cycle, one_rm in zip(
+        done.values("id"), done.values("date"), done.values("weight"), done.values("reps"), done.values("cycle"), one_rms
+    ):
+        if not math.isnan(one_rm):
+            stats._fold((date.toordinal(), wsid), date, weight, reps, cycle, one_rm)
+    return stats
+
+
+class AthleteStats:
+    """
+    The running statistics of one athlete, one LiftStats per lift.
+
+    Args:
+        lifts (dict[str, LiftStats]): The stats per lift.
+        stale (frozenset[str]): Lifts to rebuild before they are read, see
+            `refreshed`.
+    """
+
+    __slots__ = ("lifts", "stale")
+
+    def __init__(self, lifts=None, stale=frozenset()):
+        self.lifts = lifts or {}
+        self.stale = stale
+
+    @classmethod
+    def from_worksets(cls, worksets, lifts=None):
+        """
+        Build the stats of an athlete's worksets.
+
+        Args:
+            worksets (WorksetStore): The athlete's worksets.
+            lifts (iterable[str], optional): Only these lifts.
+
+        Returns:
+            AthleteStats: The stats.
+        """
+        by_lift = worksets.filter(done=True).group_by_lift()
+        if lifts is not None:
+            by_lift = {lift: by_lift[lift] for lift in lifts if lift in by_lift}
+        return cls({lift: _build(sets) for lift, sets in by_lift.items()})
+
+    def refreshed(self, worksets):
+        """
+        Get the stats with the stale lifts rebuilt from `worksets`.
+        """
+        if not self.stale:
+            return self
+        lifts = dict(self.lifts)
+        for lift in self.stale:
+            lifts.pop(lift, None)
+        lifts.update(AthleteStats.from_worksets(worksets, self.stale).lifts)
+        return AthleteStats(lifts)
+
+    def __getitem__(self, lift):
+        if lift in self.stale:
+            raise KeyError(f"{lift} is stale, see refreshed()")
+        return self.lifts.get(lift) or LiftStats()
+
+    def with_added(self, rows):
+        """
+        Get the stats that include the new worksets `rows`.
+        """
+        lifts, stale = dict(self.lifts), set(self.stale)
+        for row in rows:
+            lift = row["lift_name"]
+            values = _set_values(row)
+            if values is None or lift in stale:
+                continue
+            stats = lifts.get(lift) or LiftStats()
+            if stats.last_key is not None and values[0] < stats.last_key:
+                # a back-dated set changes everything after it
+                stale.add(lift)
+                continue
+            lifts[lift] = stats.with_set(*values)
+        return AthleteStats(lifts, frozenset(stale))
+
+    def _without(self, previous):
+        # the stats with `previous` taken out, by marking its lift stale
+        if previous is None:
+            # it could have been in any lift
+            return AthleteStats(self.lifts, self.stale | set(self.lifts))
+        if _set_values(previous) is None:
+            # a planned workset isn't in the stats
+            return self
+        return AthleteStats(self.lifts, self.stale | {previous["lift_name"]})
+
+    def with_updated(self, row, previous=None):
+        """
+        Get the stats with the workset of the same id replaced by `row`.
+
+        Completing a planned workset, `previous`, folds it in like an added one.
+        """
+        return self._without(previous).with_added([row])
+
+    def with_deleted(self, wsid, previous=None):
+        """
+        Get the stats without the workset `wsid`, which was `previous`.
+        """
+        return self._without(previous)
@@ -0,0 +1,344 @@
+"""
+This package provides the storage engines behind the `db` models.
+
+A storage engine knows how to store and query lifts, athletes and worksets. The
+models in `db` never talk to a database directly; they call the engine returned
+by `get_engine()`, which is chosen once by `create_app(db_credentials)`.
+
+The package includes the following engines:
+    - SQLiteEngine (storage.sqlite)
+    - MySQLEngine (storage.mysql)
+    - MemoryEngine (storage.memory)
+
+Workset rows are returned as dicts with the columns of the workset table. Every
+engine returns `date` as a `datetime.date` (or None for planned worksets) and
+`is_max` as 0/1 (or None), so callers don't need to care which engine is used.
+
+Every athlete has a `data_version` that the engine bumps in the same
+transaction as any write to the athlete's worksets, and a `data_modified`
+timestamp set by the same statement. The same transaction records the write
+in the `workset_change` log, so clients can fetch only what changed since a
+version. Caches compare the version to find out
+whether what they hold is still current, see `fivethirtyone_db.cache`; HTTP
+responses derive their ETag and Last-Modified from both.
+"""
+
+import datetime
+
+
+class IntegrityError(Exception):
+    """
+    Raised when a write violates a constraint, e.g. two worksets for the same
+    lift, athlete and date.
+    """
+
+
+WORKSET_COLUMNS = (
+    "lift_name",
+    "athlete_name",
+    "weight",
+    "base_max",
+    "base_reps",
+    "cycle",
+    "date",
+    "is_max",
+    "reps",
+)
+# the columns a workset row can be projected to, see `iter_worksets`
+WORKSET_FIELDS = ("id",) + WORKSET_COLUMNS
+
+# rows fetched from a cursor at a time while streaming
+FETCH_BATCH = 500
+
+
+def check_columns(columns):
+    """
+    Get `columns` as a tuple, raising ValueError for a column not in WORKSET_FIELDS.
+    """
+    unknown = [column for column in columns if column not in WORKSET_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown workset columns: {', '.join(unknown)}")
+    return tuple(columns)
+
+
+def to_date(value):
+    """
+    Convert an ISO date string (as stored by SQLite or sent by a form) to a date.
+
+    Args:
+        value (str | date | None): The value to convert.
+
+    Returns:
+        date | None: The date, or None for missing or empty values.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value[:10])
+
+
+class StorageEngine:
+    """
+    Interface every storage engine implements.
+
+    Methods that take or return a workset use plain dicts keyed by column name,
+    see WORKSET_COLUMNS.
+    """
+
+    name = ""
+
+    def create_schema(self):
+        """
+        Create the tables, or bring an existing schema up to date.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release connections or other resources held by the engine.
+        """
+
+    def pool_stats(self):
+        """
+        Connection pool counters, empty for engines without a pool.
+        """
+        return {}
+
+    def list_rows(self, table):
+        """
+        Fetch every row of `table` ("lift", "athlete" or "workset") as dicts.
+        """
+        raise NotImplementedError
+
+    def add_lift(self, name):
+        raise NotImplementedError
+
+    def add_athlete(self, name):
+        raise NotImplementedError
+
+    def set_password(self, name, password_hash):
+        raise NotImplementedError
+
+    def get_password(self, name):
+        """
+        Get the password hash of an athlete, None if the athlete doesn't exist.
+        """
+        raise NotImplementedError
+
+    def data_stamp(self, athlete):
+        """
+        Get the athlete's data version and the time of the last workset write.
+
+        Returns:
+            tuple[int, int]: The version and the time in seconds since the
+                epoch, (0, 0) for an athlete that doesn't exist. The time is 0
+                if the worksets weren't changed since the column was added.
+        """
+        raise NotImplementedError
+
+    def data_version(self, athlete):
+        """
+        Get the athlete's data version, 0 for an athlete that doesn't exist.
+        """
+        return self.data_stamp(athlete)[0]
+
+    def load_worksets(self, athlete):
+        """
+        Fetch every workset of an athlete.
+        """
+        raise NotImplementedError
+
+    def iter_worksets(
+        self, athlete, columns=WORKSET_FIELDS, lift=None, since=None, until=None, is_max=None, after=None, limit=None
+    ):
+        """
+        Yield an athlete's worksets in id order, filtered by the query.
+
+        Rows are fetched FETCH_BATCH at a time from an open cursor while the
+        caller iterates, so memory doesn't grow with the number of rows. The
+        engine holds on to a connection until the generator is exhausted or
+        closed.
+
+        Args:
+            athlete (str): The athlete.
+            columns (tuple[str], optional): The columns of each row, out of
+                WORKSET_FIELDS.
+            lift (str, optional): Only this lift.
+            since (date, optional): Only worksets done on or after this date.
+            until (date, optional): Only worksets done on or before this date.
+            is_max (bool, optional): Only max attempts (True) or the others.
+            after (int, optional): Only worksets with a larger id, the cursor
+                of keyset pagination.
+            limit (int, optional): At most this many worksets.
+
+        Raises:
+            ValueError: For a column that isn't in WORKSET_FIELDS.
+        """
+        raise NotImplementedError
+
+    def worksets_to_do(self, athlete):
+        """
+        Fetch the athlete's planned worksets (no date yet), ordered by id.
+        """
+        raise NotImplementedError
+
+    def latest_max(self, athlete, lift):
+        """
+        Get the most recent max workset for a lift, {} if there is none.
+        """
+        raise NotImplementedError
+
+    def latest_maxes(self, athlete, lifts):
+        """
+        Get the most recent max workset for several lifts, {} for lifts without one.
+        """
+        raise NotImplementedError
+
+    def latest_cycle(self, athlete):
+        """
+        Get the most recent completed workset with a non-zero cycle, {} if none.
+        """
+        raise NotImplementedError
+
+    def roster_latest_maxes(self, lifts):
+        """
+        Get the most recent max workset for several lifts of every athlete at once.
+
+        Returns:
+            dict[str, dict[str, dict]]: athlete -> lift -> workset, {} for lifts
+                without one. Athletes without any max workset are left out.
+        """
+        raise NotImplementedError
+
+    def roster_latest_cycles(self):
+        """
+        Get `latest_cycle` of every athlete at once.
+
+        Returns:
+            dict[str, dict]: athlete -> workset. Athletes without one are left out.
+        """
+        raise NotImplementedError
+
+    def athletes_with_worksets_to_do(self):
+        """
+        Get the names of the athletes with planned worksets.
+        """
+        raise NotImplementedError
+
+    def fetch_workset(self, wsid):
+        raise NotImplementedError
+
+    def workset_changes(self, athlete, since):
+        """
+        Get the athlete's worksets changed after data version `since`.
+
+        Every write logs its changes with the data version it bumped to, so
+        a client that holds the worksets as of one version can catch up with
+        only what changed since.
+
+        Args:
+            athlete (str): The athlete.
+            since (int): The data version the client is at.
+
+        Returns:
+            tuple[int, dict | None]: The current data version and the changed
+                worksets, id -> current row or None for a deleted one, in the
+                order of their last change. None instead of the dict if the log
+                doesn't reach back to `since`, or `since` is ahead of the
+                version; then the client has to load everything again.
+        """
+        raise NotImplementedError
+
+    def add_worksets(self, worksets):
+        """
+        Insert worksets in a single transaction: all of them or none.
+
+        The data version of every athlete involved is bumped once, and every
+        workset write is recorded in the change log, see `workset_changes`.
+
+        Args:
+            worksets (list[dict]): Values for WORKSET_COLUMNS.
+
+        Returns:
+            list[int]: The ids of the new worksets, in order.
+
+        Raises:
+            IntegrityError: If a workset violates a constraint.
+        """
+        raise NotImplementedError
+
+    def update_workset(self, wsid, date, lift_name, reps, weight, is_max):
+        """
+        Update a workset and bump the data version of its athlete.
+        """
+        raise NotImplementedError
+
+    def delete_workset(self, wsid):
+        """
+        Delete a workset and bump the data version of its athlete.
+        """
+        raise NotImplementedError
+
+
+_engine = None
+
+
+def get_engine():
+    """
+    Get the active storage engine, a SQLiteEngine on the bundled database by default.
+
+    The default engine's schema is brought up to date when it is created, so
+    scripts can write to the bundled database as shipped.
+    """
+    global _engine
+    if _engine is None:
+        from .sqlite import SQLiteEngine
+
+        engine = SQLiteEngine()
+        engine.create_schema()
+        _engine = engine
+    return _engine
+
+
+def set_engine(engine):
+    """
+    Make `engine` the active storage engine, closing the previous one.
+    """
+    global _engine
+    if _engine is not None and _engine is not engine:
+        _engine.close()
+    _engine = engine
+
+
+def engine_from_credentials(credentials=None):
+    """
+    Build the storage engine described by `credentials`.
+
+    Args:
+        credentials (dict, optional): {"engine": "memory"} for the in-memory engine,
+            {"engine": "sqlite", "path": ...} for a SQLite file, or MySQL connection
+            arguments (host, user, password, database). None or {} selects the
+            bundled SQLite database.
+
+    Returns:
+        StorageEngine: The engine.
+    """
+    credentials = dict(credentials or {})
+    kind = credentials.pop("engine", "mysql" if credentials else "sqlite")
+
+    if kind == "memory":
+        from .memory import MemoryEngine
+
+        return MemoryEngine()
+    if kind == "sqlite":
+        from .sqlite import SQLiteEngine
+
+        return SQLiteEngine(credentials.get("path"))
+    if kind == "mysql":
+        from .mysql import MySQLEngine
+
+        return MySQLEngine(credentials)
+    raise ValueError(f"unknown storage engine {kind!r}")
@@ -0,0 +1,229 @@
+"""
+This module provides a pure in-memory storage engine.
+
+It keeps every table in Python dicts and follows the same semantics as the SQL
+engines, including the unique (lift, athlete, date) constraint on worksets. It
+is meant for fast unit tests and as a baseline for benchmarks.
+
+The module includes the following classes:
+    - MemoryEngine
+
+"""
+
+import itertools
+import threading
+import time
+
+from . import StorageEngine, IntegrityError, WORKSET_COLUMNS, WORKSET_FIELDS, check_columns, to_date
+
+
+class MemoryEngine(StorageEngine):
+    """
+    Storage engine that keeps everything in memory; nothing is persisted.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.lifts = {}
+        self.athletes = {}
+        self.worksets = {}
+        # (lift_name, athlete_name, date) -> id, the unique constraint
+        self._keys = {}
+        self._ids = itertools.count(1)
+        # (athlete_name, version, workset_id, op), the workset_change table
+        self.changes = []
+
+    def create_schema(self):
+        pass
+
+    def list_rows(self, table):
+        with self._lock:
+            rows = {"lift": self.lifts, "athlete": self.athletes, "workset": self.worksets}[table]
+            return [dict(row) for row in rows.values()]
+
+    def add_lift(self, name):
+        with self._lock:
+            if name in self.lifts:
+                raise IntegrityError(f"lift {name!r} exists")
+            self.lifts[name] = {"name": name}
+
+    def add_athlete(self, name):
+        with self._lock:
+            if name in self.athletes:
+                raise IntegrityError(f"athlete {name!r} exists")
+            self.athletes[name] = {"name": name, "password": None, "data_version": 0, "data_modified": 0}
+
+    def set_password(self, name, password_hash):
+        with self._lock:
+            if name in self.athletes:
+                self.athletes[name]["password"] = password_hash
+
+    def get_password(self, name):
+        with self._lock:
+            athlete = self.athletes.get(name)
+            return athlete["password"] if athlete else None
+
+    def data_stamp(self, athlete):
+        with self._lock:
+            row = self.athletes.get(athlete)
+            return (row["data_version"], row["data_modified"]) if row else (0, 0)
+
+    def _bump(self, athlete):
+        # like the SQL UPDATE, athletes without a row are skipped
+        if athlete in self.athletes:
+            self.athletes[athlete]["data_version"] += 1
+            self.athletes[athlete]["data_modified"] = int(time.time())
+
+    def _log(self, ws, op):
+        # after the bump, like the SQL INSERT ... SELECT from athlete
+        if ws["athlete_name"] in self.athletes:
+            version = self.athletes[ws["athlete_name"]]["data_version"]
+            self.changes.append((ws["athlete_name"], version, ws["id"], op))
+
+    def _select(self, athlete, where=lambda ws: True):
+        with self._lock:
+            return [
+                dict(ws)
+                for ws in self.worksets.values()
+                if ws["athlete_name"] == athlete and where(ws)
+            ]
+
+    def load_worksets(self, athlete):
+        return self._select(athlete)
+
+    def iter_worksets(
+        self, athlete, columns=WORKSET_FIELDS, lift=None, since=None, until=None, is_max=None, after=None, limit=None
+    ):
+        columns = check_columns(columns)
+
+        def where(ws):
+            return (
+                (lift is None or ws["lift_name"] == lift)
+                and (since is None or (ws["date"] is not None and ws["date"] >= since))
+                and (until is None or (ws["date"] is not None and ws["date"] <= until))
+                and (is_max is None or bool(ws["is_max"]) == bool(is_max))
+                and (after is None or ws["id"] > after)
+            )
+
+        rows = sorted(self._select(athlete, where), key=lambda ws: ws["id"])[:limit]
+        return iter([{column: ws[column] for column in columns} for ws in rows])
+
+    def worksets_to_do(self, athlete):
+        return self._select(athlete, lambda ws: ws["date"] is None)
+
+    def latest_max(self, athlete, lift):
+        maxes = self._select(athlete, lambda ws: ws["is_max"] and ws["lift_name"] == lift and ws["date"])
+        return max(maxes, key=lambda ws: ws["date"], default={})
+
+    def latest_maxes(self, athlete, lifts):
+        return {lift: self.latest_max(athlete, lift) for lift in lifts}
+
+    def latest_cycle(self, athlete):
+        in_cycle = self._select(athlete, lambda ws: ws["cycle"] and ws["date"])
+        return max(in_cycle, key=lambda ws: ws["date"], default={})
+
+    def roster_latest_maxes(self, lifts):
+        with self._lock:
+            athletes = {ws["athlete_name"] for ws in self.worksets.values() if ws["is_max"] and ws["date"]}
+            return {athlete: self.latest_maxes(athlete, lifts) for athlete in athletes}
+
+    def roster_latest_cycles(self):
+        with self._lock:
+            latest = {}
+            for ws in sorted(self.worksets.values(), key=lambda ws: ws["id"]):
+                if not ws["cycle"] or not ws["date"]:
+                    continue
+                current = latest.get(ws["athlete_name"])
+                if current is None or ws["date"] > current["date"]:
+                    latest[ws["athlete_name"]] = dict(ws)
+            return latest
+
+    def athletes_with_worksets_to_do(self):
+        with self._lock:
+            return {ws["athlete_name"] for ws in self.worksets.values() if ws["date"] is None}
+
+    def workset_changes(self, athlete, since):
+        with self._lock:
+            version = self.data_version(athlete)
+            entries = [entry for entry in self.changes if entry[0] == athlete and since < entry[1] <= version]
+            if since > version or len({entry[1] for entry in entries}) != version - since:
+                return version, None
+
+            changes = {}
+            for _, _, wsid, _ in entries:
+                changes.pop(wsid, None)
+                ws = self.worksets.get(wsid)
+                changes[wsid] = dict(ws) if ws is not None else None
+            return version, changes
+
+    def fetch_workset(self, wsid):
+        with self._lock:
+            ws = self.worksets.get(int(wsid))
+            return dict(ws) if ws else None
+
+    def _normalize(self, ws):
+        # coerce values the way the SQL column types would
+        ws["date"] = to_date(ws["date"])
+        for col, kind in [("weight", float), ("base_max", float), ("reps", int), ("base_reps", int), ("cycle", int)]:
+            if ws[col] is not None:
+                ws[col] = kind(ws[col])
+        if ws["is_max"] is not None:
+            ws["is_max"] = int(bool(ws["is_max"]))
+        return ws
+
+    @staticmethod
+    def _key(ws):
+        # like SQL, NULL dates never collide
+        if ws["date"] is None:
+            return None
+        return (ws["lift_name"], ws["athlete_name"], ws["date"])
+
+    def _check_unique(self, ws, *taken):
+        key = self._key(ws)
+        if key is not None and any(keys.get(key, ws["id"]) != ws["id"] for keys in taken):
+            raise IntegrityError(f"UNIQUE constraint failed: {key}")
+        return key
+
+    def add_worksets(self, worksets):
+        with self._lock:
+            added, keys = [], {}
+            for values in worksets:
+                ws = self._normalize({col: values.get(col) for col in WORKSET_COLUMNS})
+                ws["id"] = next(self._ids)
+                key = self._check_unique(ws, self._keys, keys)
+                if key is not None:
+                    keys[key] = ws["id"]
+                added.append(ws)
+            # nothing is stored unless every workset passed
+            self.worksets.update((ws["id"], ws) for ws in added)
+            self._keys.update(keys)
+            for athlete in {ws["athlete_name"] for ws in added}:
+                self._bump(athlete)
+            for ws in added:
+                self._log(ws, "insert")
+            return [ws["id"] for ws in added]
+
+    def update_workset(self, wsid, date, lift_name, reps, weight, is_max):
+        with self._lock:
+            wsid = int(wsid)
+            if wsid not in self.worksets:
+                return
+            old = self.worksets[wsid]
+            ws = dict(old, date=date, lift_name=lift_name, reps=reps, weight=weight, is_max=is_max)
+            key = self._check_unique(self._normalize(ws), self._keys)
+            self._keys.pop(self._key(old), None)
+            if key is not None:
+                self._keys[key] = wsid
+            self.worksets[wsid] = ws
+            self._bump(ws["athlete_name"])
+            self._log(ws, "update")
+
+    def delete_workset(self, wsid):
+        with self._lock:
+            ws = self.worksets.pop(int(wsid), None)
+            if ws is not None:
+                self._keys.pop(self._key(ws), None)
+                self._bump(ws["athlete_name"])
+                self._log(ws, "delete")
@@ -0,0 +1,189 @@
+"""
+This module provides the MySQL storage engine.
+
+Connections come from a bounded per-process pool with a health check on
+checkout, and every connection caches its server-side prepared statements, see
+`MySQLEngine`.
+
+The module includes the following classes:
+    - MySQLEngine
+
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from mysql.connector import connect, Error
+from mysql.connector import IntegrityError as MySQLIntegrityError
+
+from . import FETCH_BATCH, IntegrityError
+from .sql import SQLEngine
+from ..pool import ConnectionPool
+
+POOL_SIZE = 4
+POOL_TIMEOUT = 30.0
+STATEMENT_CACHE_SIZE = 64
+
+
+def _is_alive(connection):
+    """
+    Health check run before an idle connection is handed out.
+
+    A connection the server has dropped (e.g. after `wait_timeout`) fails the
+    ping and the pool replaces it with a fresh one. We don't let the driver
+    reconnect in place because that would silently invalidate the server-side
+    prepared statements cached on the connection.
+    """
+    connection.ping(reconnect=False)
+    return True
+
+
+def _prepared_cursor(connection, sql):
+    """
+    Return a prepared cursor for `sql`, reusing the one cached on `connection`.
+
+    The statement is prepared on the server the first time it is executed and
+    reused for every later call with the same SQL text on this connection. The
+    cache holds at most STATEMENT_CACHE_SIZE statements per connection.
+    """
+    cache = getattr(connection, "_fto_statements", None)
+    if cache is None:
+        cache = connection._fto_statements = OrderedDict()
+
+    cursor = cache.get(sql)
+    if cursor is not None:
+        cache.move_to_end(sql)
+        return cursor
+
+    cursor = cache[sql] = connection.cursor(prepared=True)
+    if len(cache) > STATEMENT_CACHE_SIZE:
+        _, evicted = cache.popitem(last=False)
+        evicted.close()
+    return cursor
+
+
+def _rollback(connection):
+    if connection.in_transaction:
+        connection.rollback()
+
+
+class MySQLEngine(SQLEngine):
+    """
+    Storage engine for a MySQL server.
+
+    Args:
+        credentials (dict): Keyword arguments for `mysql.connector.connect`
+            (host, user, password, database, ...).
+        pool_size (int, optional): Maximum number of open connections.
+    """
+
+    name = "mysql"
+    dialect = "mysql"
+    placeholder = "%s"
+    last_insert_id = "LAST_INSERT_ID()"
+
+    def __init__(self, credentials, pool_size=POOL_SIZE):
+        super().__init__()
+        self.credentials = dict(credentials)
+        self.pool = ConnectionPool(
+            self._connect,
+            size=pool_size,
+            timeout=POOL_TIMEOUT,
+            reset=_rollback,
+            validate=_is_alive,
+        )
+
+    def _connect(self):
+        """
+        Open a new connection to the MySQL server.
+        """
+        return connect(**self.credentials)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager for database connection.
+
+        It yields a pooled connection object and hands it back to the pool when
+        exiting the context; uncommitted work is rolled back.
+
+        Examples:
+
+            with engine.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM lift;")
+                result = cursor.fetchall()
+        """
+        with self.pool.connection() as connection:
+            yield connection
+
+    def close(self):
+        self.pool.close()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def _transaction(self, statements):
+        """
+        Execute SQL statements in a single transaction.
+
+        Args:
+            statements (list[tuple]): (sql, params) pairs with `%s` placeholders.
+
+        Returns:
+            list[int]: The `lastrowid` after each statement.
+        """
+        with self.connection() as conn:
+            try:
+                rowids = []
+                for sql, params in statements:
+                    cursor = _prepared_cursor(conn, sql)
+                    cursor.execute(sql, params)
+                    rowids.append(cursor.lastrowid)
+                conn.commit()
+            except MySQLIntegrityError as e:
+                conn.rollback()
+                raise IntegrityError(str(e)) from e
+            except Error:
+                conn.rollback()
+                raise
+            return rowids
+
+    def _fetchall(self, sql, params=()):
+        """
+        Fetch all records from a SQL query.
+
+        Args:
+            sql (str): The SQL query to execute, with `%s` placeholders.
+            params (tuple, optional): Values bound to the placeholders.
+
+        Returns:
+            list[dict]: A list of records returned by the query.
+        """
+        with self.connection() as conn:
+            cursor = _prepared_cursor(conn, sql)
+            cursor.execute(sql, params)
+            return [
+                {key: val for key, val in zip(cursor.column_names, record)}
+                for record in cursor.fetchall()
+            ]
+
+    def _iterate(self, sql, params=()):
+        """
+        Yield the records of a SQL query, fetching FETCH_BATCH at a time.
+
+        The statement gets its own unbuffered prepared cursor, not the cached
+        one, since it stays open while the caller iterates. Rows the caller
+        didn't read are discarded before the connection goes back to the pool.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            try:
+                cursor.execute(sql, params)
+                while rows := cursor.fetchmany(FETCH_BATCH):
+                    for record in rows:
+                        yield {key: val for key, val in zip(cursor.column_names, record)}
+            finally:
+                if conn.unread_result:
+                    conn.consume_results()
+                cursor.close()
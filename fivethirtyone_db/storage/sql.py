@@ -0,0 +1,314 @@
+"""
+This module provides the SQL shared by the SQLite and MySQL engines.
+
+Queries are written once with `{p}` placeholders and formatted with the
+driver's parameter style when the engine is created, so each engine runs the
+same constant SQL text with bound parameters.
+
+The module includes the following classes:
+    - SQLEngine
+
+"""
+
+import time
+
+from . import StorageEngine, WORKSET_COLUMNS, WORKSET_FIELDS, check_columns
+
+QUERIES = dict(
+    list_lift="SELECT * FROM lift",
+    list_athlete="SELECT * FROM athlete",
+    list_workset="SELECT * FROM workset",
+    add_lift="INSERT INTO lift (name) VALUES ({p})",
+    add_athlete="INSERT INTO athlete (name) VALUES ({p})",
+    set_password="UPDATE athlete SET password={p} WHERE name={p}",
+    get_password="SELECT password FROM athlete WHERE name={p}",
+    data_stamp="SELECT data_version, data_modified FROM athlete WHERE name={p}",
+    bump_version="UPDATE athlete SET data_version = data_version + 1, data_modified = {p} WHERE name={p}",
+    bump_version_of_workset="""
+        UPDATE athlete SET data_version = data_version + 1, data_modified = {p}
+        WHERE name = (SELECT athlete_name FROM workset WHERE id={p})
+    """,
+    load_worksets="SELECT * FROM workset WHERE athlete_name={p}",
+    worksets_to_do="""
+        SELECT * FROM workset
+        WHERE athlete_name={p} AND date IS NULL
+        ORDER BY id
+    """,
+    latest_max="""
+        SELECT * FROM workset
+        WHERE athlete_name={p} AND lift_name={p} AND is_max=1 AND date IS NOT NULL
+        ORDER BY date DESC
+        LIMIT 1
+    """,
+    latest_maxes="""
+        SELECT w.* FROM workset w
+        JOIN (
+            SELECT lift_name, MAX(date) AS date FROM workset
+            WHERE athlete_name={p} AND is_max=1
+            GROUP BY lift_name
+        ) latest ON w.lift_name = latest.lift_name AND w.date = latest.date
+        WHERE w.athlete_name={p} AND w.is_max=1
+    """,
+    latest_cycle="""
+        SELECT * FROM workset
+        WHERE athlete_name={p} AND cycle != 0 AND date IS NOT NULL
+        ORDER BY date DESC
+        LIMIT 1
+    """,
+    roster_latest_maxes="""
+        SELECT w.* FROM workset w
+        JOIN (
+            SELECT athlete_name, lift_name, MAX(date) AS date FROM workset
+            WHERE is_max=1
+            GROUP BY athlete_name, lift_name
+        ) latest ON w.athlete_name = latest.athlete_name
+            AND w.lift_name = latest.lift_name AND w.date = latest.date
+        WHERE w.is_max=1
+    """,
+    roster_latest_cycles="""
+        SELECT w.* FROM workset w
+        JOIN (
+            SELECT athlete_name, MAX(date) AS date FROM workset
+            WHERE cycle != 0 AND date IS NOT NULL
+            GROUP BY athlete_name
+        ) latest ON w.athlete_name = latest.athlete_name AND w.date = latest.date
+        WHERE w.cycle != 0
+        ORDER BY w.id
+    """,
+    athletes_with_worksets_to_do="SELECT DISTINCT athlete_name FROM workset WHERE date IS NULL",
+    fetch_workset="SELECT * FROM workset WHERE id={p}",
+    add_workset=f"""
+        INSERT INTO workset
+        ({", ".join(WORKSET_COLUMNS)})
+        VALUES ({", ".join(["{p}"] * len(WORKSET_COLUMNS))})
+    """,
+    update_workset="""
+        UPDATE workset
+        SET date = {p}, lift_name = {p}, reps = {p}, weight = {p}, is_max = {p}
+        WHERE id={p}
+    """,
+    delete_workset="DELETE FROM workset WHERE id={p}",
+    # the change log, one row per workset write with the athlete's new data
+    # version; run after the version was bumped in the same transaction
+    log_insert="""
+        INSERT INTO workset_change (athlete_name, version, workset_id, op, changed)
+        SELECT name, data_version, {last_id}, 'insert', {p} FROM athlete WHERE name={p}
+    """,
+    log_change="""
+        INSERT INTO workset_change (athlete_name, version, workset_id, op, changed)
+        SELECT a.name, a.data_version, w.id, {p}, {p}
+        FROM workset w JOIN athlete a ON a.name = w.athlete_name
+        WHERE w.id={p}
+    """,
+    change_versions="""
+        SELECT COUNT(DISTINCT version) AS versions FROM workset_change
+        WHERE athlete_name={p} AND version > {p} AND version <= {p}
+    """,
+    workset_changes="""
+        SELECT c.workset_id AS change_id, w.* FROM workset_change c
+        LEFT JOIN workset w ON w.id = c.workset_id
+        WHERE c.athlete_name={p} AND c.version > {p} AND c.version <= {p}
+        ORDER BY c.seq
+    """,
+)
+
+# the optional filters of `iter_worksets`, each one fixed clause; every
+# combination of them is one constant SQL text
+WORKSET_FILTERS = dict(
+    lift="lift_name={p}",
+    since="date >= {p}",
+    until="date <= {p}",
+    is_max="COALESCE(is_max, 0)={p}",
+    after="id > {p}",
+)
+
+
+class SQLEngine(StorageEngine):
+    """
+    Storage engine for SQL databases reached through a DB-API driver.
+
+    Subclasses provide the connection handling and the low-level helpers
+    `_transaction` and `_fetchall`.
+    """
+
+    # the dialect name used by `migrations`, "sqlite" or "mysql"
+    dialect = ""
+    # the driver's parameter placeholder
+    placeholder = "?"
+    # the SQL function that gives the id of the last inserted row
+    last_insert_id = ""
+
+    def __init__(self):
+        self.sql = {
+            name: query.format(p=self.placeholder, last_id=self.last_insert_id) for name, query in QUERIES.items()
+        }
+
+    def connection(self):
+        """
+        Context manager that lends out a pooled DB-API connection.
+        """
+        raise NotImplementedError
+
+    def _transaction(self, statements):
+        """
+        Execute (sql, params) statements in order, in a single transaction.
+
+        Returns:
+            list[int]: The `lastrowid` after each statement.
+
+        Raises:
+            IntegrityError: If a statement violates a constraint; nothing is stored.
+        """
+        raise NotImplementedError
+
+    def _execute(self, sql, params=()):
+        return self._transaction([(sql, params)])[0]
+
+    def _fetchall(self, sql, params=()):
+        raise NotImplementedError
+
+    def _iterate(self, sql, params=()):
+        """
+        Yield the rows of a query as dicts, fetching FETCH_BATCH at a time.
+        """
+        raise NotImplementedError
+
+    def _fetchone(self, sql, params=()):
+        rows = self._fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def _workset_values(self, ws):
+        return tuple(ws.get(col) for col in WORKSET_COLUMNS)
+
+    def create_schema(self):
+        from .. import migrations
+
+        migrations.migrate(self)
+
+    def list_rows(self, table):
+        return self._fetchall(self.sql[f"list_{table}"])
+
+    def add_lift(self, name):
+        self._execute(self.sql["add_lift"], (name,))
+
+    def add_athlete(self, name):
+        self._execute(self.sql["add_athlete"], (name,))
+
+    def set_password(self, name, password_hash):
+        self._execute(self.sql["set_password"], (password_hash, name))
+
+    def get_password(self, name):
+        row = self._fetchone(self.sql["get_password"], (name,))
+        return row["password"] if row else None
+
+    def data_stamp(self, athlete):
+        row = self._fetchone(self.sql["data_stamp"], (athlete,))
+        return (row["data_version"], row["data_modified"]) if row else (0, 0)
+
+    def load_worksets(self, athlete):
+        return self._fetchall(self.sql["load_worksets"], (athlete,))
+
+    def worksets_query(
+        self, athlete, columns=WORKSET_FIELDS, lift=None, since=None, until=None, is_max=None, after=None, limit=None
+    ):
+        """
+        Get the SQL and parameters `iter_worksets` runs for a query.
+
+        Returns:
+            tuple[str, tuple]: The SQL with the driver's placeholders, and its parameters.
+        """
+        filters = dict(lift=lift, since=since, until=until, is_max=is_max, after=after)
+        filters = {name: value for name, value in filters.items() if value is not None}
+        if "is_max" in filters:
+            filters["is_max"] = int(bool(filters["is_max"]))
+
+        where = " AND ".join(["athlete_name={p}"] + [WORKSET_FILTERS[name] for name in filters])
+        sql = f"SELECT {', '.join(check_columns(columns))} FROM workset WHERE {where} ORDER BY id"
+        params = (athlete, *filters.values())
+        if limit is not None:
+            sql += " LIMIT {p}"
+            params += (int(limit),)
+        return sql.format(p=self.placeholder), params
+
+    def iter_worksets(
+        self, athlete, columns=WORKSET_FIELDS, lift=None, since=None, until=None, is_max=None, after=None, limit=None
+    ):
+        return self._iterate(*self.worksets_query(athlete, columns, lift, since, until, is_max, after, limit))
+
+    def worksets_to_do(self, athlete):
+        return self._fetchall(self.sql["worksets_to_do"], (athlete,))
+
+    def latest_max(self, athlete, lift):
+        return self._fetchone(self.sql["latest_max"], (athlete, lift)) or {}
+
+    def latest_maxes(self, athlete, lifts):
+        rows = {ws["lift_name"]: ws for ws in self._fetchall(self.sql["latest_maxes"], (athlete, athlete))}
+        return {lift: rows.get(lift, {}) for lift in lifts}
+
+    def latest_cycle(self, athlete):
+        return self._fetchone(self.sql["latest_cycle"], (athlete,)) or {}
+
+    def roster_latest_maxes(self, lifts):
+        maxes = {}
+        for ws in self._fetchall(self.sql["roster_latest_maxes"]):
+            maxes.setdefault(ws["athlete_name"], {})[ws["lift_name"]] = ws
+        return {athlete: {lift: rows.get(lift, {}) for lift in lifts} for athlete, rows in maxes.items()}
+
+    def roster_latest_cycles(self):
+        latest = {}
+        for ws in self._fetchall(self.sql["roster_latest_cycles"]):
+            # the worksets of a cycle share their date; keep the first
+            latest.setdefault(ws["athlete_name"], ws)
+        return latest
+
+    def athletes_with_worksets_to_do(self):
+        return {row["athlete_name"] for row in self._fetchall(self.sql["athletes_with_worksets_to_do"])}
+
+    def fetch_workset(self, wsid):
+        return self._fetchone(self.sql["fetch_workset"], (wsid,))
+
+    def workset_changes(self, athlete, since):
+        version = self.data_version(athlete)
+        # every version bump logged at least one change, so the log covers
+        # `since` if it has every version after it
+        logged = self._fetchone(self.sql["change_versions"], (athlete, since, version))["versions"]
+        if since > version or logged != version - since:
+            return version, None
+
+        changes = {}
+        for row in self._fetchall(self.sql["workset_changes"], (athlete, since, version)):
+            wsid = row.pop("change_id")
+            # in the order of the last change
+            changes.pop(wsid, None)
+            changes[wsid] = row if row["athlete_name"] == athlete else None
+        return version, changes
+
+    def add_worksets(self, worksets):
+        # a stable order, so concurrent writers lock the athlete rows in the same order
+        athletes = sorted({ws["athlete_name"] for ws in worksets if ws.get("athlete_name")})
+        now = int(time.time())
+        bumps = [(self.sql["bump_version"], (now, athlete)) for athlete in athletes]
+        # one INSERT per row rather than executemany, so we learn every new id,
+        # each followed by its change log entry at the bumped version
+        inserts = []
+        for ws in worksets:
+            inserts.append((self.sql["add_workset"], self._workset_values(ws)))
+            inserts.append((self.sql["log_insert"], (now, ws.get("athlete_name"))))
+        return self._transaction(bumps + inserts)[len(bumps)::2]
+
+    def update_workset(self, wsid, date, lift_name, reps, weight, is_max):
+        now = int(time.time())
+        self._transaction([
+            (self.sql["update_workset"], (date, lift_name, reps, weight, is_max, wsid)),
+            (self.sql["bump_version_of_workset"], (now, wsid)),
+            (self.sql["log_change"], ("update", now, wsid)),
+        ])
+
+    def delete_workset(self, wsid):
+        # bump and log first, the athlete is looked up through the workset
+        now = int(time.time())
+        self._transaction([
+            (self.sql["bump_version_of_workset"], (now, wsid)),
+            (self.sql["log_change"], ("delete", now, wsid)),
+            (self.sql["delete_workset"], (wsid,)),
+        ])
@@ -0,0 +1,142 @@
+"""
+This module provides the SQLite storage engine.
+
+Connections are kept open in a per-process pool, use WAL journaling and cache
+compiled statements, see `SQLiteEngine`.
+
+WAL is a persistent property of the database file, and it keeps `-wal` and
+`-shm` files next to it. The git-tracked, bundled `531.sqlite` therefore keeps
+its rollback journal; every other database is switched to WAL when opened.
+
+The module includes the following classes:
+    - SQLiteEngine
+
+"""
+
+import pathlib
+import sqlite3
+from contextlib import contextmanager
+
+from . import FETCH_BATCH, IntegrityError, to_date
+from .sql import SQLEngine
+from ..pool import ConnectionPool
+
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 8192
+STATEMENT_CACHE_SIZE = 256
+
+
+def _rollback(connection):
+    if connection.in_transaction:
+        connection.rollback()
+
+
+def _to_dict(row):
+    record = dict(row)
+    if "date" in record:
+        # SQLite stores dates as ISO text
+        record["date"] = to_date(record["date"])
+    return record
+
+
+def _to_param(value):
+    # the default date adapter is deprecated, store ISO text explicitly
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+class SQLiteEngine(SQLEngine):
+    """
+    Storage engine for a SQLite database file.
+
+    Args:
+        path (str | pathlib.Path, optional): The database file. Defaults to the
+            bundled `531.sqlite`.
+        pool_size (int, optional): Maximum number of open connections.
+        journal_mode (str, optional): "WAL", or "DELETE" for a rollback
+            journal. Defaults to WAL, except for the bundled database.
+    """
+
+    name = "sqlite"
+    dialect = "sqlite"
+    placeholder = "?"
+    last_insert_id = "last_insert_rowid()"
+
+    def __init__(self, path=None, pool_size=POOL_SIZE, journal_mode=None):
+        super().__init__()
+        from .. import DB_FILE
+
+        if path is None:
+            path = DB_FILE
+        if journal_mode is None:
+            journal_mode = "DELETE" if pathlib.Path(path).resolve() == DB_FILE.resolve() else "WAL"
+        self.path = path
+        self.journal_mode = journal_mode
+        self.pool = ConnectionPool(self._connect, size=pool_size, reset=_rollback)
+
+    def _connect(self):
+        """
+        Open a new SQLite connection with the pragmas we want on every connection.
+        """
+        connection = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        connection.row_factory = sqlite3.Row  # This allows us to access columns by name
+        connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        if self.journal_mode.upper() == "WAL":
+            # durable enough with WAL, not with a rollback journal
+            connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool; uncommitted work is rolled back on return.
+        """
+        with self.pool.connection() as connection:
+            yield connection
+
+    def close(self):
+        self.pool.close()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    # Queries take `?` placeholders and their values as a separate tuple. Keeping
+    # the SQL text constant lets sqlite3 reuse the compiled statement from the
+    # connection's statement cache instead of re-parsing it on every call.
+
+    def _transaction(self, statements):
+        with self.connection() as conn:
+            try:
+                rowids = [
+                    conn.execute(sql, [_to_param(v) for v in params]).lastrowid
+                    for sql, params in statements
+                ]
+                conn.commit()
+            except sqlite3.IntegrityError as e:
+                conn.rollback()
+                raise IntegrityError(str(e)) from e
+            except Exception:
+                conn.rollback()
+                raise
+            return rowids
+
+    def _fetchall(self, sql, params=()):
+        with self.connection() as conn:
+            return [_to_dict(row) for row in conn.execute(sql, params)]
+
+    def _iterate(self, sql, params=()):
+        # sqlite3 steps through the result as rows are fetched
+        with self.connection() as conn:
+            cursor = conn.execute(sql, [_to_param(v) for v in params])
+            try:
+                while rows := cursor.fetchmany(FETCH_BATCH):
+                    yield from (_to_dict(row) for row in rows)
+            finally:
+                cursor.close()
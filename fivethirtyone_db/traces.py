@@ -0,0 +1,127 @@
+"""
+This module builds the plotly traces of the `/graphs` page.
+
+Each lift gets two traces from its `LiftProgression`: the markers of every
+estimated 1RM and the line through the points that count as progress. The
+series are already materialized in the workset cache, so building the traces
+is one pass over the points.
+
+Long histories are downsampled to at most `max_points` points per trace with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and dips that
+shape the curve, so the JSON sent to the browser stays bounded however many
+years of training an athlete has logged.
+
+The module includes the following functions:
+    - lttb
+    - lift_traces
+
+"""
+
+import numpy as np
+
+# points per trace above which a series is downsampled
+MAX_TRACE_POINTS = 1000
+
+
+def lttb(x, y, n_out):
+    """
+    Pick `n_out` points of a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. The points in between are split into
+    `n_out - 2` buckets, and from each bucket the point that spans the largest
+    triangle with the point picked before it and the mean of the next bucket
+    is kept. One pass over the series.
+
+    Args:
+        x (array): The x values, ascending, e.g. date ordinals.
+        y (array): The y values.
+        n_out (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the kept points, ascending. All indices if
+            the series has no more than `n_out` points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # bucket i holds the points edges[i]:edges[i + 1]; the last point is a bucket of its own
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(int), n)
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop, next_stop = edges[i], edges[i + 1], edges[i + 2]
+        mean_x = x[stop:next_stop].mean()
+        mean_y = y[stop:next_stop].mean()
+        # twice the area of the triangle (a, candidate, next bucket's mean)
+        area = np.abs((x[a] - mean_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def _ordinals(dates):
+    # the "YYYY-MM-DD" strings of a LiftProgression as day numbers
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def _take(values, index):
+    return values if len(index) == len(values) else [values[i] for i in index.tolist()]
+
+
+def lift_traces(lift, series, color, max_points=MAX_TRACE_POINTS):
+    """
+    Build the line and marker traces of one lift.
+
+    Args:
+        lift (str): The name of the lift.
+        series (LiftProgression): Its progression.
+        color (str): The trace color.
+        max_points (int, optional): Downsample each trace to at most this many
+            points; None keeps every point.
+
+    Returns:
+        list[dict]: The line trace and the marker trace.
+    """
+    markers = np.arange(len(series.x))
+    line = np.arange(len(series.line_x))
+    if max_points is not None:
+        if len(series.x) > max_points:
+            markers = lttb(_ordinals(series.x), series.y, max_points)
+        if len(series.line_x) > max_points:
+            line = lttb(_ordinals(series.line_x), series.line_y, max_points)
+
+    return [
+        dict(
+            x=_take(series.line_x, line),
+            y=_take(series.line_y, line),
+            type="scatter",
+            mode="lines",
+            line={"shape": "hvh", "width": 3, "color": color},
+            name=f"{lift} (line)",
+            legendgroup=lift,
+            showlegend=False,
+        ),
+        dict(
+            x=_take(series.x, markers),
+            y=_take(series.y, markers),
+            text=_take(series.text, markers),
+            type="scatter",
+            mode="markers",
+            marker={
+                "size": 12,
+                "color": "white",  # Set face color to white
+                "line": {"width": 4, "color": color},  # Set edge color to the cycle color
+            },
+            name=lift,
+            hovertemplate="""
+    <b>%{x}</b><br><br>
+    %{text}""",
+            legendgroup=lift,
+            showlegend=True,
+        ),
+    ]
@@ -0,0 +1,321 @@
+"""
+This module provides a columnar container for an athlete's worksets.
+
+Instead of one dict per workset, `WorksetStore` keeps one NumPy array per
+column: floats for weights and rep counts (NaN where the database has NULL),
+date ordinals (0 for planned worksets), a boolean `is_max` mask and integer
+codes for the lift and athlete names. Filtering, sorting and grouping are
+vectorized and return new stores that share nothing with the original.
+
+Iterating a store yields `WorksetRow` views. They read like the old dicts,
+`row["weight"]`, `row.weight` in templates, `dict(row)`, and return plain
+Python values (int, float, date or None), but they don't copy anything.
+
+The module includes the following classes:
+    - WorksetStore
+    - WorksetRow
+
+"""
+
+import datetime
+from collections.abc import Mapping
+
+import numpy as np
+
+from .storage import to_date
+
+# the order `WorksetRow` lists its keys in, same as a workset table row
+COLUMNS = (
+    "id",
+    "weight",
+    "reps",
+    "lift_name",
+    "athlete_name",
+    "date",
+    "is_max",
+    "base_max",
+    "base_reps",
+    "cycle",
+)
+FLOAT_COLUMNS = ("weight", "base_max")
+# whole numbers that can be NULL, stored as floats so NULL can be NaN
+COUNT_COLUMNS = ("reps", "base_reps", "cycle")
+CATEGORY_COLUMNS = ("lift_name", "athlete_name")
+
+# planned worksets sort after every real date
+_PLANNED = np.iinfo(np.int32).max
+
+
+def _number(value):
+    return np.nan if value is None or value == "" else float(value)
+
+
+def _ordinal(value):
+    date = to_date(value)
+    return date.toordinal() if date else 0
+
+
+class WorksetRow(Mapping):
+    """
+    Read-only view of one workset in a WorksetStore.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._store._value(key, self._index)
+
+    def __getattr__(self, key):
+        try:
+            return self._store._value(key, self._index)
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    def __repr__(self):
+        return f"WorksetRow({dict(self)!r})"
+
+
+class WorksetStore:
+    """
+    Columnar collection of worksets.
+
+    Build one with `from_records`; the constructor takes the arrays as they are.
+
+    Args:
+        columns (dict[str, np.ndarray]): One equally long array per column.
+        categories (dict[str, tuple]): The names behind the codes of each
+            categorical column.
+    """
+
+    __slots__ = ("_columns", "_categories")
+
+    def __init__(self, columns, categories):
+        self._columns = columns
+        self._categories = categories
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a store from workset dicts, e.g. as returned by a storage engine.
+
+        Args:
+            records (iterable[Mapping]): Worksets keyed by column name.
+
+        Returns:
+            WorksetStore: The store.
+        """
+        records = list(records)
+        n = len(records)
+        columns = {
+            "id": np.fromiter((r["id"] for r in records), dtype=np.int64, count=n),
+            "date": np.fromiter((_ordinal(r.get("date")) for r in records), dtype=np.int32, count=n),
+            "is_max": np.fromiter((bool(r.get("is_max")) for r in records), dtype=bool, count=n),
+        }
+        for name in FLOAT_COLUMNS + COUNT_COLUMNS:
+            columns[name] = np.fromiter((_number(r.get(name)) for r in records), dtype=np.float64, count=n)
+
+        categories = {}
+        for name in CATEGORY_COLUMNS:
+            codes = {}
+            columns[name] = np.fromiter(
+                (codes.setdefault(r.get(name), len(codes)) for r in records), dtype=np.int32, count=n
+            )
+            categories[name] = tuple(codes)
+
+        return cls(columns, categories)
+
+    def to_records(self):
+        """
+        Get the worksets as a list of plain dicts.
+        """
+        return [dict(row) for row in self]
+
+    def __len__(self):
+        return len(self._columns["id"])
+
+    def __iter__(self):
+        return (WorksetRow(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index):
+        """
+        `store[i]` is a WorksetRow, `store[mask]` or `store[indices]` a new store.
+        """
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(index)
+            return WorksetRow(self, int(index))
+        return self.take(index)
+
+    def __repr__(self):
+        return f"WorksetStore({len(self)} worksets)"
+
+    def _value(self, name, i):
+        # a single cell as a plain Python value
+        value = self._columns[name][i]
+        if name in self._categories:
+            return self._categories[name][value]
+        if name == "id":
+            return int(value)
+        if name == "date":
+            return datetime.date.fromordinal(int(value)) if value else None
+        if name == "is_max":
+            return int(value)
+        if np.isnan(value):
+            return None
+        return int(value) if name in COUNT_COLUMNS else float(value)
+
+    def column(self, name):
+        """
+        Get the raw array of a column.
+
+        Numbers are float64 with NaN for NULL, `date` holds ordinals (0 for
+        planned worksets) and categorical columns hold codes, see `values`.
+        """
+        return self._columns[name]
+
+    def values(self, name):
+        """
+        Get a column as a list of Python values, e.g. names instead of codes.
+        """
+        return [self._value(name, i) for i in range(len(self))]
+
+    def categories(self, name):
+        """
+        Get the names behind the codes of a categorical column, by code.
+        """
+        return self._categories[name]
+
+    def _code(self, name, value):
+        try:
+            return self._categories[name].index(value)
+        except ValueError:
+            return -1
+
+    def mask(self, lift=None, athlete=None, done=None, is_max=None):
+        """
+        Get a boolean mask of the worksets matching every given criterion.
+
+        Args:
+            lift (str, optional): Only this lift.
+            athlete (str, optional): Only this athlete.
+            done (bool, optional): Only completed (True) or planned (False) ones.
+            is_max (bool, optional): Only max attempts (True) or the others.
+
+        Returns:
+            np.ndarray: The mask.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if lift is not None:
+            mask &= self._columns["lift_name"] == self._code("lift_name", lift)
+        if athlete is not None:
+            mask &= self._columns["athlete_name"] == self._code("athlete_name", athlete)
+        if done is not None:
+            mask &= (self._columns["date"] != 0) == done
+        if is_max is not None:
+            mask &= self._columns["is_max"] == is_max
+        return mask
+
+    def filter(self, **criteria):
+        """
+        Get a store with the worksets matching `criteria`, see `mask`.
+        """
+        return self.take(self.mask(**criteria))
+
+    def take(self, index):
+        """
+        Get a store with the rows selected by a boolean mask or index array.
+        """
+        index = np.asarray(index)
+        if index.dtype == bool:
+            # one mask scan, then a cheap `take` per column
+            index = np.flatnonzero(index)
+        return WorksetStore(
+            {name: array.take(index) for name, array in self._columns.items()},
+            self._categories,
+        )
+
+    def sort_by_date(self, descending=False):
+        """
+        Get a store sorted by date, with planned worksets after every real date.
+
+        The sort is stable, worksets on the same date keep their order.
+        """
+        key = np.where(self._columns["date"] == 0, _PLANNED, self._columns["date"]).astype(np.int64)
+        order = np.argsort(-key if descending else key, kind="stable")
+        return self.take(order)
+
+    def group_by_lift(self):
+        """
+        Split the store by lift.
+
+        Returns:
+            dict[str, WorksetStore]: One store per lift present, in order of
+                first appearance.
+        """
+        codes = self._columns["lift_name"]
+        present, first = np.unique(codes, return_index=True)
+        return {
+            self._categories["lift_name"][code]: self.take(codes == code)
+            for code in present[np.argsort(first)]
+        }
+
+    def concat(self, other):
+        """
+        Get a store with the rows of `self` followed by the rows of `other`.
+        """
+        categories = {}
+        other_codes = {}
+        for name in CATEGORY_COLUMNS:
+            mine = self._categories[name]
+            merged = mine + tuple(v for v in other._categories[name] if v not in mine)
+            # translate the codes of `other` to the merged categories
+            lookup = np.array([merged.index(v) for v in other._categories[name]], dtype=np.int32)
+            other_codes[name] = lookup[other._columns[name]] if len(lookup) else other._columns[name]
+            categories[name] = merged
+
+        columns = {
+            name: np.concatenate([array, other_codes.get(name, other._columns[name])])
+            for name, array in self._columns.items()
+        }
+        return WorksetStore(columns, categories)
+
+    def with_added(self, records):
+        """
+        Get a store with `records` appended.
+        """
+        return self.concat(WorksetStore.from_records(records))
+
+    def with_updated(self, record, previous=None):
+        """
+        Get a store with the workset of the same id replaced by `record`.
+
+        `previous`, the workset before the update, isn't needed here; it is
+        part of the signature every cached view of the worksets shares.
+        """
+        (positions,) = np.nonzero(self._columns["id"] == record["id"])
+        if not len(positions):
+            return self
+        replacement = WorksetStore.from_records([record])
+        merged = self.concat(replacement)
+        # move the new last row into the old row's place
+        order = np.arange(len(self))
+        order[positions[0]] = len(self)
+        return merged.take(order)
+
+    def with_deleted(self, wsid, previous=None):
+        """
+        Get a store without the workset `wsid`, see `with_updated` for `previous`.
+        """
+        return self.take(self._columns["id"] != int(wsid))
@@ -1,9 +1,11 @@
 #!/usr/bin/python
-from fivethirtyone_db import db
 import click
 import json
+import math
 import datetime
 import pathlib
+import textwrap
+import time
 
 
 @click.group()
@@ -22,6 +24,7 @@ def cli():
     help="show raw record",
 )
 def list(athlete, raw):
+    from fivethirtyone_db import db
     athlete = db.Athlete(name=athlete)
 
     for record in athlete.worksets:
@@ -41,6 +44,7 @@ def list(athlete, raw):
 @cli.command(name="delete", help="delete a specific workset from DB")
 @click.option("--id", required=True)
 def delete_workset_by_id(id):
+    from fivethirtyone_db import db
     db.Workset.delete_by_id(id)
 
 
@@ -66,21 +70,20 @@ def test():
 def add_reps(athlete, lift):
     """update reps and date on a planned workset"""
 
-    query = f"""SELECT id, weight, reps, date, athlete_name, lift_name FROM workset
-    where athlete_name='{athlete}' and
-    lift_name='{lift}' and reps IS NULL"""
+    from fivethirtyone_db import db
 
-    with db.db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        ws_id, weight, *_ = cursor.fetchall()[0]
-        print(f"How many reps at {weight:.1f} kg?")
+    # through the storage engine, so it runs on any backend
+    planned = [ws for ws in db.Athlete(athlete).worksets_to_do() if ws["lift_name"] == lift and ws["reps"] is None]
+    if not planned:
+        raise click.ClickException(f"{athlete} has no planned {lift} workset")
+    print(f"How many reps at {planned[0]['weight']:.1f} kg?")
 
 
 @cli.command(name="set-pwd", help="set password for user")
 @click.option("--athlete", required=True)
 @click.option("--password", required=True)
 def set_pwd(athlete, password):
+    from fivethirtyone_db import db
     db.Athlete(athlete)._set_password(password)
 
 
@@ -88,6 +91,7 @@ def set_pwd(athlete, password):
 @click.option("--athlete", required=True)
 @click.option("--password", required=True)
 def check_pwd(athlete, password):
+    from fivethirtyone_db import db
     from werkzeug.security import check_password_hash, generate_password_hash
 
     athlete = db.Athlete(athlete)
@@ -105,6 +109,7 @@ def default(o):
 
 @cli.command(name="export", help="dump db to records")
 def export():
+    from fivethirtyone_db import db
 
     export_folder = pathlib.Path("db-dump") / f"{datetime.date.today()}"
     export_folder.mkdir(exist_ok=True)
@@ -131,6 +136,7 @@ def export():
 @cli.command(name="import", help="init db from records")
 @click.option("--backupdate", required=True)
 def import_records(backupdate):
+    from fivethirtyone_db import db
 
     # first load all data
     export_folder = pathlib.Path("db-dump") / backupdate
@@ -141,31 +147,152 @@ def import_records(backupdate):
         with pth.open("r") as f:
             to_insert[table_name] = json.load(f)
 
-    # now delete all db rows and insert the new ones
+    # now delete all db rows and insert the new ones, all in one transaction
+    engine = db.get_engine()
     with db.db_connection() as conn:
         cursor = conn.cursor()
 
-        for table_name, records in to_insert.items():
-            if not records:
-                continue  # Skip if there are no records to insert for this table
-            
-            col_names = ", ".join(records[0].keys())
-            placeholders = ", ".join("?" * len(records[0]))  # Use '?' for each column value
+        try:
+            # the data versions clients may hold, which the restored ones must pass
+            cursor.execute("SELECT name, data_version FROM athlete")
+            seen = {name: version for name, version in cursor.fetchall()}
 
-            # delete everything from the table
-            cursor.execute(f"DELETE FROM {table_name}")
-            conn.commit()
+            for table_name, records in to_insert.items():
+                if not records:
+                    continue  # Skip if there are no records to insert for this table
+
+                col_names = ", ".join(records[0].keys())
+                placeholders = ", ".join([engine.placeholder] * len(records[0]))
+
+                # delete everything from the table
+                cursor.execute(f"DELETE FROM {table_name}")
+
+                # prepare the SQL statement for inserting new records
+                sql = f"INSERT INTO {table_name} ({col_names}) VALUES ({placeholders})"
+
+                # convert each dictionary to a tuple of values
+                values = [tuple(record[col] for col in record) for record in records]
 
-            # prepare the SQL statement for inserting new records
-            sql = f"INSERT INTO {table_name} ({col_names}) VALUES ({placeholders})"
-            
-            # convert each dictionary to a tuple of values
-            values = [tuple(record[col] for col in record) for record in records]
-            
-            # execute the SQL command to insert all records
-            cursor.executemany(sql, values)
+                # execute the SQL command to insert all records
+                cursor.executemany(sql, values)
+
+            # every athlete's worksets were replaced behind the change log: move
+            # each data version past any a client holds, so cached pages and
+            # worksets are stale, and empty the log, so delta syncs load everything
+            cursor.execute("SELECT name, data_version FROM athlete")
+            restored = cursor.fetchall()
+            now = int(time.time())
+            cursor.executemany(
+                f"UPDATE athlete SET data_version={engine.placeholder}, data_modified={engine.placeholder}"
+                f" WHERE name={engine.placeholder}",
+                [(max(version, seen.get(name, 0)) + 1, now, name) for name, version in restored],
+            )
+            cursor.execute("DELETE FROM workset_change")
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@cli.command(name="plan-all", help="plan the next cycle of every athlete")
+@click.option("--dry-run", is_flag=True, help="print the plan and timings, store nothing")
+@click.option("--workers", type=int, help="worker processes for large rosters")
+@click.option("--include-planned", is_flag=True, help="also plan athletes with worksets still to do")
+def plan_all(dry_run, workers, include_planned):
+    from fivethirtyone_db import planner
+
+    plan, timings = planner.plan_all(dry_run=dry_run, workers=workers, include_planned=include_planned)
+
+    planned = 0
+    for i, athlete in enumerate(plan.athletes):
+        if plan.base_reps[i] < 0:
+            print(f"{athlete:>10s} skipped, no program for its current base reps")
+            continue
+        lifts = [
+            f"{lift} {plan.weight[i, j]:5.1f} kg"
+            for j, lift in enumerate(plan.lifts)
+            if not math.isnan(plan.weight[i, j])
+        ]
+        planned += len(lifts)
+        if dry_run:
+            print(f"{athlete:>10s} cycle {plan.cycle[i]:2d} {plan.base_reps[i]}+  " + ", ".join(lifts))
+
+    total = sum(timings.values())
+    print(f"{len(plan.athletes)} athletes, {planned} worksets {'planned' if dry_run else 'stored'}")
+    for phase, seconds in timings.items():
+        print(f"{phase:>6s} {seconds * 1000:9.1f} ms")
+    if total:
+        print(f"{'total':>6s} {total * 1000:9.1f} ms, {len(plan.athletes) / total:.0f} athletes/s")
+
+
+@cli.command(name="forecast", help="forecast every athlete's maxes a few cycles ahead")
+@click.option("--cycles", type=int, default=8, show_default=True, help="cycles ahead")
+@click.option("--simulations", type=int, default=2000, show_default=True, help="paths per athlete and lift")
+@click.option("--seed", type=int, help="random seed, for a reproducible forecast")
+@click.option("--workers", type=int, help="worker processes for large rosters")
+@click.option("-a", "--athlete", help="only print this athlete")
+def forecast_maxes(cycles, simulations, seed, workers, athlete):
+    from fivethirtyone_db import forecast
+
+    result, timings = forecast.forecast_all(cycles=cycles, simulations=simulations, seed=seed, workers=workers)
+
+    # the outermost band and the median, in the last cycle ahead
+    low, median, high = 0, result.percentiles.index(50), -1
+    for i, name in enumerate(result.athletes):
+        if athlete and name != athlete:
+            continue
+        if result.base_reps[i, -1] < 0:
+            print(f"{name:>10s} skipped, no program for its base reps")
+            continue
+        print(f"{name:>10s} in {cycles} cycles: cycle {result.cycle[i, -1]} {result.base_reps[i, -1]}+")
+        for j, lift in enumerate(result.lifts):
+            band = result.bands[i, j, -1]
+            if math.isnan(band[median]):
+                continue
+            print(
+                f"{'':10s} {lift:10s} {result.start[i, j]:6.1f} kg -> {band[median]:6.1f} kg"
+                f" ({result.percentiles[low]}-{result.percentiles[high]}%: {band[low]:6.1f} - {band[high]:6.1f} kg)"
+            )
+
+    for phase, seconds in timings.items():
+        print(f"{phase:>8s} {seconds * 1000:9.1f} ms")
+    if result.simulated:
+        print(f"{result.simulated} simulated cycles, {timings['forecast'] / result.simulated * 1e9:.1f} ns per cycle")
+
+
+def _backend(name):
+    from fivethirtyone_db import storage, _credentials
+
+    if name == "mysql":
+        return storage.engine_from_credentials(dict(_credentials, engine="mysql"))
+    # not get_engine, which would migrate it already
+    return storage.engine_from_credentials({"engine": "sqlite"})
+
+
+@cli.command(name="migrate", help="bring the database schema up to date")
+@click.option("--backend", type=click.Choice(["sqlite", "mysql"]), default="sqlite", show_default=True)
+@click.option("--target", type=int, help="stop after this schema version")
+def migrate(backend, target):
+    from fivethirtyone_db import migrations
+
+    backend = _backend(backend)
+    print(f"schema version {migrations.current_version(backend)}")
+    for migration in migrations.migrate(backend, target=target):
+        print(f"applied {migration.version:3d}: {migration.description}")
+    print(f"schema version {migrations.current_version(backend)}")
+
+
+@cli.command(name="explain", help="print query plans for the hot queries")
+@click.option("--backend", type=click.Choice(["sqlite", "mysql"]), default="sqlite", show_default=True)
+def explain(backend):
+    from fivethirtyone_db import migrations
 
+    for name, sql, plan in migrations.explain(_backend(backend)):
+        print(f"-- {name}")
+        print(textwrap.dedent(sql).strip())
+        for line in plan:
+            print(f"   {line}")
+        print()
 
 
 if __name__ == "__main__":
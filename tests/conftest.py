@@ -0,0 +1,35 @@
+import shutil
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import fivethirtyone_db
+from fivethirtyone_db import db, migrations, storage
+from fivethirtyone_db.cache import WorksetCache
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+
+
+@pytest.fixture(autouse=True)
+def engine(tmp_path, monkeypatch):
+    """run every test against a scratch copy of the bundled database"""
+    scratch = tmp_path / "531.sqlite"
+    shutil.copy(fivethirtyone_db.DB_FILE, scratch)
+    engine = SQLiteEngine(scratch)
+    migrations.migrate(engine)
+    # start every test with fresh pool counters
+    engine.close()
+    engine = SQLiteEngine(scratch)
+    monkeypatch.setattr(storage, "_engine", engine)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """a test client of the app on the scratch database; camilla logs in with "secret" """
+    monkeypatch.setattr(fivethirtyone_db, "_credentials", {})
+    app = fivethirtyone_db.create_app({"engine": "sqlite", "path": engine.path})
+    storage.get_engine().set_password("camilla", generate_password_hash("secret"))
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    yield app.test_client()
+    storage.get_engine().close()
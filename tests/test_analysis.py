@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+import pytest
+
+import fivethirtyone_db
+from fivethirtyone_db import analysis, config, db, storage
+from fivethirtyone_db.worksets import WorksetStore
+
+
+def test_one_rm_scalars_match_the_formulas():
+    assert analysis.one_rm_brzycki(100, 5) == pytest.approx(100 * 36 / 32)
+    assert analysis.one_rm_lombardi(100, 5) == pytest.approx(100 * 5**0.1)
+    assert analysis.one_rm_fusion(100, 5) == pytest.approx(0.5 * (100 * 36 / 32 + 100 * 5**0.1))
+    assert type(analysis.one_rm_fusion(100, 5)) is float
+
+
+def test_one_rm_arrays():
+    weights = np.array([100.0, 80.0, 60.0])
+    reps = np.array([1, 5, np.nan])
+    one_rms = analysis.one_rm_fusion(weights, reps)
+
+    assert one_rms[:2] == pytest.approx([analysis.one_rm_fusion(100, 1), analysis.one_rm_fusion(80, 5)])
+    assert np.isnan(one_rms[2])
+
+
+@pytest.mark.parametrize("fn", [analysis.one_rm_brzycki, analysis.one_rm_fusion])
+def test_one_rm_domain(fn):
+    with pytest.raises(ValueError):
+        fn(100, 37)
+    with pytest.raises(ValueError):
+        fn(np.array([100, 100]), np.array([3, 40]))
+    with pytest.raises(ValueError):
+        fn(-1, 3)
+    assert analysis.one_rm_lombardi(100, 40) > 100
+
+
+def test_e1rm_of_a_history():
+    store = WorksetStore.from_records([
+        dict(id=1, weight=100.0, reps=5, date="2024-01-01"),
+        dict(id=2, weight=100.0, reps=None),
+        dict(id=3, weight=50.0, reps=40, date="2024-01-02"),
+    ])
+    one_rms = analysis.e1rm(store)
+
+    assert one_rms[0] == pytest.approx(analysis.one_rm_fusion(100, 5))
+    assert np.isnan(one_rms[1:]).all()
+    assert analysis.e1rm(store, "lombardi")[2] == pytest.approx(analysis.one_rm_lombardi(50, 40))
+
+
+def test_latest_e1rm_for_every_athlete():
+    lifts = config["lifts"]
+    everyone = WorksetStore.from_records(storage.get_engine().list_rows("workset"))
+    batched = analysis.latest_e1rm(everyone, lifts)
+
+    for name in ["camilla", "christina", "irfan", "jimmy"]:
+        for lift, ws in db.Athlete(name, worksets=[]).latest_maxes(lifts).items():
+            if ws:
+                assert batched[name][lift] == pytest.approx(analysis.one_rm_fusion(ws["weight"], ws["reps"]))
+            else:
+                assert math.isnan(batched.get(name, {}).get(lift, math.nan))
+
+
+def compile_with_pandas(lift, train_max, program, cycle):
+    """analysis.compile as it was, on the pandas programs"""
+    train_max += fivethirtyone_db.to_add_pr_cycle[lift] * cycle
+    increment = fivethirtyone_db.SMALLEST_W_INC
+    weight = ((program["pct"] / 100 * train_max) // increment) * increment
+    return program.assign(weight=weight)[["reps", "weight"]].T
+
+
+@pytest.mark.parametrize("base_reps", [5, 3, 1, 0, "3", "five"])
+@pytest.mark.parametrize("cycle", [0, 1, 4])
+def test_compile_matches_pandas(base_reps, cycle):
+    from fivethirtyone_db import programs
+
+    for lift in config["lifts"]:
+        for train_max in [0.0, 31.5, 61.2, 99.99, 142.5]:
+            expected = compile_with_pandas(lift, train_max, programs[base_reps], cycle)
+            to_lift = analysis.compile(lift, train_max, base_reps, cycle=cycle)
+
+            assert list(to_lift.reps) == expected.loc["reps"].to_list()
+            assert list(to_lift.weight) == expected.loc["weight"].to_list()
+
+
+def test_compile_lifts_is_memoized(monkeypatch):
+    monkeypatch.setattr(analysis, "COMPILE_CACHE_SIZE", 4)
+    monkeypatch.setattr(analysis, "_compiled", analysis.OrderedDict())
+    train_maxes = {lift: 50.0 + i for i, lift in enumerate(config["lifts"])}
+
+    first = analysis.compile_lifts(train_maxes, 5, cycle=1)
+    assert list(first) == list(train_maxes)
+    assert analysis.compile_lifts(train_maxes, "5", cycle=1)["bench"] is first["bench"]
+    assert analysis.compile("squat", 50.0 + list(train_maxes).index("squat"), "five", 1) is first["squat"]
+
+    # evicts the least recently used one
+    lru, *_ = config["lifts"]
+    analysis.compile_lifts({"bench": 80.0}, 3)
+    assert len(analysis._compiled) == 4
+    again = analysis.compile_lifts(train_maxes, 5, cycle=1)
+    assert again[lru] is not first[lru] and again[lru] == first[lru]
+
+
+def test_iso_curves_broadcast_over_one_rms():
+    one_rms = np.array([100.0, 60.0, np.nan])
+    reps, weights = analysis.iso_curves(one_rms)
+
+    assert weights.shape == (3, len(reps))
+    assert weights[1] == pytest.approx(analysis.iso_fusion(60.0)[1])
+    assert np.isnan(weights[2]).all()
+    # lifting the iso weight for n reps gives back the 1rm
+    assert analysis.one_rm_fusion(weights[0], reps) == pytest.approx(np.full(len(reps), 100.0))
+    assert analysis.rep_grid(analysis.ISO_GRID) is reps
+
+    with pytest.raises(ValueError):
+        analysis.iso_curves(100.0, "brzycki", grid=(1, 40, 10))
+
+
+def test_rep_max_table():
+    table = analysis.rep_max_table({"bench": 100.0, "squat": np.nan}, formula="brzycki")
+    assert table.lifts == ("bench", "squat")
+    assert table.reps.tolist() == list(range(1, 16))
+    assert table.weight[0] == pytest.approx([(37 - n) * 100 / 36 for n in range(1, 16)])
+    assert np.isnan(table.weight[1]).all()
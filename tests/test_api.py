@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from fivethirtyone_db import api, db
+
+
+@pytest.fixture
+def logged_in(client):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    return client
+
+
+def all_pages(client, url):
+    rows = []
+    while url:
+        response = client.get(url)
+        rows += response.json
+        link = response.headers.get("Link")
+        url = link and link[1 : link.index(">")]
+    return rows
+
+
+def test_pages_cover_every_workset(logged_in):
+    expected = sorted(ws["id"] for ws in db.Athlete("camilla").worksets.filter(lift="bench"))
+
+    first = logged_in.get("/api/lifts/bench?limit=7")
+    assert len(first.json) == 7 and 'rel="next"' in first.headers["Link"]
+    assert [ws["id"] for ws in all_pages(logged_in, "/api/lifts/bench?limit=7")] == expected
+    # without a limit, one page holds PAGE_SIZE
+    assert [ws["id"] for ws in all_pages(logged_in, "/api/lifts/bench")] == expected
+
+
+def test_filters_and_fields(logged_in):
+    worksets = db.Athlete("camilla").worksets
+    maxes = [ws for ws in worksets if ws["is_max"] and ws["date"] and str(ws["date"]) >= "2023-06-01"]
+
+    rows = all_pages(logged_in, "/api/worksets?is_max=1&since=2023-06-01&fields=id,weight,rep_str&limit=5")
+    assert rows == [
+        dict(id=ws["id"], weight=ws["weight"], rep_str=ws["reps"]) for ws in sorted(maxes, key=lambda ws: ws["id"])
+    ]
+
+    planned = logged_in.get("/api/lifts/bench?fields=rep_str").json
+    assert {ws["rep_str"] for ws in planned} >= {f"({ws['base_reps']}+)" for ws in worksets.filter(lift="bench", done=False)}
+
+
+@pytest.mark.parametrize("query", ["since=yesterday", "is_max=maybe", "after=x", f"limit={api.MAX_PAGE_SIZE + 1}", "fields=id,password"])
+def test_bad_arguments(logged_in, query):
+    assert logged_in.get(f"/api/worksets?{query}").status_code == 400
+
+
+def test_ndjson_streams_every_row(logged_in, monkeypatch):
+    pages = all_pages(logged_in, "/api/worksets?limit=1000")
+
+    # rows are fetched a few at a time while the response is written
+    monkeypatch.setattr("fivethirtyone_db.storage.sqlite.FETCH_BATCH", 3)
+    response = logged_in.get("/api/worksets", headers={"Accept": api.NDJSON})
+    assert response.mimetype == api.NDJSON
+    assert [json.loads(line) for line in response.data.decode().splitlines()] == pages
+
+    limited = logged_in.get("/api/worksets?format=ndjson&limit=2&fields=id")
+    assert limited.data.decode().splitlines() == [json.dumps(dict(id=ws["id"])) for ws in pages[:2]]
+
+
+def test_delta_sync(logged_in):
+    # the history predates the change log, so a new client starts over
+    start = logged_in.get("/api/worksets/changes?since=0").json
+    assert start["reset"] and len(start["worksets"]) == len(db.Athlete("camilla").worksets)
+
+    ws = db.Workset(base_max=100, base_reps=5, cycle=9, weight=60, lift_name="bench", athlete_name="camilla")
+    ws.add()
+    gone = start["worksets"][0]["id"]
+    db.Workset.delete_by_id(gone)
+
+    delta = logged_in.get(f"/api/worksets/changes?since={start['version']}").json
+    assert (delta["version"], delta["reset"]) == (start["version"] + 2, False)
+    assert [row["id"] for row in delta["worksets"]] == [ws.id]
+    assert delta["worksets"][0]["rep_str"] == "(5+)"
+    assert delta["deleted"] == [gone]
+
+    again = logged_in.get(f"/api/worksets/changes?since={delta['version']}").json
+    assert (again["worksets"], again["deleted"], again["reset"]) == ([], [], False)
+    assert logged_in.get("/api/worksets/changes").status_code == 400
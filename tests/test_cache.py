@@ -0,0 +1,176 @@
+import pytest
+
+from fivethirtyone_db import db, storage
+from fivethirtyone_db.cache import WorksetCache
+from fivethirtyone_db.storage.memory import MemoryEngine
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    engine = MemoryEngine()
+    for name in ["anna", "bob", "carl"]:
+        engine.add_athlete(name)
+        engine.add_worksets([dict(lift_name="bench", athlete_name=name, weight=50)])
+    monkeypatch.setattr(storage, "_engine", engine)
+    return engine
+
+
+def test_hits_until_a_write(memory):
+    cache = WorksetCache()
+
+    first = cache.get("anna")
+    assert cache.get("anna") is first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    memory.add_worksets([dict(lift_name="squat", athlete_name="anna", weight=60)])
+    entry = cache.get("anna")
+    assert entry.version == first.version + 1
+    assert [ws["lift_name"] for ws in entry.worksets] == ["bench", "squat"]
+    assert cache.stats()["misses"] == 2
+
+
+def test_write_between_version_and_load_is_added_once(memory, monkeypatch):
+    cache = WorksetCache()
+    load = memory.load_worksets
+    written = []
+
+    def write_then_load(athlete):
+        # another request commits between `get` reading the version and loading
+        (wsid,) = memory.add_worksets([dict(lift_name="squat", athlete_name=athlete, weight=60)])
+        written.append(memory.fetch_workset(wsid))
+        return load(athlete)
+
+    monkeypatch.setattr(memory, "load_worksets", write_then_load)
+    assert len(cache.get("anna").worksets) == 2
+    monkeypatch.setattr(memory, "load_worksets", load)
+
+    # the writer's write-through, after `get` is done
+    cache.apply("anna", memory.data_version("anna"), lambda worksets: worksets.with_added(written))
+    entry = cache.get("anna")
+    assert [ws["id"] for ws in entry.worksets] == [ws["id"] for ws in memory.load_worksets("anna")]
+    assert len(entry.worksets) == 2
+
+
+def test_lru_eviction(memory):
+    cache = WorksetCache(size=2)
+    cache.get("anna")
+    cache.get("bob")
+    cache.get("anna")
+    cache.get("carl")  # evicts bob, the least recently used
+
+    assert cache.stats() == dict(size=2, athletes=2, hits=1, misses=3, evictions=1, deltas=0)
+    cache.get("anna")
+    assert cache.stats()["hits"] == 2
+    cache.get("bob")
+    assert cache.stats()["misses"] == 4
+
+
+def test_switching_engine_drops_entries(memory, monkeypatch):
+    cache = WorksetCache()
+    cache.get("anna")
+
+    monkeypatch.setattr(storage, "_engine", MemoryEngine())
+    assert len(cache.get("anna").worksets) == 0
+
+
+def test_writes_go_through_to_the_cache(memory, monkeypatch):
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    db.Athlete.cached("anna")
+
+    ws = db.Workset(base_max=None, base_reps=None, cycle=None, weight="60", lift_name="squat", athlete_name="anna")
+    ws.add()
+    db.Workset.update_row(ws.id, date="2024-01-02", lift_name="squat", reps="5", weight="62.5", is_max=True)
+    first, = [w for w in db.Athlete.cached("anna").worksets if w["lift_name"] == "bench"]
+    db.Workset.delete_by_id(first["id"])
+
+    athlete = db.Athlete.cached("anna")
+    stored = memory.load_worksets("anna")
+    assert athlete.worksets.values("id") == [ws["id"] for ws in stored]
+    assert athlete.worksets.values("date") == [ws["date"] for ws in stored]
+    assert athlete.data_version == memory.data_version("anna")
+    assert (athlete.worksets[0]["weight"], athlete.worksets[0]["reps"]) == (62.5, 5)
+    assert db.cache_stats()["deltas"] == 3
+    assert db.cache_stats()["misses"] == 1
+
+
+def test_write_from_elsewhere_forces_reload(memory, monkeypatch):
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    db.Athlete.cached("anna")
+
+    # e.g. another process, the cache never hears about it
+    memory.add_worksets([dict(lift_name="squat", athlete_name="anna", weight=60)])
+    db.Workset(base_max=None, base_reps=None, cycle=None, weight=70, lift_name="military", athlete_name="anna").add()
+
+    worksets = db.Athlete.cached("anna").worksets
+    assert [ws["lift_name"] for ws in worksets] == ["bench", "squat", "military"]
+    assert db.cache_stats()["deltas"] == 0
+    assert db.cache_stats()["misses"] == 2
+
+
+def test_session_holds_identity_only(client):
+    response = client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    assert response.status_code == 302
+
+    cookie = client.get_cookie("session")
+    assert len(cookie.value) < 200
+
+    with client.session_transaction() as session:
+        assert set(session) == {"athlete_name", "data_version"}
+
+    misses = db.cache_stats()["misses"]
+    assert client.get("/").status_code == 200
+    assert client.get("/graphs").status_code == 200
+    assert client.get("/api/lifts/bench").json
+    assert db.cache_stats()["misses"] == misses
+
+
+def test_edits_keep_the_cache_warm(client):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    headers = {"Referer": "/"}
+
+    client.post("/workset/add", data=dict(weight="20", lift="bench"), headers=headers)
+    new, = [ws for ws in client.get("/api/lifts/bench").json if ws["reps"] is None and ws["weight"] == 20]
+    client.post(
+        f"/workset/{new['id']}",
+        data=dict(send="save", wsid=new["id"], date="2031-01-01", lift="bench", reps="5", weight="20"),
+        headers=headers,
+    )
+    client.post(f"/workset/{new['id']}", data=dict(send="delete", wsid=new["id"]), headers=headers)
+
+    stats = db.cache_stats()
+    assert (stats["misses"], stats["deltas"]) == (1, 3)
+    assert new["id"] not in [ws["id"] for ws in client.get("/api/lifts/bench").json]
+
+
+def test_rep_maxes_are_kept_until_the_maxes_change(memory, monkeypatch):
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    db.Workset(base_max=None, base_reps=None, cycle=None, weight=80, lift_name="bench", athlete_name="anna",
+               date="2024-01-01", is_max=True, reps=5).add()
+
+    table = db.Athlete.cached("anna").rep_maxes()
+    assert db.Athlete.cached("anna").rep_maxes() is table
+
+    # a planned workset doesn't change the maxes
+    db.Workset(base_max=None, base_reps=None, cycle=None, weight=85, lift_name="bench", athlete_name="anna").add()
+    assert db.Athlete.cached("anna").rep_maxes() is table
+
+    db.Workset(base_max=None, base_reps=None, cycle=None, weight=85, lift_name="bench", athlete_name="anna",
+               date="2024-02-01", is_max=True, reps=5).add()
+    newer = db.Athlete.cached("anna").rep_maxes()
+    assert newer is not table
+    assert newer.weight[newer.lifts.index("bench"), 4] == pytest.approx(85)
+    assert db.cache_stats()["misses"] == 1
+
+
+def test_rep_maxes_api_and_graphs(client):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+
+    table = client.get("/api/rep-maxes").json
+    assert table["reps"] == list(range(1, 16))
+    athlete = db.Athlete("camilla")
+    for lift, maxes in table["lifts"].items():
+        expected = athlete.estimate_next_cycle()[lift]
+        assert maxes["one_rm"] == pytest.approx(expected)
+        assert maxes["weight"][0] == pytest.approx(expected)
+
+    assert b"Rep maxes" in client.get("/graphs").data
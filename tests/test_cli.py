@@ -0,0 +1,60 @@
+import json
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+import fivethirtyone_db
+from fivethirtyone_db import db, migrations, storage
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+from scripts.cli import cli, default
+
+
+@pytest.fixture
+def bundled(tmp_path, monkeypatch):
+    """an unmigrated copy of the bundled database, which the CLI uses by default"""
+    path = tmp_path / "531.sqlite"
+    shutil.copy(fivethirtyone_db.DB_FILE, path)
+    monkeypatch.setattr(fivethirtyone_db, "DB_FILE", path)
+    monkeypatch.setattr(storage, "_engine", None)
+    yield path
+    storage.get_engine().close()
+
+
+def test_cli_writes_to_the_unmigrated_database(bundled):
+    unmigrated = SQLiteEngine(bundled)
+    assert migrations.current_version(unmigrated) == 0
+    wsid = unmigrated.list_rows("workset")[0]["id"]
+    unmigrated.close()
+
+    result = CliRunner().invoke(cli, ["delete", "--id", str(wsid)])
+    assert result.exit_code == 0, result.output
+    assert db.Workset.fetch(wsid) is None
+    assert migrations.current_version(storage.get_engine()) == migrations.MIGRATIONS[-1].version
+
+
+def test_migrate_command_starts_from_the_stored_version(bundled):
+    result = CliRunner().invoke(cli, ["migrate", "--target", "3"])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[0] == "schema version 0"
+    assert result.output.splitlines()[-1] == "schema version 3"
+
+
+def test_import_invalidates_the_restored_athletes(engine, tmp_path, monkeypatch):
+    dump = tmp_path / "db-dump" / "backup"
+    dump.mkdir(parents=True)
+    for table in ["athlete", "workset"]:
+        (dump / f"{table}.json").write_text(json.dumps(engine.list_rows(table), default=default))
+    # a write after the backup, in the change log
+    db.Workset(base_max=None, base_reps=None, cycle=None, weight=20, lift_name="bench", athlete_name="camilla").add()
+    before = engine.data_version("camilla")
+
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(cli, ["import", "--backupdate", "backup"])
+    assert result.exit_code == 0, result.output
+
+    assert engine.data_version("camilla") > before
+    # the log doesn't cover the restore, so clients load everything again
+    assert engine.workset_changes("camilla", before)[1] is None
+    backup = [ws["id"] for ws in json.loads((dump / "workset.json").read_text()) if ws["athlete_name"] == "camilla"]
+    assert sorted(ws["id"] for ws in engine.load_worksets("camilla")) == sorted(backup)
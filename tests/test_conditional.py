@@ -0,0 +1,112 @@
+import pytest
+
+import fivethirtyone_db
+from fivethirtyone_db import conditional, db, storage
+
+PAGES = ["/", "/graphs", "/api/lifts/bench", "/api/rep-maxes"]
+
+
+@pytest.fixture
+def queries(client, monkeypatch):
+    """count the statements the app's engine runs"""
+    engine = storage.get_engine()
+    count = []
+    for name in ["_fetchall", "_transaction"]:
+        method = getattr(engine, name)
+
+        def counted(*args, method=method, **kwargs):
+            count.append(method.__name__)
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(engine, name, counted)
+    return count
+
+
+def login(client):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+
+
+@pytest.mark.parametrize("url", PAGES)
+def test_revalidation_is_one_query(client, queries, url):
+    login(client)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"') and not response.headers["ETag"].startswith('W/')
+    assert "private" in response.headers["Cache-Control"]
+
+    queries.clear()
+    revalidated = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers["ETag"] == response.headers["ETag"]
+    # the data version lookup, nothing else
+    assert queries == ["_fetchall"]
+
+
+def test_a_write_changes_the_etag(client):
+    login(client)
+    etag = client.get("/api/lifts/bench").headers["ETag"]
+    assert client.get("/graphs").headers["ETag"] != etag
+
+    client.post("/workset/add", data=dict(weight="20", lift="bench"), headers={"Referer": "/"})
+    response = client.get("/api/lifts/bench", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Last-Modified" in response.headers
+
+    modified = client.get("/", headers={"If-Modified-Since": response.headers["Last-Modified"]})
+    assert modified.status_code == 304
+
+
+def test_other_athletes_get_their_own_etag(client):
+    login(client)
+    etag = client.get("/").headers["ETag"]
+    storage.get_engine().set_password("jimmy", db.generate_password_hash("secret"))
+    client.get("/auth/logout")
+    client.post("/auth/login", data=dict(username="jimmy", password="secret"))
+
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_pages_with_flashed_messages_are_rendered(client):
+    login(client)
+    etag = client.get("/").headers["ETag"]
+    with client.session_transaction() as session:
+        session["_flashes"] = [("message", "saved")]
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_negotiated_representations_get_their_own_etag(client):
+    login(client)
+    as_json = client.get("/api/worksets", headers={"Accept": "application/json"})
+    assert {"Accept", "Cookie"} <= set(as_json.vary)
+
+    as_ndjson = client.get(
+        "/api/worksets", headers={"Accept": "application/x-ndjson", "If-None-Match": as_json.headers["ETag"]}
+    )
+    assert as_ndjson.status_code == 200 and as_ndjson.mimetype == "application/x-ndjson"
+    assert as_ndjson.headers["ETag"] != as_json.headers["ETag"]
+
+
+def test_a_new_build_changes_the_etag(client, monkeypatch):
+    login(client)
+    etag = client.get("/").headers["ETag"]
+    monkeypatch.setattr(conditional, "build", lambda: "a new deploy")
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_a_new_config_changes_the_build(monkeypatch):
+    build = conditional.build()
+    monkeypatch.setattr(fivethirtyone_db, "get_config", lambda: {"lifts": ["bench"]})
+    conditional.build.cache_clear()
+    try:
+        assert conditional.build() != build
+    finally:
+        conditional.build.cache_clear()
+
+
+def test_static_files_dont_look_up_the_athlete(client, queries):
+    login(client)
+    queries.clear()
+    assert client.get("/static/style.css").status_code == 200
+    assert queries == []
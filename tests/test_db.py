@@ -0,0 +1,134 @@
+import shutil
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import fivethirtyone_db
+from fivethirtyone_db import analysis, db, migrations, storage
+from fivethirtyone_db.storage import sqlite
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+
+
+def test_pool_reuses_connections():
+
+    for _ in range(5):
+        db.Workset.list()
+
+    stats = db.pool_stats()
+    assert stats["checkouts"] == 5
+    assert stats["misses"] == 1
+    assert stats["hits"] == 4
+    assert stats["open"] == 1
+
+
+def test_pool_pragmas():
+
+    with db.db_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == sqlite.BUSY_TIMEOUT_MS
+
+
+def test_bundled_database_keeps_its_journal():
+
+    engine = SQLiteEngine()
+    with engine.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    engine.close()
+    assert not fivethirtyone_db.DB_FILE.with_name("531.sqlite-wal").exists()
+
+
+def test_pool_nested_connection_is_shared():
+
+    with db.db_connection() as outer:
+        with db.db_connection() as inner:
+            assert inner is outer
+
+    assert db.pool_stats()["checkouts"] == 1
+
+
+def test_pool_is_bounded_across_threads():
+
+    def work():
+        for _ in range(20):
+            db.Workset.list()
+
+    threads = [threading.Thread(target=work) for _ in range(2 * sqlite.POOL_SIZE)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = db.pool_stats()
+    assert stats["open"] <= sqlite.POOL_SIZE
+    assert stats["checkouts"] == 20 * 2 * sqlite.POOL_SIZE
+
+
+def test_migrations_are_recorded_and_idempotent(tmp_path):
+
+    engine = SQLiteEngine(tmp_path / "fresh.sqlite")
+    assert migrations.current_version(engine) == 0
+
+    applied = migrations.migrate(engine)
+    assert [m.version for m in applied] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.migrate(engine) == []
+    assert migrations.current_version(engine) == migrations.MIGRATIONS[-1].version
+    engine.close()
+
+
+def test_app_migrates_the_bundled_database(tmp_path, monkeypatch):
+
+    bundled = tmp_path / "531.sqlite"
+    shutil.copy(fivethirtyone_db.DB_FILE, bundled)
+    unmigrated = SQLiteEngine(bundled)
+    assert migrations.current_version(unmigrated) < migrations.MIGRATIONS[-1].version
+    unmigrated.close()
+
+    monkeypatch.setattr(fivethirtyone_db, "_credentials", {})
+    client = fivethirtyone_db.create_app({"engine": "sqlite", "path": bundled}).test_client()
+    assert migrations.current_version(storage.get_engine()) == migrations.MIGRATIONS[-1].version
+
+    storage.get_engine().set_password("camilla", generate_password_hash("secret"))
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    assert client.get("/").status_code == 200
+    assert client.get("/api/worksets").status_code == 200
+    storage.get_engine().close()
+
+
+def test_hot_queries_use_athlete_indexes(engine):
+
+    for name, sql, plan in migrations.explain(engine):
+        assert any("INDEX ix_workset_athlete" in line for line in plan), (name, plan)
+
+
+@pytest.mark.parametrize("name", ["camilla", "christina", "irfan", "jimmy"])
+def test_athlete_queries_match_full_scan(name):
+    athlete = db.Athlete(name)
+    worksets = athlete.worksets
+
+    to_do = sorted((ws for ws in worksets if ws["date"] is None), key=lambda ws: ws["id"])
+    assert athlete.worksets_to_do() == to_do
+
+    for lift in db.config["lifts"]:
+        maxes = [ws for ws in worksets if ws["is_max"] and ws["lift_name"] == lift]
+        expected = max(maxes, key=lambda ws: ws["date"], default={})
+        assert athlete.latest_max(lift) == expected
+        assert athlete.latest_maxes(db.config["lifts"])[lift] == expected
+
+    in_cycle = [ws for ws in worksets if ws["cycle"] and ws["date"]]
+    latest = athlete.latest_cycle()
+    if not in_cycle:
+        assert latest == {}
+        return
+    assert latest["date"] == max(ws["date"] for ws in in_cycle)
+    assert (latest["cycle"], latest["base_reps"]) in {(ws["cycle"], ws["base_reps"]) for ws in in_cycle if ws["date"] == latest["date"]}
+
+
+@pytest.mark.parametrize("name", ["camilla", "irfan"])
+def test_estimate_next_cycle_looks_up_the_latest_maxes(name):
+    history = db.Athlete(name).worksets
+    # without any worksets in memory, the maxes come from the database
+    estimate = db.Athlete(name, worksets=[]).estimate_next_cycle()
+    lifts = fivethirtyone_db.config["lifts"]
+    expected = analysis.latest_e1rm(history, lifts)[name]
+    assert {lift: estimate[lift] for lift in lifts} == pytest.approx(expected, nan_ok=True)
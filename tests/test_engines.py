@@ -0,0 +1,219 @@
+"""conformance tests every storage engine has to pass
+
+MySQL runs only when FTO_TEST_MYSQL_HOST (plus _USER, _PASSWORD and _DATABASE)
+points at a scratch database.
+"""
+import datetime
+import os
+
+import pytest
+
+from fivethirtyone_db import db, migrations, storage
+from fivethirtyone_db.storage.memory import MemoryEngine
+from fivethirtyone_db.storage.sqlite import SQLiteEngine
+
+MYSQL = {
+    key: os.environ.get(f"FTO_TEST_MYSQL_{key.upper()}")
+    for key in ["host", "user", "password", "database"]
+}
+
+
+def make_mysql():
+    from fivethirtyone_db.storage.mysql import MySQLEngine
+
+    engine = MySQLEngine(MYSQL)
+    with engine.connection() as conn:
+        cursor = conn.cursor()
+        for table in ["workset_change", "workset", "athlete", "lift", "schema_version"]:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    return engine
+
+
+@pytest.fixture(
+    params=[
+        "memory",
+        "sqlite",
+        pytest.param("mysql", marks=pytest.mark.skipif(not MYSQL["host"], reason="no MySQL server")),
+    ]
+)
+def engine(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        engine = MemoryEngine()
+    elif request.param == "sqlite":
+        engine = SQLiteEngine(tmp_path / "empty.sqlite")
+    else:
+        engine = make_mysql()
+
+    engine.create_schema()
+    monkeypatch.setattr(storage, "_engine", engine)
+    yield engine
+    engine.close()
+
+
+def workset(lift="bench", athlete="anna", date=None, **kwargs):
+    values = dict(base_max=100, base_reps=5, cycle=1, weight=85)
+    values.update(kwargs)
+    return db.Workset(lift_name=lift, athlete_name=athlete, date=date, **values)
+
+
+def test_athlete_login(engine):
+    db.Athlete("o'hara", worksets=[]).add("secret")
+
+    assert db.Athlete._get_login("o'hara").startswith(("scrypt:", "pbkdf2:"))
+    assert db.Athlete._get_login("nobody") is None
+    assert [row["name"] for row in db.Athlete.list()] == ["o'hara"]
+
+
+def test_add_and_load_worksets(engine):
+    workset(date="2024-01-02", reps=5, is_max=True).add()
+    workset(lift="squat").add()
+    workset(athlete="bob").add()
+
+    worksets = sorted(db.Athlete("anna").worksets, key=lambda ws: ws["id"])
+    assert [ws["lift_name"] for ws in worksets] == ["bench", "squat"]
+
+    done, planned = worksets
+    assert done["date"] == datetime.date(2024, 1, 2)
+    assert (done["reps"], done["weight"], done["is_max"]) == (5, 85, 1)
+    assert planned["date"] is None and planned["reps"] is None
+    assert db.Workset.fetch(done["id"]) == done
+
+
+def test_add_many_is_atomic(engine):
+    db.Workset.add_many(workset(lift) for lift in ["bench", "squat", "military", "deadlift"])
+    assert len(db.Athlete("anna").worksets) == 4
+
+    # the last two collide on UNIQUE (lift_name, athlete_name, date)
+    duplicates = [workset("curl"), workset(date="2024-01-01"), workset(date="2024-01-01")]
+    with pytest.raises(storage.IntegrityError):
+        db.Workset.add_many(duplicates)
+    assert len(db.Athlete("anna").worksets) == 4
+
+
+def test_update_and_delete(engine):
+    workset(date="2024-01-02", reps=5).add()
+    ws, = db.Athlete("anna").worksets
+
+    db.Workset.update_row(ws["id"], date="", lift_name="squat", reps="", weight="60", is_max=True)
+    ws, = db.Athlete("anna").worksets
+    assert (ws["date"], ws["lift_name"], ws["reps"], ws["weight"], ws["is_max"]) == (None, "squat", None, 60, 1)
+
+    db.Workset.delete_by_id(ws["id"])
+    assert len(db.Athlete("anna").worksets) == 0
+
+
+def test_athlete_queries(engine):
+    db.Workset.add_many([
+        workset(date="2024-01-01", reps=5, weight=80, is_max=True, cycle=0),
+        workset(date="2024-02-01", reps=3, weight=90, is_max=True, cycle=2, base_reps=3),
+        workset(date="2024-03-01", reps=8, weight=70, is_max=False, cycle=0),
+        workset(lift="squat", date="2024-01-15", reps=5, weight=100, is_max=True, cycle=2),
+        workset(lift="squat"),
+        workset(lift="bench"),
+    ])
+    athlete = db.Athlete("anna")
+
+    assert [ws["lift_name"] for ws in athlete.worksets_to_do()] == ["squat", "bench"]
+    assert athlete.latest_max("bench")["weight"] == 90
+    assert athlete.latest_max("military") == {}
+
+    maxes = athlete.latest_maxes(["bench", "squat", "military"])
+    assert (maxes["bench"]["weight"], maxes["squat"]["weight"], maxes["military"]) == (90, 100, {})
+
+    latest = athlete.latest_cycle()
+    assert (latest["date"], latest["cycle"], latest["base_reps"]) == (datetime.date(2024, 2, 1), 2, 3)
+    assert db.Athlete("bob").latest_cycle() == {}
+
+
+def test_data_version(engine):
+    db.Athlete("anna", worksets=[]).add("secret")
+    assert storage.get_engine().data_version("anna") == 0
+    assert storage.get_engine().data_version("nobody") == 0
+
+    db.Workset.add_many([workset(), workset(lift="squat"), workset(athlete="bob")])
+    assert storage.get_engine().data_version("anna") == 1
+
+    ws, _ = db.Athlete("anna").worksets
+    db.Workset.update_row(ws["id"], date="2024-01-02", lift_name="bench", reps="5", weight="85", is_max=False)
+    db.Workset.delete_by_id(ws["id"])
+    assert storage.get_engine().data_version("anna") == 3
+
+    with pytest.raises(storage.IntegrityError):
+        db.Workset.add_many([workset(date="2024-01-01"), workset(date="2024-01-01")])
+    assert storage.get_engine().data_version("anna") == 3
+
+
+def test_roster_queries(engine):
+    db.Workset.add_many([
+        workset(date="2024-01-01", reps=5, weight=80, is_max=True, cycle=1),
+        workset(date="2024-02-01", reps=3, weight=90, is_max=True, cycle=2, base_reps=3),
+        workset(lift="squat", date="2024-02-01", reps=5, weight=100, is_max=True, cycle=2, base_reps=3),
+        workset(lift="squat"),
+        workset(athlete="bob", date="2024-01-01", reps=5, weight=60, is_max=False, cycle=0),
+    ])
+    engine = storage.get_engine()
+    lifts = ["bench", "squat", "military"]
+
+    maxes = engine.roster_latest_maxes(lifts)
+    assert list(maxes) == ["anna"]
+    assert maxes["anna"] == db.Athlete("anna").latest_maxes(lifts)
+
+    cycles = engine.roster_latest_cycles()
+    assert list(cycles) == ["anna"]
+    assert (cycles["anna"]["cycle"], cycles["anna"]["base_reps"]) == (2, 3)
+
+    assert engine.athletes_with_worksets_to_do() == {"anna"}
+
+
+def test_iter_worksets(engine):
+    db.Workset.add_many([
+        workset(date="2024-01-01", reps=5, weight=80, is_max=True),
+        workset(date="2024-02-01", reps=3, weight=90),
+        workset(lift="squat", date="2024-01-15", reps=5, weight=100, is_max=True),
+        workset(lift="squat"),
+        workset(athlete="bob", date="2024-01-01", reps=5, weight=60),
+    ])
+    athlete = db.Athlete("anna")
+    ids = [ws["id"] for ws in athlete.worksets]
+
+    rows = list(athlete.iter_worksets())
+    assert [ws["id"] for ws in rows] == sorted(ids)
+    assert rows[0] == {key: value for key, value in athlete.worksets[0].items() if key in storage.WORKSET_FIELDS}
+
+    def weights(**query):
+        return [ws["weight"] for ws in athlete.iter_worksets(columns=("id", "weight"), **query)]
+
+    assert weights(lift="squat") == [100, 85]
+    assert weights(since=datetime.date(2024, 1, 15)) == [90, 100]
+    assert weights(until=datetime.date(2024, 1, 15)) == [80, 100]
+    assert weights(is_max=True) == [80, 100]
+    assert weights(is_max=False) == [90, 85]
+    assert weights(after=min(ids), limit=2) == [90, 100]
+    assert list(athlete.iter_worksets(columns=("weight",), limit=1)) == [{"weight": 80}]
+
+    with pytest.raises(ValueError):
+        athlete.iter_worksets(columns=("id", "password"))
+
+
+def test_workset_changes(engine):
+    db.Athlete("anna", worksets=[]).add("secret")
+    engine = storage.get_engine()
+    assert engine.workset_changes("anna", 0) == (0, {})
+
+    added = [workset(), workset(lift="squat"), workset(lift="military")]
+    db.Workset.add_many(added)
+    first, second, third = [ws.id for ws in added]
+    db.Workset.update_row(second, date="2024-01-02", lift_name="squat", reps="5", weight="100", is_max=False)
+    db.Workset.delete_by_id(first)
+
+    version, changes = engine.workset_changes("anna", 0)
+    assert version == 3
+    # in the order of the last change, the current row or None if deleted
+    assert list(changes) == [third, second, first]
+    assert (changes[second]["reps"], changes[second]["weight"], changes[first]) == (5, 100, None)
+
+    assert engine.workset_changes("anna", 1) == (3, {second: changes[second], first: None})
+    assert engine.workset_changes("anna", 3) == (3, {})
+    # ahead of the athlete, or from before the log: load everything
+    assert engine.workset_changes("anna", 4) == (3, None)
+    assert engine.workset_changes("anna", -1) == (3, None)
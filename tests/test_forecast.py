@@ -0,0 +1,80 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from fivethirtyone_db import forecast, planner, storage
+from fivethirtyone_db.worksets import WorksetStore
+
+START = datetime.date(2024, 1, 1)
+
+
+def history(bests, athlete="anna", lift="bench"):
+    # one max set of 1 rep per cycle, so the e1RM is the weight
+    return [
+        dict(id=i, athlete_name=athlete, lift_name=lift, date=START + datetime.timedelta(weeks=4 * i),
+             weight=weight, reps=1, cycle=cycle, is_max=True)
+        for i, (cycle, weight) in enumerate(bests)
+    ]
+
+
+def roster(one_rm=100.0, cycle=3, base_reps=0):
+    return planner.Roster(("anna",), ("bench",), np.array([cycle]), np.array([base_reps]), np.array([[one_rm]]))
+
+
+def test_fit_noise():
+    # gains of 3, 1 and, over two cycles, 4 against an increment of 2.5 a cycle
+    worksets = WorksetStore.from_records(history([(0, 100), (1, 103), (2, 104), (4, 108)]))
+    noise = forecast.fit_noise(roster(), worksets, np.array([2.5]))
+
+    residuals, gaps = np.array([0.5, -1.5, -1.0]), np.array([1, 1, 2])
+    bias = residuals.sum() / gaps.sum()
+    assert noise.residuals[0, 0] == 3
+    assert noise.bias[0, 0] == pytest.approx(bias)
+    assert noise.sigma[0, 0] == pytest.approx(np.sqrt(((residuals - gaps * bias) ** 2 / gaps).sum() / 2))
+
+    # too short a history falls back to the program increment
+    short = forecast.fit_noise(roster(), WorksetStore.from_records(history([(0, 100), (1, 103)])), np.array([2.5]))
+    assert (short.bias[0, 0], short.sigma[0, 0]) == (0, 2.5)
+
+
+def test_schedule_follows_the_planner():
+    settings = planner.settings_from_config()
+    cycle, base_reps = forecast.schedule(roster(), settings, 6)
+    assert base_reps[0].tolist() == [5, 3, 1, 0, 5, 3]
+    assert cycle[0].tolist() == [4, 4, 4, 4, 5, 5]
+
+    cycle, base_reps = forecast.schedule(roster(base_reps=2), settings, 3)
+    assert (cycle[0].tolist(), base_reps[0].tolist()) == ([-1] * 3, [-1] * 3)
+
+
+def test_without_noise_the_bands_follow_the_program(monkeypatch):
+    monkeypatch.setattr(forecast, "MIN_RESIDUALS", 1)
+    worksets = WorksetStore.from_records(history([(0, 95), (1, 97.5), (2, 100)]))
+    result = forecast.forecast(roster(), worksets, cycles=6, simulations=50, seed=1)
+
+    expected = 100 + 2.5 * np.array([1, 1, 1, 1, 2, 2])
+    assert result.bands.shape == (1, 1, 6, len(forecast.PERCENTILES))
+    assert result.bands[0, 0] == pytest.approx(np.repeat(expected[:, None], len(forecast.PERCENTILES), axis=1))
+    assert result.simulated == 6 * 50
+
+
+def test_forecast_is_reproducible_with_a_pool(monkeypatch):
+    roster = planner.load_roster(include_planned=True)
+    worksets = WorksetStore.from_records(storage.get_engine().list_rows("workset"))
+    result = forecast.forecast(roster, worksets, simulations=500, seed=7)
+
+    # lifts without a max can't be forecast; the bands are ordered
+    assert np.array_equal(np.isnan(result.bands[..., 0]), np.isnan(result.start)[..., None].repeat(8, axis=2))
+    assert (np.diff(result.bands, axis=-1)[~np.isnan(result.bands[..., 1:])] >= 0).all()
+
+    monkeypatch.setattr(forecast, "POOL_MIN_SERIES", 0)
+    monkeypatch.setattr(forecast, "CHUNK_ELEMENTS", 500 * 8 * 3)
+    pooled = forecast.forecast(roster, worksets, simulations=500, seed=7, workers=2)
+    assert np.array_equal(pooled.bands, forecast.forecast(roster, worksets, simulations=500, seed=7).bands, equal_nan=True)
+
+
+def test_forecast_all():
+    result, timings = forecast.forecast_all(cycles=4, simulations=100, seed=1)
+    assert set(timings) == {"load", "forecast"}
+    assert result.simulated == np.count_nonzero(~np.isnan(result.start)) * 4 * 100
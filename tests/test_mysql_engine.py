@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from fivethirtyone_db.storage import mysql
+from fivethirtyone_db.storage.mysql import MySQLEngine
+
+
+class FakeCursor:
+    column_names = ("name",)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+
+    def fetchall(self):
+        return [("bench",), ("squat",)]
+
+    def fetchone(self):
+        return ("bench",)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """stands in for mysql.connector's connection"""
+
+    opened = []
+
+    def __init__(self, **credentials):
+        self.credentials = credentials
+        self.statements = []
+        self.cursors = 0
+        self.alive = True
+        self.in_transaction = False
+        FakeConnection.opened.append(self)
+
+    def cursor(self, **kwargs):
+        self.cursors += 1
+        return FakeCursor(self)
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self.alive:
+            raise mysql.Error("MySQL server has gone away")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.alive = False
+
+
+@pytest.fixture
+def mysql_engine(monkeypatch):
+    FakeConnection.opened = []
+    monkeypatch.setattr(mysql, "connect", FakeConnection)
+    engine = MySQLEngine({"host": "localhost"})
+    yield engine
+    engine.close()
+
+
+def test_mysql_pool_reuses_connection(mysql_engine):
+
+    for _ in range(5):
+        mysql_engine._fetchall("SELECT name FROM lift")
+
+    assert len(FakeConnection.opened) == 1
+    stats = mysql_engine.pool_stats()
+    assert stats["checkouts"] == 5
+    assert stats["hits"] == 4
+
+
+def test_mysql_pool_replaces_stale_connection(mysql_engine):
+
+    mysql_engine._fetchone("SELECT name FROM lift")
+    FakeConnection.opened[0].alive = False
+
+    assert mysql_engine._fetchone("SELECT name FROM lift") == {"name": "bench"}
+    assert len(FakeConnection.opened) == 2
+    assert mysql_engine.pool_stats()["stale"] == 1
+
+
+def test_mysql_pool_recreated_after_fork(mysql_engine):
+
+    mysql_engine._fetchall("SELECT name FROM lift")
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            mysql_engine._fetchall("SELECT name FROM lift")
+            ok = len(FakeConnection.opened) == 2 and mysql_engine.pool_stats()["misses"] == 1
+        finally:
+            os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_mysql_prepared_statements_are_cached(mysql_engine):
+
+    for name in ["camilla", "jimmy", "o'hara"]:
+        mysql_engine._fetchone("SELECT name FROM lift WHERE name=%s", (name,))
+
+    conn, = FakeConnection.opened
+    assert conn.cursors == 1
+    assert len(set(conn.statements)) == 1
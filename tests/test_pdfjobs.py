@@ -0,0 +1,228 @@
+import json
+import os
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from fivethirtyone_db import db, pdfjobs
+from fivethirtyone_db.pdfcache import PDFCache
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool = pdfjobs.JobPool(workers=1, job_dir=tmp_path / "jobs", cache=PDFCache(tmp_path / "cache"))
+    monkeypatch.setattr(pdfjobs, "_pool", pool)
+    monkeypatch.setattr(pdfjobs, "_pid", os.getpid())
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def logged_in(client):
+    # a planned cycle to print
+    for lift in ["bench", "squat"]:
+        db.Workset(base_max=60, base_reps=5, cycle=4, weight=40, lift_name=lift, athlete_name="camilla").add()
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    return client
+
+
+def wait(client, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while (job := client.get(url).json)["state"] in ("queued", "running"):
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+    return job
+
+
+def test_pdf_job(logged_in, pool):
+    response = logged_in.post("/pdf/jobs")
+    assert response.status_code == 202
+    job = response.json
+    assert (job["athlete"], response.headers["Location"]) == ("camilla", job["status_url"])
+
+    job = wait(logged_in, job["status_url"])
+    assert job["state"] == "done", job
+    download = logged_in.get(job["download_url"])
+    assert download.mimetype == "application/pdf" and download.data.startswith(b"%PDF")
+
+    stats = logged_in.get("/api/stats/pdf").json
+    assert (stats["submitted"], stats["done"], stats["pending"]) == (1, 1, 0)
+    assert 0 <= stats["render_avg"] <= stats["render_max"]
+
+    # nobody else's jobs
+    path = pool.job_dir / f"{job['id']}.json"
+    path.write_text(json.dumps(dict(json.loads(path.read_text()), athlete="jimmy")))
+    assert logged_in.get(job["status_url"]).status_code == 404
+    assert logged_in.get(job["download_url"]).status_code == 404
+    assert logged_in.get("/pdf/jobs/not-a-job").status_code == 404
+
+
+def test_pdf_page_polls_the_job(logged_in, pool):
+    page = logged_in.get("/pdf").data.decode()
+    job_id, = [path.stem for path in pool.job_dir.glob("*.json")]
+    assert f'data-status-url="/pdf/jobs/{job_id}"' in page
+    assert wait(logged_in, f"/pdf/jobs/{job_id}")["state"] == "done"
+
+
+def test_full_queue_is_refused(logged_in, pool):
+    pool.max_pending = 0
+    response = logged_in.post("/pdf/jobs")
+    assert (response.status_code, response.headers["Retry-After"]) == (503, "5")
+    assert pool.stats()["rejected"] == 1
+
+
+def test_dead_render_process_fails_the_job(logged_in, pool):
+    job = dict(id="b" * 32, athlete="camilla", engine="html", key="c" * 64, state="running", submitted=time.time())
+    (pool.job_dir / f"{job['id']}.json").write_text(json.dumps(job))
+    pool._pending, pool._rendering[job["key"]] = 1, job["id"]
+
+    died = Future()
+    died.set_exception(BrokenProcessPool("a process in the pool was terminated abruptly"))
+    pool._finished(job["id"], job["key"], died)
+
+    status = logged_in.get(f"/pdf/jobs/{job['id']}").json
+    assert status["state"] == "failed" and "terminated" in status["error"]
+    assert (pool.stats()["failed"], pool.stats()["pending"], pool._rendering) == (1, 0, {})
+
+
+class BrokenExecutor:
+    def submit(self, *args):
+        raise BrokenProcessPool("a process in the pool was terminated abruptly")
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_broken_pool_is_replaced(logged_in, pool):
+    pool._executor = BrokenExecutor()
+    job = logged_in.post("/pdf/jobs").json
+    assert not isinstance(pool._executor, BrokenExecutor)
+    assert wait(logged_in, job["status_url"])["state"] == "done"
+
+
+class QueueingExecutor:
+    # never runs its jobs
+    def submit(self, *args):
+        return Future()
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_discarded_pool_cancels_its_queued_jobs(pool):
+    pool._executor = QueueingExecutor()
+    job_id = pool.submit("camilla", "<p>hi</p>")
+    pool._discard_executor()
+    assert pool.status(job_id)["state"] == "failed"
+    assert (pool.stats()["pending"], pool._rendering, pool._futures) == (0, {}, {})
+
+
+def test_job_that_cant_be_queued_fails(pool, monkeypatch):
+    monkeypatch.setattr(pool, "_get_executor", BrokenExecutor)
+    with pytest.raises(BrokenProcessPool):
+        pool.submit("camilla", "<p>hi</p>")
+    job_id, = [path.stem for path in pool.job_dir.glob("*.json")]
+    assert pool.status(job_id)["state"] == "failed"
+    assert (pool.stats()["pending"], pool.stats()["failed"], pool._rendering) == (0, 1, {})
+
+
+def test_unfinished_download_and_expiry(logged_in, pool):
+    old = dict(id="a" * 32, athlete="camilla", state="queued", submitted=time.time() - pdfjobs.JOB_TTL - 1)
+    (pool.job_dir / f"{old['id']}.json").write_text(json.dumps(old))
+    response = logged_in.get(f"/pdf/jobs/{old['id']}/download")
+    assert (response.status_code, response.json["state"]) == (409, "queued")
+
+    os.utime(pool.job_dir / f"{old['id']}.json", (old["submitted"], old["submitted"]))
+    pool.expire()
+    assert pool.status(old["id"]) is None
+
+
+def test_nothing_to_print(client, pool):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+    assert client.post("/pdf/jobs").status_code == 409
+
+
+def test_repeat_download_is_cached(logged_in, pool):
+    first = wait(logged_in, logged_in.post("/pdf/jobs").json["status_url"])
+    assert first["state"] == "done", first
+
+    # the same program again: done without reaching the pool
+    second = logged_in.post("/pdf/jobs").json
+    assert (second["state"], second["key"]) == ("done", first["key"])
+    assert second["id"] != first["id"]
+
+    download = logged_in.get(second["download_url"])
+    assert download.headers["ETag"] == f'"{first["key"]}"'
+    assert int(download.headers["Content-Length"]) == len(download.data) == first["size"]
+    again = logged_in.get(second["download_url"], headers={"If-None-Match": download.headers["ETag"]})
+    assert again.status_code == 304
+
+    stats = logged_in.get("/api/stats/pdf").json
+    assert (stats["submitted"], stats["cached"], stats["done"]) == (2, 1, 1)
+    assert (stats["cache"]["hits"], stats["cache"]["misses"], stats["cache"]["hit_ratio"]) == (1, 1, 0.5)
+
+    # a changed program is a new PDF
+    db.Workset(base_max=60, base_reps=5, cycle=4, weight=40, lift_name="deadlift", athlete_name="camilla").add()
+    third = logged_in.post("/pdf/jobs").json
+    assert third["key"] != first["key"]
+    assert wait(logged_in, third["status_url"])["state"] == "done"
+
+    # evicted: gone until it is made again
+    pool.cache.path(first["key"]).unlink()
+    assert logged_in.get(second["download_url"]).status_code == 404
+
+
+def test_pdf_cache_evicts_least_recently_used(tmp_path):
+    cache = PDFCache(tmp_path, max_bytes=250)
+    keys = [cache.key(html) for html in ["a", "b", "c"]]
+    for age, key in enumerate(keys[:2]):
+        path = cache.put(key, b"x" * 100)
+        os.utime(path, (1000 + age, 1000 + age))
+
+    # "a" was read last, so "b" goes when "c" doesn't fit
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], b"x" * 100)
+    assert [cache.get(key) is not None for key in keys] == [True, False, True]
+    assert cache.stats() == dict(hits=3, misses=1, hit_ratio=0.75, files=2, bytes=200, max_bytes=250)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_reportlab_engine(logged_in, pool):
+    job = logged_in.post("/pdf/jobs", data=dict(engine="reportlab")).json
+    assert job["engine"] == "reportlab"
+    job = wait(logged_in, job["status_url"])
+    assert job["state"] == "done", job
+    assert logged_in.get(job["download_url"]).data.startswith(b"%PDF")
+
+    # the same program from the other engine is another PDF
+    html = logged_in.post("/pdf/jobs", data=dict(engine="html")).json
+    assert html["engine"] == "html" and html["key"] != job["key"]
+
+    logged_in.application.config["PDF_ENGINE"] = "reportlab"
+    again = logged_in.post("/pdf/jobs").json
+    assert (again["engine"], again["state"], again["key"]) == ("reportlab", "done", job["key"])
+
+    assert logged_in.post("/pdf/jobs", data=dict(engine="latex")).status_code == 400
+
+
+def test_draw_pdf_is_reproducible():
+    program = dict(
+        name="camilla",
+        cycle=4,
+        base_reps=5,
+        worksets_to_do=[dict(lift="bench", reps=[5, 5, 3, 3, 3, "3+"], weight=[22.5, 30.0, 35.0, 42.5, 47.5, 55.0])],
+    )
+    pdf = pdfjobs.draw_pdf(program)
+    assert pdf.startswith(b"%PDF") and pdf == pdfjobs.draw_pdf(program)
+
+
+def test_job_and_cache_dirs_are_private(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    pool = pdfjobs.JobPool(job_dir=shared, cache=PDFCache(tmp_path / "cache"))
+    assert pool.job_dir.stat().st_mode & 0o777 == 0o700
+    assert pdfjobs.JobPool(job_dir=tmp_path / "new", cache=pool.cache).job_dir.stat().st_mode & 0o777 == 0o700
+    assert pool.cache.directory.stat().st_mode & 0o777 == 0o700
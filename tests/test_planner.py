@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from fivethirtyone_db import blog, db, planner, storage
+
+ATHLETES = ["camilla", "christina", "irfan", "jimmy"]
+
+
+def test_roster_matches_estimate_next_cycle():
+    roster = planner.load_roster(include_planned=True)
+    plan = planner.plan(roster)
+    assert plan.athletes == tuple(ATHLETES)
+
+    for i, name in enumerate(ATHLETES):
+        estimate = db.Athlete(name).estimate_next_cycle()
+        assert (plan.cycle[i], plan.base_reps[i]) == (estimate["next_cycle"], estimate["next_base_reps"])
+        for j, lift in enumerate(plan.lifts):
+            assert roster.one_rm[i, j] == pytest.approx(estimate[lift], nan_ok=True)
+
+
+def test_weights_match_the_new_cycle_form():
+    plan = planner.plan(planner.load_roster(include_planned=True))
+
+    for i, name in enumerate(plan.athletes):
+        # what the form posts when the coach accepts its defaults
+        new_cycle = {"cycle-index": str(plan.cycle[i]), "rep-base": str(plan.base_reps[i])}
+        new_cycle.update({f"{lift}-max": f"{plan.one_rm[i, j]:.2f}" for j, lift in enumerate(plan.lifts)})
+
+        for lift, athlete, weight, one_rm_max, base_reps, cycle in blog.next_lifts(new_cycle, name):
+            assert plan.weight[i, plan.lifts.index(lift)] == weight
+
+
+def test_unknown_base_reps_are_skipped():
+    roster = planner.Roster(
+        ("anna", "bob"), ("bench",), np.array([1, 1]), np.array([5, 2]), np.array([[100.0], [100.0]])
+    )
+    plan = planner.plan(roster)
+    assert (plan.base_reps.tolist(), plan.cycle.tolist()) == ([3, -1], [1, -1])
+    assert plan.weight[0, 0] > 0 and math.isnan(plan.weight[1, 0])
+
+
+def test_pool_gives_the_same_plan(monkeypatch):
+    roster = planner.load_roster(include_planned=True)
+    monkeypatch.setattr(planner, "POOL_MIN_ATHLETES", 0)
+
+    pooled = planner.plan(roster, workers=2)
+    plan = planner.plan(roster)
+    assert pooled.athletes == plan.athletes
+    for name in planner.Plan._fields[2:]:
+        assert np.array_equal(getattr(pooled, name), getattr(plan, name), equal_nan=True)
+
+
+def test_plan_all_writes_one_transaction():
+    engine = storage.get_engine()
+    versions = {name: engine.data_version(name) for name in ATHLETES}
+    to_do = {name: len(db.Athlete(name).worksets_to_do()) for name in ATHLETES}
+
+    plan, timings = planner.plan_all(dry_run=True)
+    assert set(timings) == {"load", "plan", "write"}
+    assert {name: engine.data_version(name) for name in ATHLETES} == versions
+
+    plan, _ = planner.plan_all()
+    for i, name in enumerate(plan.athletes):
+        assert engine.data_version(name) == versions[name] + 1
+        planned = db.Athlete(name).worksets_to_do()[to_do[name]:]
+        assert sorted((ws["lift_name"], ws["weight"]) for ws in planned) == sorted(
+            (lift, plan.weight[i, j]) for j, lift in enumerate(plan.lifts)
+        )
+
+    # now everybody has worksets to do
+    plan, _ = planner.plan_all()
+    assert plan.athletes == ()
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+
+from fivethirtyone_db import analysis, cache, db, storage
+from fivethirtyone_db.cache import WorksetCache
+from fivethirtyone_db.progression import Progression
+from fivethirtyone_db.storage.memory import MemoryEngine
+
+SERIES = ("ids", "x", "y", "text", "line_x", "line_y")
+
+
+def reference(worksets, lift):
+    """the points graphs() used to compute on every request"""
+    done = sorted((ws for ws in worksets if ws["date"] and ws["lift_name"] == lift), key=lambda ws: ws["date"])
+    points, line = [], []
+    for ws in done:
+        w_1rm = analysis.one_rm_fusion(ws["weight"], ws["reps"])
+        points.append((f"{ws['date']}", w_1rm, f"{ws['reps']} x {ws['weight']} kg → {w_1rm:.1f} kg"))
+        if not line or w_1rm >= 0.8 * line[-1][1]:
+            line.append((f"{ws['date']}", w_1rm))
+    return points, line
+
+
+def as_tuples(series):
+    return list(zip(series.x, series.y, series.text)), list(zip(series.line_x, series.line_y))
+
+
+def assert_same(progression, expected):
+    for lift in set(progression.lifts) | set(expected.lifts):
+        for name in SERIES:
+            assert getattr(progression[lift], name) == getattr(expected[lift], name), (lift, name)
+
+
+@pytest.mark.parametrize("name", ["camilla", "jimmy"])
+def test_matches_the_old_graphs(name):
+    athlete = db.Athlete(name)
+    progression = Progression.from_worksets(athlete.worksets)
+
+    for lift in ["bench", "squat", "military", "deadlift"]:
+        assert as_tuples(progression[lift]) == reference(athlete.worksets.to_records(), lift)
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    engine = MemoryEngine()
+    engine.add_athlete("anna")
+    start = datetime.date(2024, 1, 1)
+    engine.add_worksets([
+        dict(lift_name=lift, athlete_name="anna", weight=w, reps=5, date=start + datetime.timedelta(days=7 * i))
+        for i, (lift, w) in enumerate([("bench", 50), ("squat", 80), ("bench", 52.5), ("bench", 30), ("bench", 55)])
+    ])
+    monkeypatch.setattr(storage, "_engine", engine)
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    return engine
+
+
+def test_writes_update_it_incrementally(memory, monkeypatch):
+    before = db.Athlete.cached("anna").progression()
+    assert before["bench"].line_y == before["bench"].y[:2] + before["bench"].y[3:]
+
+    built = []
+    original = Progression.from_worksets
+    monkeypatch.setattr(cache.Progression, "from_worksets", lambda store: built.append(1) or original(store))
+
+    # lands in the middle of the bench series, the line after it is recomputed
+    ws = db.Workset(base_max=None, base_reps=None, cycle=None, weight=45, lift_name="bench", athlete_name="anna")
+    ws.add()
+    db.Workset.update_row(ws.id, date="2024-01-18", lift_name="bench", reps="5", weight="45", is_max=False)
+    db.Workset.add_many([
+        db.Workset(base_max=None, base_reps=None, cycle=None, weight=60, lift_name="military",
+                   athlete_name="anna", date=datetime.date(2024, 3, 1), reps=3),
+    ])
+    first_bench = before["bench"].ids[0]
+    db.Workset.delete_by_id(first_bench)
+
+    athlete = db.Athlete.cached("anna")
+    progression = athlete.progression()
+    assert built == []
+    assert db.cache_stats()["deltas"] == 4
+    assert_same(progression, original(athlete.worksets))
+    assert "military" in progression.lifts
+
+    # the progression handed out before the writes didn't change
+    assert first_bench in before["bench"].ids
+
+
+def test_graphs_reads_the_materialized_series(memory, monkeypatch):
+    athlete = db.Athlete.cached("anna")
+    assert athlete.progression() is db.Athlete.cached("anna").progression()
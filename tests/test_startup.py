@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = ["pandas", "flask", "plotly", "xhtml2pdf"]
+
+
+def loaded_modules(code):
+    """the heavy modules in sys.modules after running `code` in a fresh interpreter"""
+    check = f"{code}\nimport sys\nprint(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import fivethirtyone_db",
+        "import fivethirtyone_db.analysis",
+        "import scripts.cli",
+    ],
+)
+def test_no_heavy_imports(code):
+    assert loaded_modules(code) == []
+
+
+def test_config_is_loaded_on_first_access():
+    code = (
+        "import fivethirtyone_db\n"
+        "assert 'config' not in vars(fivethirtyone_db)\n"
+        "assert fivethirtyone_db.SMALLEST_W_INC == fivethirtyone_db.config['smallest_w_inc']"
+    )
+    assert loaded_modules(code) == []
+    # programs are still DataFrames
+    assert loaded_modules(f"{code}\nfivethirtyone_db.programs") == ["pandas"]
@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+from fivethirtyone_db import cache, db, storage
+from fivethirtyone_db.cache import WorksetCache
+from fivethirtyone_db.stats import AthleteStats, LiftStats
+from fivethirtyone_db.storage.memory import MemoryEngine
+from fivethirtyone_db.worksets import WorksetStore
+
+START = datetime.date(2024, 1, 1)
+
+
+def assert_same(stats, expected):
+    assert set(stats.lifts) == set(expected.lifts)
+    for lift in expected.lifts:
+        got, want = stats[lift].to_dict(), expected[lift].to_dict()
+        assert got.pop("rep_prs") == want.pop("rep_prs"), lift
+        assert [pytest.approx(cycle) for cycle in got.pop("cycles")] == want.pop("cycles"), lift
+        assert got == pytest.approx(want), lift
+
+
+@pytest.mark.parametrize("name", ["camilla", "jimmy"])
+def test_folding_in_sets_matches_a_rebuild(name):
+    worksets = db.Athlete(name).worksets.filter(done=True).sort_by_date()
+    head, tail = worksets.take(range(len(worksets) - 10)), worksets.take(range(len(worksets) - 10, len(worksets)))
+
+    stats = AthleteStats.from_worksets(head)
+    for row in tail:
+        stats = stats.with_added([dict(row)])
+    assert not stats.stale
+    assert_same(stats, AthleteStats.from_worksets(worksets))
+
+
+def test_running_values():
+    sets = [(0, 100, 5), (7, 100, 8), (14, 110, 5), (21, 90, 5)]
+    store = WorksetStore.from_records([
+        dict(id=i, lift_name="bench", date=START + datetime.timedelta(days=day), weight=weight, reps=reps,
+             cycle=1 + i // 2)
+        for i, (day, weight, reps) in enumerate(sets)
+    ])
+    bench = AthleteStats.from_worksets(store)["bench"]
+    one_rms = [w * 36 / (37 - r) / 2 + w * r**0.1 / 2 for _, w, r in sets]
+
+    assert (bench.pr, bench.pr_date) == (pytest.approx(max(one_rms)), START + datetime.timedelta(days=14))
+    assert bench.rep_prs == {5: (110.0, START + datetime.timedelta(days=14)), 8: (100.0, START + datetime.timedelta(days=7))}
+    assert bench.moving_average == pytest.approx(sum(one_rms[-4:]) / 4)
+    [(_, first, none), (_, second, delta)] = bench.cycle_deltas
+    assert (none, delta) == (None, pytest.approx(second - first))
+    assert bench.trend == pytest.approx(
+        7 * sum((d - 10.5) * (y - sum(one_rms) / 4) for (d, _, _), y in zip(sets, one_rms)) / sum((d - 10.5) ** 2 for d, _, _ in sets)
+    )
+    assert LiftStats().to_dict()["trend"] is None
+
+
+def test_back_dated_sets_mark_the_lift_stale():
+    store = WorksetStore.from_records([
+        dict(id=1, lift_name="bench", date=START, weight=50, reps=5),
+        dict(id=2, lift_name="squat", date=START, weight=80, reps=5),
+    ])
+    stats = AthleteStats.from_worksets(store)
+    earlier = dict(id=3, lift_name="bench", date=START - datetime.timedelta(days=1), weight=60, reps=5)
+    stats = stats.with_added([earlier])
+
+    assert stats.stale == {"bench"}
+    with pytest.raises(KeyError):
+        stats["bench"]
+    assert_same(stats.refreshed(store.with_added([earlier])), AthleteStats.from_worksets(store.with_added([earlier])))
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    engine = MemoryEngine()
+    engine.add_athlete("anna")
+    engine.add_worksets([
+        dict(lift_name=lift, athlete_name="anna", weight=w, reps=5, date=START + datetime.timedelta(days=7 * i), cycle=1)
+        for i, (lift, w) in enumerate([("bench", 50), ("squat", 80), ("bench", 52.5), ("bench", 55)])
+    ])
+    monkeypatch.setattr(storage, "_engine", engine)
+    monkeypatch.setattr(db, "workset_cache", WorksetCache())
+    return engine
+
+
+def test_writes_keep_the_cached_stats_current(memory, monkeypatch):
+    db.Athlete.cached("anna").lift_stats()
+
+    built = []
+    original = AthleteStats.from_worksets
+    monkeypatch.setattr(cache.AthleteStats, "from_worksets", lambda *args: built.append(args[1:]) or original(*args))
+
+    # plan a set, then complete it: folded in, nothing rebuilt
+    ws = db.Workset(base_max=100, base_reps=5, cycle=2, weight=60, lift_name="bench", athlete_name="anna")
+    ws.add()
+    db.Workset.update_row(ws.id, date="2024-03-01", lift_name="bench", reps="5", weight="60", is_max=True)
+    athlete = db.Athlete.cached("anna")
+    stats = athlete.lift_stats()
+    assert built == []
+    assert_same(stats, original(athlete.worksets))
+    assert stats["bench"].cycle_deltas[-1][0] == 2
+
+    # deleting a squat set only rebuilds squat
+    squat, = [row["id"] for row in athlete.worksets if row["lift_name"] == "squat"]
+    db.Workset.delete_by_id(squat)
+    athlete = db.Athlete.cached("anna")
+    assert_same(athlete.lift_stats(), original(athlete.worksets))
+    assert built == [(frozenset({"squat"}),)]
+    assert athlete.lift_stats() is athlete.lift_stats()
+
+
+def test_stats_api_and_index(client):
+    client.post("/auth/login", data=dict(username="camilla", password="secret"))
+
+    stats = client.get("/api/stats").json
+    expected = AthleteStats.from_worksets(db.Athlete("camilla").worksets)
+    assert set(stats) == set(expected.lifts)
+    assert stats["bench"]["pr"] == pytest.approx(expected["bench"].pr)
+
+    page = client.get("/").data.decode()
+    assert 'id="stats-table"' in page
+    assert f"{expected['bench'].pr:.1f}" in page
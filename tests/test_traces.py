@@ -0,0 +1,50 @@
+import datetime
+
+import numpy as np
+
+from fivethirtyone_db import traces
+from fivethirtyone_db.progression import LiftProgression
+
+
+def test_lttb_keeps_the_shape():
+    x = np.arange(10_000)
+    y = np.sin(x / 500)
+    y[4321] = 5  # a spike
+
+    index = traces.lttb(x, y, 200)
+    assert len(index) == 200
+    assert (index[0], index[-1]) == (0, len(x) - 1)
+    assert np.all(np.diff(index) > 0)
+    assert 4321 in index
+    # the extremes of the curve survive
+    assert np.max(y[index][y[index] < 5]) > 0.99 and np.min(y[index]) < -0.99
+
+
+def test_lttb_short_series_are_kept():
+    assert traces.lttb([1, 2, 3], [1, 2, 3], 10).tolist() == [0, 1, 2]
+
+
+def make_series(n):
+    series = LiftProgression()
+    start = datetime.date(2015, 1, 1)
+    for i in range(n):
+        date = start + datetime.timedelta(days=i)
+        series.keys.append((date.toordinal(), i))
+        series.ids.append(i)
+        series.x.append(f"{date}")
+        series.y.append(100 + i % 37)
+        series.text.append(f"{i}")
+        series.on_line.append(False)
+    series._relink()
+    return series
+
+
+def test_lift_traces_are_bounded():
+    series = make_series(5000)
+    line, markers = traces.lift_traces("bench", series, "red", max_points=300)
+    assert len(markers["x"]) == len(markers["y"]) == len(markers["text"]) == 300
+    assert len(line["x"]) == len(line["y"]) <= 300
+    assert (markers["x"][0], markers["x"][-1]) == (series.x[0], series.x[-1])
+
+    line, markers = traces.lift_traces("bench", series, "red", max_points=None)
+    assert (markers["x"], line["y"]) == (series.x, series.line_y)
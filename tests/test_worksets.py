@@ -0,0 +1,86 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from fivethirtyone_db import db, storage
+from fivethirtyone_db.worksets import WorksetStore
+
+
+def record(id, lift="bench", date=None, weight=50.0, reps=None, is_max=None, athlete="anna"):
+    return dict(
+        id=id,
+        weight=weight,
+        reps=reps,
+        lift_name=lift,
+        athlete_name=athlete,
+        date=date and datetime.date.fromisoformat(date),
+        is_max=is_max,
+        base_max=None,
+        base_reps=5,
+        cycle=0,
+    )
+
+
+@pytest.fixture
+def store():
+    return WorksetStore.from_records([
+        record(1, date="2024-01-03", reps=5, is_max=1),
+        record(2, lift="squat", date="2024-01-01", reps=3),
+        record(3),
+        record(4, lift="squat", date="2024-01-03", reps=8, weight=80.0),
+        record(5, lift="squat"),
+    ])
+
+
+def test_rows_read_like_dicts(store):
+    row = store[0]
+    assert row["weight"] == row.weight == 50.0
+    assert (row.date, row.reps, row.is_max, row.base_max) == (datetime.date(2024, 1, 3), 5, 1, None)
+    assert type(row.reps) is int and type(row.id) is int
+
+    planned = store[-1]
+    assert (planned.date, planned.reps, planned.is_max) == (None, None, 0)
+    assert dict(planned) == dict(record(5, lift="squat"), is_max=0)
+    assert store.to_records()[-1] == planned
+    with pytest.raises(AttributeError):
+        planned.colour
+
+
+def test_filter_sort_and_group(store):
+    assert store.filter(lift="squat", done=True).values("id") == [2, 4]
+    assert store.filter(is_max=True).values("id") == [1]
+    assert len(store.filter(lift="curl")) == 0
+
+    way_in_the_future = datetime.date(2100, 1, 1)
+    expected = sorted(store.to_records(), key=lambda ws: ws["date"] or way_in_the_future, reverse=True)
+    assert store.sort_by_date(descending=True).values("id") == [ws["id"] for ws in expected]
+    assert store.sort_by_date().values("id") == [2, 1, 4, 3, 5]
+
+    groups = store.group_by_lift()
+    assert list(groups) == ["bench", "squat"]
+    assert groups["squat"].values("id") == [2, 4, 5]
+    np.testing.assert_array_equal(groups["squat"].column("weight"), [50.0, 80.0, 50.0])
+
+
+def test_changes_return_new_stores(store):
+    added = store.with_added([record(6, lift="military", athlete="bob", date="2024-02-01")])
+    assert added.values("lift_name")[-1] == "military"
+    assert added.filter(athlete="bob").values("id") == [6]
+    assert len(store) == 5
+
+    updated = added.with_updated(record(3, lift="deadlift", reps=2, date="2024-02-02"))
+    assert updated.values("id") == [1, 2, 3, 4, 5, 6]
+    assert (updated[2].lift_name, updated[2].reps) == ("deadlift", 2)
+    assert store[2].lift_name == "bench"
+
+    assert updated.with_deleted(3).values("id") == [1, 2, 4, 5, 6]
+    assert updated.with_deleted(99).values("id") == updated.values("id")
+
+
+def test_athlete_worksets():
+    athlete = db.Athlete("camilla")
+    records = storage.get_engine().load_worksets("camilla")
+
+    assert isinstance(athlete.worksets, WorksetStore)
+    assert athlete.worksets.to_records() == [dict(ws, is_max=ws["is_max"] or 0) for ws in records]